@@ -2,11 +2,42 @@
 # SEÇÃO 1: IMPORTAÇÕES ESSENCIAIS
 # Todas as bibliotecas necessárias para o projeto são importadas aqui.
 # =====================================================================
-from flask import Flask, render_template, request, redirect, url_for, session, flash, Blueprint
+from datetime import date, datetime
+
+from flask import Flask, render_template, request, redirect, url_for, session, flash, Blueprint, jsonify, Response, send_file
 from functools import wraps
-from werkzeug.security import generate_password_hash, check_password_hash
+import click
+import hmac
+import io
+import os
+import uuid
 import mysql.connector
 
+from banco import iniciar_pool, obter_pool, get_db, conexao_avulsa
+from cache import iniciar_versoes
+from metricas import instrumentar, texto_pool
+from autenticacao import Autenticador, TentativasExcedidas, METODO_HASH_PADRAO
+from sessoes import InterfaceSessaoServidor, autorizacao_usuario, invalidar_autorizacao
+from estatisticas import obter_painel, invalidar_painel, recalcular_resumo
+from saldo import saldo_atual, saldo_em, fechar_pendentes, verificar_fechamentos, FechamentoEmAndamento
+from vendas import registrar_venda, VendaInvalida, EstoqueInsuficiente
+from sincronizacao import catalogo_desde, receber_lote, situacao_terminais, LoteInvalido, PAGINA_CATALOGO
+from catalogo import indice_produtos
+from busca import buscar_usuarios, buscar_codigos_usuarios, consulta_fulltext, invalidar_busca_usuarios
+from precificacao import reprecificar
+from precos import obter_hierarquia, resolver_lote
+from referencias import invalidar_referencias
+from paginacao import paginar, paginar_lista, prefixo_like, filtros_da_requisicao, PosicaoInvalida
+from exportacao import EXPORTACOES, FORMATOS, montar_consulta, gerar_linhas
+from importacao import importar_produtos as importar_csv_produtos
+from migracoes import migrar, situacao, ErroMigracao
+from arquivamento import manter_particoes, arquivar, ArquivamentoInvalido
+from estaticos import registrar_estaticos, compilar_css, construir_estaticos, ErroEstaticos
+import relatorios
+import estoque
+import referencias
+import tarefas
+
 # =====================================================================
 # SEÇÃO 2: CONFIGURAÇÃO INICIAL DO APLICATIVO
 # Configurações essenciais para a aplicação Flask e a conexão com o banco de dados.
@@ -19,14 +50,80 @@ app = Flask(__name__)
 # Em um ambiente de produção, esta chave deve ser mais complexa e mantida em segredo.
 app.secret_key = 'chave-secreta-muito-segura-para-seu-projeto'
 
-# Dicionário com as credenciais de acesso ao banco de dados MySQL.
+# Sessões guardadas no servidor: o cookie leva apenas um identificador aleatório.
+app.session_interface = InterfaceSessaoServidor()
+
+# Contadores de versão dos caches em memória (unidades, categorias, PVPs,
+# autorização), compartilhados pelos workers desta máquina por um arquivo
+# mapeado em memória: uma alteração feita em um worker vale para todos.
+iniciar_versoes(os.path.join(app.instance_path, 'versoes_cache'))
+
+# Dicionário com as credenciais de acesso ao banco de dados MySQL. Cada valor
+# pode ser trocado por variável de ambiente (ex.: o banco dos benchmarks).
 db_config = {
-    'host': 'localhost',
-    'user': 'root',
-    'password': '',
-    'database': 'caixa_prog'  # Nome do banco de dados utilizado.
+    'host': os.environ.get('CAIXA_DB_HOST', 'localhost'),
+    'user': os.environ.get('CAIXA_DB_USUARIO', 'root'),
+    'password': os.environ.get('CAIXA_DB_SENHA', ''),
+    'database': os.environ.get('CAIXA_DB_NOME', 'caixa_prog'),  # Nome do banco de dados utilizado.
 }
 
+# Configuração do pool de conexões. Cada requisição pega uma conexão emprestada
+# do pool e a devolve no final, em vez de abrir uma conexão nova a cada rota.
+app.config.update(
+    DB_POOL_TAMANHO=10,          # Conexões mantidas sempre abertas.
+    DB_POOL_OVERFLOW=5,          # Conexões extras permitidas em picos de acesso.
+    DB_POOL_TIMEOUT=10.0,        # Segundos de espera por uma conexão livre.
+    DB_POOL_RECICLAR=3600,       # Reabre conexões com mais de 1 hora.
+    DB_POOL_VERIFICAR_APOS=30.0, # Faz `ping` em conexões ociosas há mais de 30s.
+)
+pool_mysql = iniciar_pool(app, db_config)
+
+# Instrumentação: latência por rota, tempo de cada comando SQL e dos templates,
+# expostos em /sistema/admin/metrics. Comandos mais lentos que o limite vão para
+# o log "caixa.consultas_lentas". O Prometheus se autentica com o token abaixo.
+app.config.update(
+    METRICAS_LIMITE_LENTA=0.5,   # Segundos.
+    METRICAS_TOKEN=None,         # "Authorization: Bearer <token>"; None = só administradores logados.
+)
+instrumentar(app)
+app.extensions['metricas'].descrever('caixa_pdv_lote_segundos', 'Tempo para gravar cada lote enviado pelos terminais offline.')
+app.extensions['metricas'].descrever('caixa_pdv_vendas_offline_total', 'Vendas offline recebidas, por resultado.')
+
+# Tarefas em segundo plano (reprecificação, importação, exportação e relatórios):
+# cada processo mantém threads que consomem a tabela `tarefa`. Com 0 threads o
+# processo só enfileira, e as tarefas rodam em outro (`flask executar-tarefas`).
+app.config.update(
+    TAREFAS_TRABALHADORES=2,
+    TAREFAS_PASTA=os.path.join(app.instance_path, 'tarefas'),  # Uploads e arquivos exportados.
+)
+executor_tarefas = tarefas.Executor(pool_mysql.obter, pool_mysql.devolver,
+                                    trabalhadores=app.config['TAREFAS_TRABALHADORES'])
+
+# Arquivos estáticos: em produção (wsgi.py) são servidos os gerados por
+# `flask construir-estaticos`, com hash no nome, comprimidos e com cache longo.
+registrar_estaticos(app)
+
+# Recalcula periodicamente (a cada hora) o giro de estoque: média de vendas por
+# dia e dias de estoque restantes de cada produto.
+app.config['ESTOQUE_GIRO_AUTOMATICO'] = True
+
+# Autenticação: custo do hash de senha e limites de tentativas. Ao mudar o
+# método do hash, as senhas antigas são refeitas no próximo login de cada usuário.
+app.config.update(
+    SENHA_METODO_HASH=METODO_HASH_PADRAO,
+    LOGIN_LIMITE_IP=30,          # Falhas de login por IP na janela.
+    LOGIN_LIMITE_USUARIO=5,      # Falhas de login por nome de usuário na janela.
+    LOGIN_JANELA=300,            # Janela (segundos) dos limites de login.
+    CADASTRO_LIMITE_IP=10,       # Cadastros por IP por hora.
+)
+autenticador = Autenticador(
+    metodo_hash=app.config['SENHA_METODO_HASH'],
+    limite_ip=app.config['LOGIN_LIMITE_IP'],
+    limite_usuario=app.config['LOGIN_LIMITE_USUARIO'],
+    janela=app.config['LOGIN_JANELA'],
+    limite_cadastro_ip=app.config['CADASTRO_LIMITE_IP'],
+)
+
 # =====================================================================
 # SEÇÃO 3: DECORADOR DE AUTENTICAÇÃO DE ADMIN
 # Garante que apenas usuários administradores logados possam acessar certas rotas.
@@ -39,16 +136,46 @@ def admin_required(f):
             flash("Você precisa fazer login para acessar esta página.", "erro")
             return redirect(url_for('login'))
         
-        # 2. Verifica se o tipo de usuário na sessão não é '1' (que representa o administrador).
-        if session.get('tipo_usuario') != 1:
+        # 2. Confere a situação atual do usuário (cache em memória, invalidado ao
+        #    editar o usuário): contas desativadas ou removidas perdem a sessão na hora.
+        autorizacao = autorizacao_usuario(session['usuario_id'])
+        if autorizacao is None or not autorizacao[0]:
+            session.clear()
+            flash("Sua conta está desativada. Entre em contato com o administrador.", "erro")
+            return redirect(url_for('login'))
+        
+        # 3. Verifica se o tipo atual do usuário não é '1' (que representa o administrador).
+        if autorizacao[1] != 1:
             flash("Acesso negado. Você não tem permissão para acessar esta página.", "erro")
             # Redireciona para a página inicial se o usuário não for administrador.
             return redirect(url_for('home'))
         
-        # 3. Se todas as verificações passarem, a função original (a rota) é executada.
+        # 4. Se todas as verificações passarem, a função original (a rota) é executada.
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def login_required(f):
+    """ Exige apenas um usuário logado (operadores de caixa e administradores). """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'usuario_id' not in session:
+            return jsonify({'erro': 'Você precisa fazer login para acessar este recurso.'}), 401
+        autorizacao = autorizacao_usuario(session['usuario_id'])
+        if autorizacao is None or not autorizacao[0]:
+            session.clear()
+            return jsonify({'erro': 'Conta desativada.'}), 401
         return f(*args, **kwargs)
     return decorated_function
 
+
+@app.errorhandler(PosicaoInvalida)
+def posicao_invalida(err):
+    """ Token `apos`/`antes`/`desde` adulterado: 400 em vez de erro interno na consulta. """
+    if request.blueprint == 'pdv' or request.accept_mimetypes.best == 'application/json':
+        return jsonify({'erro': str(err)}), 400
+    return str(err), 400
+
 # =====================================================================
 # SEÇÃO 4: ROTAS PRINCIPAIS E DE AUTENTICAÇÃO
 # Controlam o acesso, login, cadastro e logout dos usuários.
@@ -58,8 +185,9 @@ def admin_required(f):
 def home():
     """ Rota principal. Redireciona o usuário com base no seu status de login. """
     if 'usuario_id' in session:
-        # Se for administrador, vai para o dashboard.
-        if session.get('tipo_usuario') == 1:
+        # Se for administrador (situação atual, não a do momento do login), vai para o dashboard.
+        autorizacao = autorizacao_usuario(session['usuario_id'])
+        if autorizacao is not None and autorizacao[0] and autorizacao[1] == 1:
             return redirect(url_for('admin.dashboard'))
         # Se for um usuário comum, é deslogado, pois não tem acesso ao painel.
         flash("Sua conta não tem permissão de acesso ao painel.", "info")
@@ -77,27 +205,34 @@ def cadastro():
         nome = request.form['nome']
         username = request.form['username']
         email = request.form['email']
-        # Gera um hash seguro para a senha antes de salvar no banco.
-        senha = generate_password_hash(request.form['senha'])
         
-        # Conecta ao banco de dados.
-        conn = mysql.connector.connect(**db_config)
+        # Limita cadastros por IP antes de qualquer consulta ou cálculo de hash.
+        try:
+            autenticador.registrar_cadastro(request.remote_addr)
+        except TentativasExcedidas:
+            flash("Muitos cadastros a partir deste endereço. Tente novamente mais tarde.", "erro")
+            return render_template('cadastro.html'), 429
+        
+        # Pega a conexão da requisição no pool.
+        conn = get_db()
         cursor = conn.cursor(buffered=True)
         
         # Verifica se o nome de usuário ou e-mail já existem para evitar duplicatas.
-        cursor.execute("SELECT * FROM usuario WHERE username_usuario = %s OR email_usuario = %s", (username, email))
+        cursor.execute("SELECT 1 FROM usuario WHERE username_usuario = %s OR email_usuario = %s LIMIT 1", (username, email))
         if cursor.fetchone():
             flash("Nome de usuário ou e-mail já cadastrado.", "erro")
             cursor.close()
-            conn.close()
             return redirect(url_for('cadastro'))
         
+        # Gera um hash seguro para a senha (só depois de saber que o cadastro é válido).
+        senha = autenticador.gerar_hash(request.form['senha'])
+        
         # Insere o novo usuário no banco. Por padrão, tipo_usuario=2 (usuário comum) e conta_ativa=True.
         cursor.execute("""INSERT INTO usuario (nome_usuario, username_usuario, password_usuario, email_usuario, tipo_usuario, conta_ativa)
                           VALUES (%s, %s, %s, %s, %s, %s)""", (nome, username, senha, email, 2, True))
         conn.commit()  # Confirma a transação.
         cursor.close()
-        conn.close()
+        invalidar_busca_usuarios()
         
         flash("Cadastro realizado com sucesso! Você já pode fazer login.", "sucesso")
         return redirect(url_for('login'))
@@ -113,19 +248,16 @@ def login():
         username = request.form['username'].strip()
         senha = request.form['senha'].strip()
         
-        conn = mysql.connector.connect(**db_config)
-        # `dictionary=True` faz o cursor retornar os resultados como dicionários (útil para acessar colunas pelo nome).
-        cursor = conn.cursor(dictionary=True, buffered=True)
-        
-        # Busca o usuário pelo nome de usuário fornecido.
-        cursor.execute("SELECT * FROM usuario WHERE username_usuario = %s", (username,))
-        usuario = cursor.fetchone()
-        
-        cursor.close()
-        conn.close()
+        # Busca o usuário e confere a senha, respeitando o limite de tentativas
+        # por IP e por nome de usuário.
+        try:
+            usuario = autenticador.autenticar(get_db(), username, senha, request.remote_addr)
+        except TentativasExcedidas:
+            flash("Muitas tentativas de login. Aguarde alguns minutos e tente novamente.", "erro")
+            return render_template('login.html'), 429
         
         # Verifica se o usuário existe e se a senha fornecida corresponde ao hash salvo no banco.
-        if usuario and check_password_hash(usuario['password_usuario'], senha):
+        if usuario:
             # Verifica se a conta não está desativada.
             if not usuario['conta_ativa']:
                 flash("Esta conta está desativada. Entre em contato com o administrador.", "erro")
@@ -166,20 +298,22 @@ def logout():
 
 @app.route('/sistema/admin/unidades')
 def listar_unidades():
-    conn = mysql.connector.connect(**db_config)
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM unidade_medida")
-    unidades = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return render_template('unidades.html', unidades=unidades)
+    # Tabela pequena: filtra e pagina a lista em cache, sem ir ao banco.
+    filtros = filtros_da_requisicao(request.args, ('q',))
+    unidades = referencias.unidades(conexao_avulsa)
+    if 'q' in filtros:
+        prefixo = filtros['q'].casefold()
+        unidades = [u for u in unidades if u['nome_unidade'].casefold().startswith(prefixo)]
+    pagina = paginar_lista(unidades, 'nome_unidade', 'cod_unidade',
+                           apos=request.args.get('apos'), antes=request.args.get('antes'))
+    return render_template('unidades.html', unidades=pagina.itens, pagina=pagina, filtros=filtros)
 
 @app.route('/sistema/admin/unidades/nova', methods=['GET', 'POST'])
 def nova_unidade():
     if request.method == 'POST':
         nome = request.form['nome_unidade']
         sigla = request.form['sigla_unidade']
-        conn = mysql.connector.connect(**db_config)
+        conn = get_db()
         cursor = conn.cursor()
         cursor.execute(
             "INSERT INTO unidade_medida (nome_unidade, sigla_unidade) VALUES (%s, %s)",
@@ -187,41 +321,37 @@ def nova_unidade():
         )
         conn.commit()
         cursor.close()
-        conn.close()
+        invalidar_referencias('unidade_medida')
         return redirect(url_for('listar_unidades'))
     return render_template('unidades_form.html', acao='Nova')
 
 @app.route('/sistema/admin/unidades/editar/<int:id>', methods=['GET', 'POST'])
 def editar_unidade(id):
-    conn = mysql.connector.connect(**db_config)
-    cursor = conn.cursor(dictionary=True)
-
     if request.method == 'POST':
         nome = request.form['nome_unidade']
         sigla = request.form['sigla_unidade']
+        conn = get_db()
+        cursor = conn.cursor()
         cursor.execute(
             "UPDATE unidade_medida SET nome_unidade=%s, sigla_unidade=%s WHERE cod_unidade=%s",
             (nome, sigla, id)
         )
         conn.commit()
         cursor.close()
-        conn.close()
+        invalidar_referencias('unidade_medida')
         return redirect(url_for('listar_unidades'))
 
-    cursor.execute("SELECT * FROM unidade_medida WHERE cod_unidade = %s", (id,))
-    unidade = cursor.fetchone()
-    cursor.close()
-    conn.close()
+    unidade = referencias.unidade(conexao_avulsa, id)
     return render_template('unidades_form.html', unidade=unidade, acao='Editar')
 
 @app.route('/sistema/admin/unidades/excluir/<int:id>')
 def excluir_unidade(id):
-    conn = mysql.connector.connect(**db_config)
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute("DELETE FROM unidade_medida WHERE cod_unidade = %s", (id,))
     conn.commit()
     cursor.close()
-    conn.close()
+    invalidar_referencias('unidade_medida')
     return redirect(url_for('listar_unidades'))
 
 # =====================================================================
@@ -240,63 +370,345 @@ def index():
 @admin_required
 def dashboard():
     """ Rota do painel de controle (dashboard) com estatísticas do sistema. """
-    conn = mysql.connector.connect(**db_config)
-    cursor = conn.cursor(dictionary=True)
-    
-    # Coleta de dados para os cards de resumo.
-    cursor.execute("SELECT COUNT(*) as total FROM produto")
-    total_produtos = cursor.fetchone()['total']
-    cursor.execute("SELECT COUNT(*) as total FROM categoria_produto")
-    total_categorias = cursor.fetchone()['total']
-    cursor.execute("SELECT COUNT(*) as total FROM venda")
-    total_vendas = cursor.fetchone()['total']
-    
-    # Cálculo do saldo atual do caixa (entradas - saídas).
-    cursor.execute("""
-        SELECT 
-            COALESCE((SELECT SUM(valor) FROM caixa WHERE tipo = 'entrada'), 0) - 
-            COALESCE((SELECT SUM(valor) FROM caixa WHERE tipo = 'saida'), 0) 
-        AS saldo
-    """)
-    saldo_caixa = cursor.fetchone()['saldo']
-
-    # Busca as últimas 5 vendas para exibir na tabela de vendas recentes.
-    cursor.execute("""
-        SELECT v.cod_venda, v.total, v.data_venda, u.nome_usuario 
-        FROM venda v JOIN usuario u ON v.cod_usuario = u.cod_usuario 
-        ORDER BY v.data_venda DESC LIMIT 5
-    """)
-    vendas_recentes = cursor.fetchall()
-    
-    cursor.close()
-    conn.close()
+    # Os totais vêm da tabela `resumo_sistema` (mantida por triggers) e ficam
+    # alguns segundos em cache, então o painel não varre as tabelas a cada acesso.
+    dados = obter_painel()
 
     # Renderiza a página do dashboard, passando todos os dados coletados para o template.
-    return render_template('dashboard.html', 
-                           total_produtos=total_produtos,
-                           total_categorias=total_categorias,
-                           total_vendas=total_vendas,
-                           saldo_caixa=saldo_caixa,
-                           vendas_recentes=vendas_recentes)
+    return render_template('dashboard.html', **dados)
+
+@admin_bp.route('/pool')
+@admin_required
+def status_pool():
+    """ Retorna em JSON a ocupação do pool de conexões e os tempos de espera. """
+    return jsonify(obter_pool().estatisticas())
+
+def _texto_metricas():
+    texto = app.extensions['metricas'].texto_prometheus() + texto_pool(obter_pool().estatisticas())
+    return Response(texto, mimetype='text/plain; version=0.0.4')
+
+@admin_bp.route('/metrics')
+def metricas():
+    """ Métricas no formato do Prometheus (sessão de administrador ou token METRICAS_TOKEN). """
+    token = app.config.get('METRICAS_TOKEN')
+    if token and hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+        return _texto_metricas()
+    return admin_required(_texto_metricas)()
+
+# --- Saldo e fechamento do caixa ---
+@admin_bp.route('/caixa/saldo')
+@admin_required
+def saldo_caixa():
+    """ Retorna o saldo atual do caixa, ou o saldo em um instante (?em=AAAA-MM-DDTHH:MM:SS). """
+    em = request.args.get('em')
+    if em:
+        try:
+            instante = datetime.fromisoformat(em)
+        except ValueError:
+            return jsonify({'erro': "Parâmetro 'em' inválido. Use o formato AAAA-MM-DDTHH:MM:SS."}), 400
+        return jsonify({'em': instante.isoformat(), 'saldo': str(saldo_em(get_db(), instante))})
+    return jsonify({'saldo': str(saldo_atual(get_db()))})
+
+@admin_bp.route('/caixa/fechamento', methods=['POST'])
+@admin_required
+def fechar_caixa():
+    """ Grava o fechamento de todos os dias anteriores a hoje que ainda não foram fechados. """
+    try:
+        dias = fechar_pendentes(get_db())
+    except FechamentoEmAndamento as err:
+        return jsonify({'erro': str(err)}), 409
+    return jsonify({'dias_fechados': dias})
+
+# --- Relatórios de vendas (JSON) ---
+@admin_bp.route('/relatorios/<dimensao>')
+@admin_required
+def relatorio_vendas(dimensao):
+    """
+    Relatórios a partir dos rollups: dia (?dias=7), hora (?dia=AAAA-MM-DD),
+    categoria (?dias=90), produto (?dias=30&limite=20) e operador (?dias=30).
+    """
+    conn = get_db()
+    try:
+        # 0 (ou ausente) usa o período padrão de cada relatório; no máximo ~10 anos.
+        dias = min(max(int(request.args.get('dias') or 0), 0), 3660)
+        if dimensao == 'dia':
+            dados = relatorios.vendas_por_dia(conn, dias or 7)
+        elif dimensao == 'hora':
+            dia = date.fromisoformat(request.args['dia']) if request.args.get('dia') else date.today()
+            dados = relatorios.vendas_por_hora(conn, dia)
+        elif dimensao == 'categoria':
+            dados = relatorios.vendas_por_categoria(conn, dias or 90)
+        elif dimensao == 'produto':
+            limite = max(1, min(int(request.args.get('limite', 20)), 500))
+            dados = relatorios.vendas_por_produto(conn, dias or 30, limite)
+        elif dimensao == 'operador':
+            dados = relatorios.vendas_por_operador(conn, dias or 30)
+        else:
+            return jsonify({'erro': 'Relatório inexistente.'}), 404
+    except ValueError:
+        return jsonify({'erro': 'Parâmetros inválidos.'}), 400
+    return jsonify(dados)
+
+# --- Estoque: alertas e movimentações ---
+@admin_bp.route('/estoque/alertas')
+@admin_required
+def alertas_estoque():
+    """ Produtos ativos no estoque mínimo ou abaixo dele, com o giro e os dias restantes. """
+    limite = max(1, min(request.args.get('limite', 100, type=int), 1000))
+    return jsonify(estoque.abaixo_do_minimo(get_db(), limite))
+
+@admin_bp.route('/estoque/<int:cod>/movimentar', methods=['POST'])
+@admin_required
+def movimentar_estoque(cod):
+    """ Reposição ou ajuste de estoque: {"tipo": "reposicao"|"ajuste", "quantidade": 10, "observacao": "..."} """
+    dados = request.get_json(silent=True) or {}
+    try:
+        quantidade = int(dados.get('quantidade'))
+        nova = estoque.movimentar(get_db(), cod, dados.get('tipo'), quantidade,
+                                  session['usuario_id'], dados.get('observacao'))
+    except (TypeError, ValueError) as err:
+        return jsonify({'erro': str(err) if isinstance(err, estoque.MovimentacaoInvalida) else 'Quantidade inválida.'}), 400
+    return jsonify({'cod_produto': cod, 'quantidade': nova})
+
+@admin_bp.route('/estoque/<int:cod>/minimo', methods=['POST'])
+@admin_required
+def estoque_minimo(cod):
+    """ Define o ponto de reposição do produto: {"estoque_minimo": 20} """
+    dados = request.get_json(silent=True) or {}
+    try:
+        minimo = int(dados.get('estoque_minimo'))
+    except (TypeError, ValueError):
+        return jsonify({'erro': 'estoque_minimo deve ser um número inteiro.'}), 400
+    if minimo < 0 or not estoque.definir_minimo(get_db(), cod, minimo):
+        return jsonify({'erro': 'Produto não encontrado ou valor inválido.'}), 400
+    return jsonify({'cod_produto': cod, 'estoque_minimo': minimo})
+
+@admin_bp.route('/estoque/<int:cod>/movimentacoes')
+@admin_required
+def movimentacoes_estoque(cod):
+    """ Últimas movimentações de estoque de um produto. """
+    limite = max(1, min(request.args.get('limite', 100, type=int), 1000))
+    return jsonify(estoque.historico(get_db(), cod, limite))
+
+# --- Terminais de caixa (modo offline) ---
+@admin_bp.route('/pdv/terminais')
+@admin_required
+def terminais_pdv():
+    """ Fila de vendas ainda não sincronizadas e vazão de envio informadas por cada terminal. """
+    return jsonify(situacao_terminais(get_db()))
+
+# --- Tarefas em segundo plano ---
+# Funções executadas pelas threads de `tarefas.Executor`, fora da requisição.
+# Rodam sem contexto de aplicação: recebem a conexão e usam o pool diretamente.
+@tarefas.tarefa('reprecificar')
+def _tarefa_reprecificar(conn, parametros, progresso):
+    return reprecificar(conn, cod_pvp=parametros.get('cod_pvp'), cod_categoria=parametros.get('cod_categoria'),
+                        progresso=progresso)
+
+@tarefas.tarefa('importar_produtos')
+def _tarefa_importar_produtos(conn, parametros, progresso):
+    caminho = parametros['arquivo']
+    if not os.path.exists(caminho):
+        raise tarefas.FalhaDefinitiva("O arquivo enviado não está mais disponível; envie-o de novo.")
+    tamanho = os.path.getsize(caminho) or 1
+    try:
+        with open(caminho, 'rb') as bruto:
+            texto = io.TextIOWrapper(bruto, encoding='utf-8-sig', newline='')
+            resultado = importar_csv_produtos(conn, texto, cod_usuario=parametros.get('cod_usuario'),
+                                              progresso=lambda parcial: progresso(
+                bruto.tell() / tamanho, f"{parcial.lidas} linha(s) lida(s), {parcial.gravadas} gravada(s)"))
+    except UnicodeDecodeError as err:
+        raise tarefas.FalhaDefinitiva(f"O arquivo não está em UTF-8: {err}") from err
+    os.remove(caminho)
+    invalidar_painel()
+    return resultado.como_dict()
+
+@tarefas.tarefa('exportar')
+def _tarefa_exportar(conn, parametros, progresso):
+    de = date.fromisoformat(parametros['de']) if parametros.get('de') else None
+    ate = date.fromisoformat(parametros['ate']) if parametros.get('ate') else None
+    sql, params = montar_consulta(parametros['tipo'], de, ate, parametros.get('usuario'))
+    pasta = app.config['TAREFAS_PASTA']
+    os.makedirs(pasta, exist_ok=True)
+    caminho = os.path.join(pasta, f"exportacao_{uuid.uuid4().hex}.{parametros['formato']}")
+    # Grava em um arquivo temporário e só o renomeia no fim: uma tentativa
+    # interrompida nunca deixa um arquivo incompleto disponível para download.
+    with open(caminho + '.parcial', 'w', encoding='utf-8', newline='') as arquivo:
+        for bloco in gerar_linhas(pool_mysql, sql, params, parametros['formato']):
+            arquivo.write(bloco)
+            progresso(0, f"{arquivo.tell() // 1024} KB gravados")
+    os.replace(caminho + '.parcial', caminho)
+    return {'arquivo': caminho, 'nome': parametros['nome'], 'bytes': os.path.getsize(caminho)}
+
+@tarefas.tarefa('atualizar_relatorios')
+def _tarefa_atualizar_relatorios(conn, parametros, progresso):
+    vendas = relatorios.atualizar_rollups(conn)
+    progresso(0.5, f"{vendas} venda(s) agregada(s); recalculando o giro de estoque")
+    giro = estoque.calcular_giro(conn)
+    if parametros.get('resumo'):
+        recalcular_resumo(conn)
+        invalidar_painel()
+    return {'vendas_agregadas': vendas, 'giro_linhas': giro}
+
+def _agendar(tipo, parametros=None, **opcoes):
+    """ Enfileira uma tarefa em nome do administrador logado e retorna o seu código. """
+    return tarefas.enfileirar(get_db(), tipo, parametros, cod_usuario=session.get('usuario_id'), **opcoes)
+
+def _resposta_tarefa(cod):
+    """ Resposta 202 das rotas JSON que agendam uma tarefa: o código e a URL de acompanhamento. """
+    return jsonify({'tarefa': cod, 'url': url_for('admin.situacao_tarefa', cod=cod)}), 202
+
+@admin_bp.route('/tarefas')
+@admin_required
+def tarefas_recentes():
+    """ Últimas tarefas em segundo plano, com status e progresso. """
+    limite = max(1, min(request.args.get('limite', 50, type=int), 500))
+    return jsonify(tarefas.listar_tarefas(get_db(), limite))
+
+@admin_bp.route('/tarefas/<int:cod>')
+@admin_required
+def situacao_tarefa(cod):
+    """ Status, progresso e resultado de uma tarefa (consultado por polling). """
+    tarefa = tarefas.obter_tarefa(get_db(), cod)
+    if tarefa is None:
+        return jsonify({'erro': 'Tarefa não encontrada.'}), 404
+    return jsonify(tarefa)
+
+@admin_bp.route('/tarefas/<int:cod>/arquivo')
+@admin_required
+def arquivo_tarefa(cod):
+    """ Download do arquivo gerado por uma exportação em segundo plano. """
+    tarefa = tarefas.obter_tarefa(get_db(), cod)
+    if tarefa is None or tarefa['tipo'] != 'exportar':
+        return jsonify({'erro': 'Exportação não encontrada.'}), 404
+    if tarefa['status'] != 'concluida':
+        return jsonify({'erro': 'A exportação ainda não terminou.', 'status': tarefa['status']}), 409
+    caminho = tarefa['resultado']['arquivo']
+    if not os.path.exists(caminho):
+        return jsonify({'erro': 'O arquivo já foi removido; agende a exportação de novo.'}), 410
+    return send_file(caminho, mimetype=FORMATOS[tarefa['parametros']['formato']],
+                     as_attachment=True, download_name=tarefa['resultado']['nome'])
+
+@admin_bp.route('/relatorios/atualizar', methods=['POST'])
+@admin_required
+def atualizar_relatorios():
+    """ Agenda a atualização dos rollups e do giro de estoque (resumo=1 também recalcula o painel). """
+    return _resposta_tarefa(_agendar('atualizar_relatorios', {'resumo': bool(request.args.get('resumo'))},
+                                     unica=True))
+
+# --- Exportação para a contabilidade ---
+@admin_bp.route('/exportar/<tipo>')
+@admin_required
+def exportar(tipo):
+    """
+    Exporta vendas, itens de venda ou movimentações de caixa em streaming.
+    Parâmetros: formato=csv|ndjson, de=AAAA-MM-DD, ate=AAAA-MM-DD, usuario=<cod>.
+    Com assincrono=1, agenda a exportação como tarefa e responde 202.
+    """
+    formato = request.args.get('formato', 'csv')
+    if tipo not in EXPORTACOES or formato not in FORMATOS:
+        return jsonify({'erro': 'Exportação ou formato inválido.'}), 400
+    try:
+        de = date.fromisoformat(request.args['de']) if request.args.get('de') else None
+        ate = date.fromisoformat(request.args['ate']) if request.args.get('ate') else None
+        cod_usuario = int(request.args['usuario']) if request.args.get('usuario') else None
+    except ValueError:
+        return jsonify({'erro': 'Use datas no formato AAAA-MM-DD e um código de usuário numérico.'}), 400
+
+    nome_arquivo = f"{tipo}_{de or 'inicio'}_{ate or 'hoje'}.{formato}"
+    if request.args.get('assincrono'):
+        # Gera o arquivo em segundo plano; o download fica em /tarefas/<cod>/arquivo.
+        return _resposta_tarefa(_agendar('exportar', {
+            'tipo': tipo, 'formato': formato, 'de': de, 'ate': ate, 'usuario': cod_usuario,
+            'nome': nome_arquivo,
+        }))
+
+    sql, params = montar_consulta(tipo, de, ate, cod_usuario)
+    return Response(gerar_linhas(obter_pool(), sql, params, formato),
+                    mimetype=FORMATOS[formato],
+                    headers={'Content-Disposition': f'attachment; filename="{nome_arquivo}"'})
+
+# --- Importação do catálogo de produtos ---
+@admin_bp.route('/produtos/importar', methods=['GET', 'POST'])
+@admin_required
+def importar_produtos():
+    """
+    Importa (insere ou atualiza pelo código de barras) produtos de um arquivo CSV.
+    O upload é salvo em disco e importado em segundo plano; a página acompanha
+    a tarefa (?tarefa=<cod>) e mostra o resultado quando ela termina.
+    """
+    if request.method == 'POST':
+        arquivo = request.files.get('arquivo')
+        if not arquivo or not arquivo.filename:
+            flash("Selecione um arquivo CSV.", "erro")
+            return redirect(url_for('admin.importar_produtos'))
+        os.makedirs(app.config['TAREFAS_PASTA'], exist_ok=True)
+        caminho = os.path.join(app.config['TAREFAS_PASTA'], f"importacao_{uuid.uuid4().hex}.csv")
+        arquivo.save(caminho)
+        cod = _agendar('importar_produtos', {'arquivo': caminho, 'nome': arquivo.filename,
+                                             'cod_usuario': session['usuario_id']})
+        return redirect(url_for('admin.importar_produtos', tarefa=cod))
+
+    tarefa = resultado = None
+    if request.args.get('tarefa', type=int):
+        tarefa = tarefas.obter_tarefa(get_db(), request.args.get('tarefa', type=int))
+        if tarefa is None or tarefa['tipo'] != 'importar_produtos':
+            flash("Importação não encontrada.", "erro")
+            return redirect(url_for('admin.importar_produtos'))
+        if tarefa['status'] == 'concluida':
+            resultado = tarefa['resultado']
+    return render_template('importar_produtos.html', resultado=resultado, tarefa=tarefa)
 
 # --- CRUD para Usuários ---
+# Máximo de usuários encontrados pela busca da listagem (filtro `q`) no
+# índice em memória; se a busca no índice é cortada, o filtro vai para o
+# índice FULLTEXT de `usuario` (migração 0010).
+LIMITE_BUSCA_USUARIOS = 1000
+
 @admin_bp.route('/usuarios')
 @admin_required
 def usuarios():
-    """ Rota para listar todos os usuários do sistema. """
-    conn = mysql.connector.connect(**db_config)
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT cod_usuario, nome_usuario, username_usuario, email_usuario, tipo_usuario, conta_ativa FROM usuario ORDER BY nome_usuario ASC")
-    lista_usuarios = cursor.fetchall()
+    """ Rota para listar os usuários do sistema, paginada e com busca/filtros. """
+    filtros = filtros_da_requisicao(request.args, ('q', 'ativo', 'tipo'))
+    condicoes, params = [], []
+    if 'q' in filtros:
+        # Busca sem acentos por início de palavra no nome, login ou e-mail (índice em memória).
+        codigos, cortada = buscar_codigos_usuarios(conexao_avulsa, filtros['q'], LIMITE_BUSCA_USUARIOS)
+        if not cortada:
+            condicoes.append(f"cod_usuario IN ({', '.join(['%s'] * len(codigos))})" if codigos else "FALSE")
+            params += codigos
+        else:
+            # O índice parou antes de conferir todos os candidatos: o mesmo
+            # filtro (prefixo de cada palavra), sem teto, pelo índice FULLTEXT.
+            condicoes.append("MATCH (nome_usuario, username_usuario, email_usuario) AGAINST (%s IN BOOLEAN MODE)")
+            params.append(consulta_fulltext(filtros['q']))
+    if filtros.get('ativo') in ('0', '1'):
+        condicoes.append("conta_ativa = %s")
+        params.append(filtros['ativo'] == '1')
+    if filtros.get('tipo') in ('1', '2'):
+        condicoes.append("tipo_usuario = %s")
+        params.append(int(filtros['tipo']))
+
+    cursor = get_db().cursor(dictionary=True)
+    pagina = paginar(cursor, "SELECT cod_usuario, nome_usuario, username_usuario, email_usuario, tipo_usuario, conta_ativa FROM usuario",
+                     'nome_usuario', 'cod_usuario', condicoes, params,
+                     apos=request.args.get('apos'), antes=request.args.get('antes'))
     cursor.close()
-    conn.close()
-    return render_template('usuarios.html', usuarios=lista_usuarios)
+    return render_template('usuarios.html', usuarios=pagina.itens, pagina=pagina, filtros=filtros)
+
+@admin_bp.route('/usuarios/busca')
+@admin_required
+def autocompletar_usuarios():
+    """ Autocompletar: ?q=<texto>&limite=<n> -> usuários por nome, login ou e-mail, ignorando acentos. """
+    limite = max(1, min(request.args.get('limite', 10, type=int), 50))
+    usuarios = buscar_usuarios(conexao_avulsa, request.args.get('q', ''), limite)
+    return jsonify({'usuarios': [{**u, 'conta_ativa': bool(u['conta_ativa'])} for u in usuarios]})
 
 @admin_bp.route('/usuarios/editar/<int:cod>', methods=['GET', 'POST'])
 @admin_required
 def editar_usuario(cod):
     """ Rota para editar o tipo e o status de um usuário. """
-    conn = mysql.connector.connect(**db_config)
+    conn = get_db()
     cursor = conn.cursor(dictionary=True)
 
     if request.method == 'POST':
@@ -307,7 +719,8 @@ def editar_usuario(cod):
         cursor.execute("UPDATE usuario SET tipo_usuario = %s, conta_ativa = %s WHERE cod_usuario = %s", (tipo_usuario, conta_ativa, cod))
         conn.commit()
         cursor.close()
-        conn.close()
+        # A nova situação vale já na próxima requisição do usuário editado.
+        invalidar_autorizacao(cod)
         flash("Usuário atualizado com sucesso!", "sucesso")
         return redirect(url_for('admin.usuarios'))
 
@@ -315,7 +728,6 @@ def editar_usuario(cod):
     cursor.execute("SELECT cod_usuario, nome_usuario, username_usuario, email_usuario, tipo_usuario, conta_ativa FROM usuario WHERE cod_usuario = %s", (cod,))
     usuario = cursor.fetchone()
     cursor.close()
-    conn.close()
     if not usuario:
         flash("Usuário não encontrado.", "erro")
         return redirect(url_for('admin.usuarios'))
@@ -323,17 +735,32 @@ def editar_usuario(cod):
     return render_template('editar_usuario.html', usuario=usuario)
 
 # --- CRUD para PVP ---
+def _agendar_reprecificacao(**filtro):
+    """ Agenda a reprecificação dos produtos afetados e avisa o administrador. """
+    cod = _agendar('reprecificar', filtro, unica=True)
+    flash(f"Reprecificação dos produtos agendada (tarefa #{cod}); os preços são atualizados em segundo plano.", "info")
+
 @admin_bp.route('/pvps')
 @admin_required
 def pvps():
-    """ Rota para listar todos os PVPs. """
-    conn = mysql.connector.connect(**db_config)
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM pvp ORDER BY nome_pvp ASC")
-    lista_pvps = cursor.fetchall()
+    """ Rota para listar os PVPs, paginada e com busca/filtros. """
+    filtros = filtros_da_requisicao(request.args, ('q', 'ativo', 'tipo'))
+    condicoes, params = [], []
+    if 'q' in filtros:
+        condicoes.append("nome_pvp LIKE %s")
+        params.append(prefixo_like(filtros['q']))
+    if filtros.get('ativo') in ('0', '1'):
+        condicoes.append("ativo = %s")
+        params.append(filtros['ativo'] == '1')
+    if filtros.get('tipo') in ('global', 'categoria'):
+        condicoes.append("tipo_pvp = %s")
+        params.append(filtros['tipo'])
+
+    cursor = get_db().cursor(dictionary=True)
+    pagina = paginar(cursor, "SELECT * FROM pvp", 'nome_pvp', 'cod_pvp', condicoes, params,
+                     apos=request.args.get('apos'), antes=request.args.get('antes'))
     cursor.close()
-    conn.close()
-    return render_template('pvps.html', pvps=lista_pvps)
+    return render_template('pvps.html', pvps=pagina.itens, pagina=pagina, filtros=filtros)
 
 @admin_bp.route('/pvps/cadastrar', methods=['GET', 'POST'])
 @admin_required
@@ -344,7 +771,7 @@ def cadastrar_pvp():
         percentual = request.form['percentual']
         tipo = request.form['tipo_pvp']
         
-        conn = mysql.connector.connect(**db_config)
+        conn = get_db()
         cursor = conn.cursor(dictionary=True)
 
         # Validação para impedir o cadastro de mais de um PVP Global ativo.
@@ -353,15 +780,19 @@ def cadastrar_pvp():
             if cursor.fetchone():
                 flash("Já existe um PVP Global ativo. Inative o PVP existente antes de cadastrar um novo.", "erro")
                 cursor.close()
-                conn.close()
                 return redirect(url_for('admin.cadastrar_pvp'))
 
         query = "INSERT INTO pvp (nome_pvp, percentual, tipo_pvp) VALUES (%s, %s, %s)"
         cursor.execute(query, (nome, percentual, tipo))
+        cod_pvp = cursor.lastrowid
         conn.commit()
+        invalidar_referencias('pvp')
         cursor.close()
-        conn.close()
         flash("PVP cadastrado com sucesso!", "sucesso")
+
+        # Um novo PVP Global ativo passa a valer para os produtos sem PVP próprio/de categoria.
+        if tipo == 'global':
+            _agendar_reprecificacao(cod_pvp=cod_pvp)
         return redirect(url_for('admin.pvps'))
 
     return render_template('cadastrar_pvp.html')
@@ -370,7 +801,7 @@ def cadastrar_pvp():
 @admin_required
 def editar_pvp(cod):
     """ Rota para editar um PVP existente. """
-    conn = mysql.connector.connect(**db_config)
+    conn = get_db()
     cursor = conn.cursor(dictionary=True)
 
     if request.method == 'POST':
@@ -386,7 +817,6 @@ def editar_pvp(cod):
             if cursor.fetchone():
                 flash("Já existe outro PVP Global ativo. Inative o PVP existente antes de ativar este.", "erro")
                 cursor.close()
-                conn.close()
                 return redirect(url_for('admin.editar_pvp', cod=cod))
 
         query = """
@@ -395,20 +825,21 @@ def editar_pvp(cod):
         """
         cursor.execute(query, (nome, percentual, tipo, ativo, cod))
         conn.commit()
+        invalidar_referencias('pvp')
         cursor.close()
-        conn.close()
         flash("PVP atualizado com sucesso!", "sucesso")
+
+        # Recalcula o preço de venda de todos os produtos que dependem deste PVP.
+        _agendar_reprecificacao(cod_pvp=cod)
         return redirect(url_for('admin.pvps'))
 
-    # Se GET, busca dados do PVP para preencher o formulário.
-    cursor.execute("SELECT * FROM pvp WHERE cod_pvp = %s", (cod,))
-    pvp = cursor.fetchone()
+    # Se GET, os dados do PVP para preencher o formulário vêm do cache de referência.
+    cursor.close()
+    pvp = referencias.pvp(conexao_avulsa, cod)
     if not pvp:
         flash("PVP não encontrado.", "erro")
         return redirect(url_for('admin.pvps'))
     
-    cursor.close()
-    conn.close()
     return render_template('editar_pvp.html', pvp=pvp)
 
 @admin_bp.route('/pvps/excluir/<int:cod>', methods=['POST'])
@@ -416,87 +847,87 @@ def editar_pvp(cod):
 def excluir_pvp(cod):
     """ Rota para excluir um PVP. """
     try:
-        conn = mysql.connector.connect(**db_config)
+        conn = get_db()
         cursor = conn.cursor()
         cursor.execute("DELETE FROM pvp WHERE cod_pvp = %s", (cod,))
         conn.commit()
+        invalidar_referencias('pvp')
         cursor.close()
-        conn.close()
         flash("PVP excluído com sucesso!", "sucesso")
     except mysql.connector.Error as err:
         # Captura erro se o PVP estiver em uso por uma categoria (chave estrangeira).
         flash(f"Não foi possível excluir o PVP. Verifique se ele não está em uso por uma categoria. Erro: {err}", "erro")
     return redirect(url_for('admin.pvps'))
 
+@admin_bp.route('/pvps/<int:cod>/reprecificar', methods=['GET', 'POST'])
+@admin_required
+def reprecificar_pvp(cod):
+    """
+    Reprecifica os produtos afetados pelo PVP. GET apenas simula (quantos preços
+    mudariam e uma amostra); POST agenda a gravação dos novos preços como
+    tarefa em segundo plano e responde 202.
+    """
+    if request.method == 'POST':
+        return _resposta_tarefa(_agendar('reprecificar', {'cod_pvp': cod}, unica=True))
+    return jsonify(reprecificar(get_db(), cod_pvp=cod, simular=True))
+
 # --- CRUD para Categorias ---
 @admin_bp.route('/categorias')
 @admin_required
 def categorias():
-    """ Lista todas as categorias cadastradas. """
-    conn = mysql.connector.connect(**db_config)
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("""
-        SELECT c.cod_categoria, c.nome_categoria, c.descricao_categoria, 
+    """ Lista as categorias cadastradas, paginada e com busca por nome. """
+    filtros = filtros_da_requisicao(request.args, ('q',))
+    condicoes, params = [], []
+    if 'q' in filtros:
+        condicoes.append("c.nome_categoria LIKE %s")
+        params.append(prefixo_like(filtros['q']))
+
+    cursor = get_db().cursor(dictionary=True)
+    pagina = paginar(cursor, """
+        SELECT c.cod_categoria, c.nome_categoria, c.descricao_categoria,
                p.nome_pvp AS nome_pvp
         FROM categoria_produto c
         LEFT JOIN pvp p ON c.pvp_categoria = p.cod_pvp
-        ORDER BY c.nome_categoria ASC
-    """)
-    lista_categorias = cursor.fetchall()
+    """, 'c.nome_categoria', 'c.cod_categoria', condicoes, params,
+                     apos=request.args.get('apos'), antes=request.args.get('antes'))
     cursor.close()
-    conn.close()
-    return render_template('categorias.html', categorias=lista_categorias)
+    return render_template('categorias.html', categorias=pagina.itens, pagina=pagina, filtros=filtros)
 
 
 @admin_bp.route('/categorias/cadastrar', methods=['GET', 'POST'])
 @admin_required
 def cadastrar_categoria():
     """ Cadastra uma nova categoria de produto. """
-    conn = mysql.connector.connect(**db_config)
-    cursor = conn.cursor(dictionary=True)
-
-    # Busca lista de PVPs para o select do formulário
-    cursor.execute("SELECT cod_pvp, nome_pvp FROM pvp WHERE ativo = TRUE ORDER BY nome_pvp ASC")
-    lista_pvps = cursor.fetchall()
-
     if request.method == 'POST':
         nome = request.form['nome_categoria']
         descricao = request.form['descricao_categoria']
         pvp = request.form.get('pvp_categoria') or None
 
+        conn = get_db()
+        cursor = conn.cursor()
         cursor.execute("""
             INSERT INTO categoria_produto (nome_categoria, descricao_categoria, pvp_categoria)
             VALUES (%s, %s, %s)
         """, (nome, descricao, pvp))
         conn.commit()
+        invalidar_referencias('categoria_produto')
         cursor.close()
-        conn.close()
+        invalidar_painel()
         flash("Categoria cadastrada com sucesso!", "sucesso")
         return redirect(url_for('admin.categorias'))
 
-    cursor.close()
-    conn.close()
-    return render_template('cadastrar_categoria.html', pvps=lista_pvps)
+    # Lista de PVPs ativos para o select do formulário (cache de referência).
+    return render_template('cadastrar_categoria.html', pvps=referencias.pvps(conexao_avulsa, somente_ativos=True))
 
 
 @admin_bp.route('/categorias/editar/<int:cod>', methods=['GET', 'POST'])
 @admin_required
 def editar_categoria(cod):
     """ Edita uma categoria existente. """
-    conn = mysql.connector.connect(**db_config)
-    cursor = conn.cursor(dictionary=True)
-
-    # Busca lista de PVPs
-    cursor.execute("SELECT cod_pvp, nome_pvp FROM pvp ORDER BY nome_pvp ASC")
-    lista_pvps = cursor.fetchall()
-
-    # Busca categoria atual
-    cursor.execute("SELECT * FROM categoria_produto WHERE cod_categoria = %s", (cod,))
-    categoria = cursor.fetchone()
+    # Categoria atual e lista de PVPs vêm do cache de referência.
+    categoria = referencias.categoria(conexao_avulsa, cod)
 
     if not categoria:
-        cursor.close()
-        conn.close()
         flash("Categoria não encontrada.", "erro")
         return redirect(url_for('admin.categorias'))
 
@@ -505,20 +936,24 @@ def editar_categoria(cod):
         descricao = request.form['descricao_categoria']
         pvp = request.form.get('pvp_categoria') or None
 
+        conn = get_db()
+        cursor = conn.cursor()
         cursor.execute("""
             UPDATE categoria_produto
             SET nome_categoria=%s, descricao_categoria=%s, pvp_categoria=%s
             WHERE cod_categoria=%s
         """, (nome, descricao, pvp, cod))
         conn.commit()
+        invalidar_referencias('categoria_produto')
         cursor.close()
-        conn.close()
         flash("Categoria atualizada com sucesso!", "sucesso")
+
+        # O PVP da categoria pode ter mudado: recalcula os preços dos produtos dela.
+        if str(categoria['pvp_categoria']) != str(pvp):
+            _agendar_reprecificacao(cod_categoria=cod)
         return redirect(url_for('admin.categorias'))
 
-    cursor.close()
-    conn.close()
-    return render_template('editar_categoria.html', categoria=categoria, pvps=lista_pvps)
+    return render_template('editar_categoria.html', categoria=categoria, pvps=referencias.pvps(conexao_avulsa))
 
 
 @admin_bp.route('/categorias/excluir/<int:cod>', methods=['POST'])
@@ -526,28 +961,325 @@ def editar_categoria(cod):
 def excluir_categoria(cod):
     """ Exclui uma categoria do banco. """
     try:
-        conn = mysql.connector.connect(**db_config)
+        conn = get_db()
         cursor = conn.cursor()
         cursor.execute("DELETE FROM categoria_produto WHERE cod_categoria = %s", (cod,))
         conn.commit()
+        invalidar_referencias('categoria_produto')
         cursor.close()
-        conn.close()
+        invalidar_painel()
         flash("Categoria excluída com sucesso!", "sucesso")
     except mysql.connector.Error as err:
         flash(f"Erro ao excluir categoria: {err}", "erro")
     return redirect(url_for('admin.categorias'))
 
 # =====================================================================
-# SEÇÃO 6: REGISTRO DO BLUEPRINT E EXECUÇÃO
+# SEÇÃO 6: PONTO DE VENDA (/sistema/pdv/)
+# API JSON usada pelos terminais de caixa.
+# =====================================================================
+pdv_bp = Blueprint('pdv', __name__, url_prefix='/sistema/pdv')
+
+@pdv_bp.route('/vendas', methods=['POST'])
+@login_required
+def checkout():
+    """
+    Registra uma venda a partir do carrinho enviado em JSON:
+    {"itens": [{"cod_produto": 1, "quantidade": 2}, ...]}
+    """
+    dados = request.get_json(silent=True) or {}
+    if not isinstance(dados, dict):
+        return jsonify({'erro': 'Envie um objeto JSON com "itens".'}), 400
+    try:
+        venda = registrar_venda(get_db(), session['usuario_id'], dados.get('itens'))
+    except EstoqueInsuficiente as err:
+        return jsonify({'erro': str(err), 'disponivel': err.faltas}), 409
+    except VendaInvalida as err:
+        return jsonify({'erro': str(err)}), 400
+    venda['total'] = str(venda['total'])
+    return jsonify(venda), 201
+
+def _atualizar_indice():
+    # Relê só os produtos alterados, no máximo a cada poucos segundos; na maior
+    # parte das leituras nenhuma conexão com o banco é usada. A releitura usa
+    # uma conexão própria do pool, porque começa com um commit (snapshot novo).
+    if indice_produtos.precisa_atualizar():
+        conn = pool_mysql.obter()
+        try:
+            indice_produtos.atualizar(conn)
+        finally:
+            pool_mysql.devolver(conn)
+
+def _buscar_no_indice(busca, chave):
+    _atualizar_indice()
+    return busca(chave)
+
+@pdv_bp.route('/produtos/barras/<codigo_barras>')
+@login_required
+def buscar_por_codigo_barras(codigo_barras):
+    """ Leitura de código de barras: busca o produto no índice em memória. """
+    produto = _buscar_no_indice(indice_produtos.por_codigo_barras, codigo_barras)
+    if produto is None:
+        return jsonify({'erro': 'Produto não encontrado.'}), 404
+    return jsonify(produto.como_dict())
+
+@pdv_bp.route('/produtos/busca')
+@login_required
+def autocompletar_produtos():
+    """
+    Autocompletar do caixa: ?q=<texto>&limite=<n> -> produtos ativos cujo nome tem
+    palavras começando com as digitadas ("hortif" acha "Hortifrúti"), os mais relevantes primeiro.
+    """
+    limite = max(1, min(request.args.get('limite', 10, type=int), 50))
+    produtos = _buscar_no_indice(lambda q: indice_produtos.buscar(q, limite), request.args.get('q', ''))
+    return jsonify({'produtos': [produto.como_dict() for produto in produtos]})
+
+@pdv_bp.route('/precos', methods=['POST'])
+@login_required
+def precos_efetivos():
+    """
+    Resolve em uma chamada o preço efetivo de vários produtos, sem consultar o banco:
+    {"produtos": [1, 2, 3], "em": "AAAA-MM-DDTHH:MM:SS" (opcional)}
+    """
+    dados = request.get_json(silent=True) or {}
+    instante = None
+    if dados.get('em'):
+        try:
+            instante = datetime.fromisoformat(dados['em'])
+        except (TypeError, ValueError):
+            return jsonify({'erro': "Parâmetro 'em' inválido. Use o formato AAAA-MM-DDTHH:MM:SS."}), 400
+    try:
+        codigos = [int(cod) for cod in dados.get('produtos') or []]
+    except (TypeError, ValueError):
+        return jsonify({'erro': "'produtos' deve ser uma lista de códigos inteiros."}), 400
+
+    _atualizar_indice()
+    produtos = [indice_produtos.por_cod_produto(cod) for cod in codigos]
+    encontrados = [p for p in produtos if p is not None]
+    return jsonify({
+        'precos': resolver_lote(obter_hierarquia(conexao_avulsa), encontrados, instante),
+        'nao_encontrados': [cod for cod, p in zip(codigos, produtos) if p is None],
+    })
+
+@pdv_bp.route('/produtos/<int:cod>')
+@login_required
+def buscar_por_cod_produto(cod):
+    """ Busca um produto pelo código interno no índice em memória. """
+    produto = _buscar_no_indice(indice_produtos.por_cod_produto, cod)
+    if produto is None:
+        return jsonify({'erro': 'Produto não encontrado.'}), 404
+    return jsonify(produto.como_dict())
+
+# --- Sincronização dos terminais offline (terminal_pdv.py) ---
+@pdv_bp.route('/catalogo')
+@login_required
+def catalogo_terminal():
+    """ Produtos alterados e removidos desde ?desde=<token>, em páginas, para a réplica local dos terminais. """
+    limite = max(1, min(request.args.get('limite', PAGINA_CATALOGO, type=int), PAGINA_CATALOGO))
+    produtos, removidos, proximo, completo = catalogo_desde(get_db(), request.args.get('desde'), limite)
+    return jsonify({'produtos': produtos, 'removidos': removidos, 'proximo': proximo, 'completo': completo})
+
+@pdv_bp.route('/vendas/lote', methods=['POST'])
+@login_required
+def sincronizar_vendas():
+    """
+    Recebe um lote da fila de vendas de um terminal offline:
+    {"terminal": "caixa-01", "vendas": [{"id": "<uuid>", "data": "AAAA-MM-DDTHH:MM:SS",
+     "itens": [{"cod_produto": 1, "quantidade": 2, "preco_unitario": "3.50"}]}, ...],
+     "pendentes": <vendas que ficaram na fila>, "pendente_desde": "AAAA-MM-DDTHH:MM:SS"}
+    Reenviar o mesmo lote é seguro: vendas já recebidas voltam como 'duplicada'.
+    O "cod_usuario" de cada venda só vale para administradores; para os demais,
+    as vendas ficam no nome do usuário logado.
+    """
+    dados = request.get_json(silent=True) or {}
+    if not isinstance(dados, dict):
+        return jsonify({'erro': 'Envie um objeto JSON com "terminal" e "vendas".'}), 400
+    admin = autorizacao_usuario(session['usuario_id'])[1] == 1
+    try:
+        pendente_desde = datetime.fromisoformat(dados['pendente_desde']) if dados.get('pendente_desde') else None
+        resultado = receber_lote(get_db(), dados.get('terminal'), session['usuario_id'], dados.get('vendas'),
+                                 dados.get('pendentes'), pendente_desde, admin=admin)
+    except (TypeError, ValueError) as err:
+        # LoteInvalido também é um ValueError: lote mal formado, nada foi gravado.
+        return jsonify({'erro': str(err) if isinstance(err, LoteInvalido) else 'Lote inválido.'}), 400
+
+    registro = app.extensions['metricas']
+    registro.observar('caixa_pdv_lote_segundos', resultado['segundos'])
+    for status in ('gravadas', 'duplicadas', 'rejeitadas'):
+        if resultado[status]:
+            registro.incrementar('caixa_pdv_vendas_offline_total', resultado[status], (('status', status),))
+    if resultado['gravadas']:
+        invalidar_painel()
+    return jsonify(resultado)
+
+# =====================================================================
+# SEÇÃO 7: REGISTRO DOS BLUEPRINTS E EXECUÇÃO
 # Finaliza a configuração e inicia a aplicação.
 # =====================================================================
 
-# Registra o blueprint administrativo na aplicação principal para que as rotas funcionem.
+# Registra os blueprints na aplicação principal para que as rotas funcionem.
 app.register_blueprint(admin_bp)
+app.register_blueprint(pdv_bp)
+
+
+def iniciar_servicos():
+    """
+    Tarefas em segundo plano do servidor web. Chamada só pelos pontos de
+    entrada do servidor (wsgi.criar_app e `python app.py`), e não na
+    importação: comandos `flask`, benchmarks e o processo pai do recarregador
+    não as iniciam.
+    """
+    if 'servicos' in app.extensions:
+        return
+    app.extensions['servicos'] = True
+    # Threads que executam as tarefas da fila (reprecificação, importação etc.).
+    if app.config['TAREFAS_TRABALHADORES']:
+        executor_tarefas.iniciar()
+    # Índice do PDV carregado ao subir e relido por inteiro periodicamente.
+    indice_produtos.iniciar_manutencao(pool_mysql.obter, pool_mysql.devolver)
+    # Vendas novas somadas aos rollups dos relatórios (as rotas só leem).
+    relatorios.iniciar_atualizacao_periodica(pool_mysql.obter, pool_mysql.devolver)
+    # Giro de estoque (usa conexões do próprio pool).
+    if app.config['ESTOQUE_GIRO_AUTOMATICO']:
+        estoque.iniciar_calculo_periodico(pool_mysql.obter, pool_mysql.devolver,
+                                          antes=relatorios.atualizar_rollups)
+
+
+@app.cli.command('recalcular-resumo')
+def recalcular_resumo_comando():
+    """ Reconstrói os contadores do dashboard a partir das tabelas (flask recalcular-resumo). """
+    recalcular_resumo(get_db())
+    print("Contadores de resumo_sistema recalculados.")
+
+
+@app.cli.command('importar-produtos')
+@click.argument('arquivo', type=click.Path(exists=True, dir_okay=False))
+@click.option('--lote', default=1000, show_default=True, help='Produtos por INSERT/transação.')
+def importar_produtos_comando(arquivo, lote):
+    """ Importa produtos de um CSV do fornecedor (flask importar-produtos arquivo.csv). """
+    with open(arquivo, encoding='utf-8-sig', newline='') as texto:
+        resultado = importar_csv_produtos(get_db(), texto, tamanho_lote=lote)
+    for numero, mensagem in resultado.erros:
+        print(f"linha {numero}: {mensagem}")
+    print(f"{resultado.lidas} lidas, {resultado.gravadas} gravadas, {resultado.total_erros} com erro "
+          f"em {resultado.segundos:.2f}s ({resultado.linhas_por_segundo:.0f} linhas/s).")
+
+
+@app.cli.command('atualizar-relatorios')
+def atualizar_relatorios_comando():
+    """ Agrega as vendas novas nas tabelas de relatório (pode rodar via cron). """
+    vendas = relatorios.atualizar_rollups(get_db())
+    print(f"{vendas} venda(s) agregada(s).")
+
+
+@app.cli.command('calcular-giro')
+def calcular_giro_comando():
+    """ Atualiza os rollups de vendas e recalcula o giro de estoque de todos os produtos. """
+    conn = get_db()
+    relatorios.atualizar_rollups(conn)
+    print(f"Giro recalculado ({estoque.calcular_giro(conn)} linhas afetadas).")
+
+
+@app.cli.command('executar-tarefas')
+@click.option('--trabalhadores', default=2, show_default=True, help='Threads executando tarefas.')
+def executar_tarefas_comando(trabalhadores):
+    """ Executa só a fila de tarefas, em primeiro plano (para workers web com TAREFAS_TRABALHADORES=0). """
+    executor = tarefas.Executor(pool_mysql.obter, pool_mysql.devolver, trabalhadores=trabalhadores)
+    executor.iniciar()
+    print(f"Executando tarefas com {trabalhadores} thread(s). Ctrl+C para encerrar.")
+    try:
+        executor.aguardar()
+    except KeyboardInterrupt:
+        executor.parar()
+
+
+@app.cli.command('construir-estaticos')
+@click.option('--sem-css', is_flag=True, help='Não recompila o CSS do Tailwind.')
+def construir_estaticos_comando(sem_css):
+    """ Compila o CSS e gera static/dist/ (hash no nome, gzip/brotli) para o deploy. """
+    if not sem_css:
+        try:
+            gerado = compilar_css(app.static_folder)
+        except ErroEstaticos as err:
+            raise click.ClickException(str(err))
+        if gerado:
+            print(f"CSS do Tailwind compilado em {os.path.relpath(gerado)}.")
+        else:
+            print("Executável tailwindcss não encontrado (PATH ou CAIXA_TAILWIND): "
+                  "base.html continuará usando o Tailwind da CDN.")
+    manifesto = construir_estaticos(app.static_folder)
+    print(f"{len(manifesto)} arquivo(s) em static/dist. Reinicie o servidor para servi-los.")
+
+
+@app.cli.command('fechar-caixa')
+def fechar_caixa_comando():
+    """ Fecha os dias pendentes do caixa (ideal para rodar diariamente via cron). """
+    try:
+        dias = fechar_pendentes(get_db())
+    except FechamentoEmAndamento as err:
+        raise click.ClickException(str(err))
+    print(f"{dias} dia(s) fechado(s).")
+
+
+@app.cli.command('verificar-caixa')
+@click.option('--reconstruir', is_flag=True, help='Regrava os fechamentos divergentes a partir do livro-caixa.')
+def verificar_caixa_comando(reconstruir):
+    """ Confere os fechamentos gravados contra as movimentações da tabela caixa. """
+    divergencias = verificar_fechamentos(get_db(), reconstruir=reconstruir)
+    for d in divergencias:
+        print(f"{d['dia']}: gravado={d['gravado']} esperado={d['esperado']}")
+    if not divergencias:
+        print("Fechamentos consistentes com o livro-caixa.")
+    elif reconstruir:
+        print(f"{len(divergencias)} divergência(s) corrigida(s).")
+
+
+@app.cli.command('migrar')
+@click.option('--status', 'so_status', is_flag=True, help='Só lista as migrações e o estado de cada uma.')
+@click.option('--ate', type=int, default=None, help='Aplica só até esta versão (inclusive).')
+def migrar_comando(so_status, ate):
+    """ Aplica as migrações pendentes de sql/migracoes (flask migrar). """
+    conn = get_db()
+    if so_status:
+        for migracao, estado in situacao(conn):
+            print(f"{migracao.versao:04d} {migracao.nome:40} {estado}")
+        return
+    try:
+        feitas = migrar(conn, ate=ate, ao_aplicar=lambda m, segundos: print(
+            f"{m.versao:04d} {m.nome} aplicada em {segundos:.1f}s"))
+    except ErroMigracao as err:
+        raise click.ClickException(str(err))
+    if not feitas:
+        print("Nenhuma migração pendente.")
+
+
+@app.cli.command('manter-particoes')
+def manter_particoes_comando():
+    """ Cria as partições mensais dos próximos meses (rodar mensalmente via cron). """
+    for tabela, criadas in manter_particoes(get_db()).items():
+        print(f"{tabela}: {criadas} partição(ões) criada(s).")
+
+
+@app.cli.command('arquivar')
+@click.option('--ate', required=True, help='Primeiro mês que continua na tabela quente (AAAA-MM).')
+def arquivar_comando(ate):
+    """ Move os meses anteriores a --ate para as tabelas de arquivo (flask arquivar --ate 2025-01). """
+    try:
+        limite = datetime.strptime(ate, '%Y-%m').date()
+    except ValueError:
+        raise click.BadParameter("Use o formato AAAA-MM.", param_hint='--ate')
+    try:
+        movidas, removidas = arquivar(get_db(), limite)
+    except ArquivamentoInvalido as err:
+        raise click.ClickException(str(err))
+    print(", ".join(f"{tabela}: {linhas} linha(s)" for tabela, linhas in movidas.items()))
+    print(f"Partições removidas: {', '.join(removidas) or 'nenhuma'}.")
 
 # Bloco de execução principal: só roda o servidor se o script for executado diretamente.
 if __name__ == '__main__':
     # `debug=True` ativa o modo de depuração, que recarrega o servidor a cada alteração
     # e mostra mensagens de erro detalhadas no navegador. É muito útil para desenvolvimento.
-    # Lembre-se de desativar (mudar para False) em um ambiente de produção.
+    # Em produção use o wsgi.py (sem debug, várias threads e estáticos compilados).
+    # Com o recarregador, quem atende as requisições é o processo filho (WERKZEUG_RUN_MAIN).
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        iniciar_servicos()
     app.run(debug=True)
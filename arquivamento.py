@@ -0,0 +1,261 @@
+# =====================================================================
+# PARTIÇÕES MENSAIS E ARQUIVAMENTO DO HISTÓRICO
+# `venda` e `caixa` são particionadas por mês (RANGE sobre a data). Consultas
+# com filtro de data só leem as partições do período (partition pruning), e
+# um mês inteiro sai da tabela quente com um DROP PARTITION instantâneo, sem
+# DELETE linha a linha e sem disparar os triggers de `resumo_sistema`.
+#
+# Arquivar copia os meses fechados para as tabelas frias (`*_arquivo`,
+# compactadas) e só então remove as partições. `item_venda` não tem data:
+# seus itens seguem as vendas arquivadas, em lotes.
+#
+# A cópia em lotes roda sem travar nada. Uma venda sincronizada de um
+# terminal offline pode cair no mês que está sendo arquivado depois da cópia,
+# então o DROP PARTITION só roda sob LOCK TABLES, depois de copiar as linhas
+# da partição que ainda não estão na tabela fria (em geral nenhuma).
+# =====================================================================
+from datetime import date, datetime, timedelta
+
+# Partições criadas à frente do mês corrente (a partição `pmax` recebe o que
+# passar delas, então esquecer a manutenção nunca faz um INSERT falhar).
+MESES_A_FRENTE = 3
+
+# Linhas copiadas/apagadas por transação durante o arquivamento.
+TAMANHO_LOTE = 10_000
+
+TABELAS_PARTICIONADAS = {
+    'venda': ('data_venda', 'cod_venda'),
+    'caixa': ('data_movimentacao', 'cod_caixa'),
+}
+
+_COLUNAS = {
+    'venda': "cod_venda, cod_usuario, data_venda, total",
+    'item_venda': "cod_item, cod_venda, cod_produto, quantidade, preco_unitario",
+    'caixa': "cod_caixa, tipo, valor, descricao, data_movimentacao, cod_usuario",
+}
+
+
+class ArquivamentoInvalido(ValueError):
+    pass
+
+
+def primeiro_dia(mes):
+    return date(mes.year, mes.month, 1)
+
+
+def somar_meses(mes, n):
+    indice = mes.year * 12 + mes.month - 1 + n
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def nome_particao(mes):
+    return f"p{mes:%Y%m}"
+
+
+def definicao_particao(mes):
+    """ Partição do mês `mes`: tudo antes do primeiro dia do mês seguinte. """
+    limite = somar_meses(mes, 1)
+    return f"PARTITION {nome_particao(mes)} VALUES LESS THAN (UNIX_TIMESTAMP('{limite:%Y-%m-%d} 00:00:00'))"
+
+
+def clausula_particoes(coluna, primeiro_mes, ultimo_mes):
+    """ `PARTITION BY` mensal de `primeiro_mes` a `ultimo_mes`, mais a partição `pmax`. """
+    meses, mes = [], primeiro_dia(primeiro_mes)
+    while mes <= ultimo_mes:
+        meses.append(definicao_particao(mes))
+        mes = somar_meses(mes, 1)
+    meses.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+    return f"PARTITION BY RANGE (UNIX_TIMESTAMP({coluna})) (\n    " + ",\n    ".join(meses) + "\n)"
+
+
+def particoes(cursor, tabela):
+    """ Nomes das partições mensais da tabela, em ordem (sem a `pmax`). """
+    cursor.execute("""
+        SELECT partition_name FROM information_schema.partitions
+        WHERE table_schema = DATABASE() AND table_name = %s AND partition_name IS NOT NULL
+        ORDER BY partition_ordinal_position
+    """, (tabela,))
+    return [nome for (nome,) in cursor.fetchall() if nome != 'pmax']
+
+
+def _mes_da_particao(nome):
+    return date(int(nome[1:5]), int(nome[5:7]), 1)
+
+
+def manter_particoes(conn, meses_a_frente=MESES_A_FRENTE, hoje=None):
+    """
+    Garante partições até `meses_a_frente` meses depois do atual, dividindo a
+    `pmax` (que fica vazia enquanto a manutenção estiver em dia, então a
+    reorganização é instantânea). Retorna {tabela: partições criadas}.
+    """
+    alvo = somar_meses(primeiro_dia(hoje or date.today()), meses_a_frente)
+    cursor = conn.cursor()
+    criadas = {}
+    for tabela in TABELAS_PARTICIONADAS:
+        existentes = particoes(cursor, tabela)
+        if not existentes:
+            continue
+        mes = somar_meses(_mes_da_particao(existentes[-1]), 1)
+        novas = []
+        while mes <= alvo:
+            novas.append(definicao_particao(mes))
+            mes = somar_meses(mes, 1)
+        if novas:
+            cursor.execute(f"""
+                ALTER TABLE {tabela} REORGANIZE PARTITION pmax INTO (
+                    {", ".join(novas)}, PARTITION pmax VALUES LESS THAN MAXVALUE)
+            """)
+        criadas[tabela] = len(novas)
+    cursor.close()
+    return criadas
+
+
+def _copiar_em_lotes(conn, cursor, tabela, particao, chave):
+    """ Copia uma partição para a tabela fria em faixas da chave primária; retorna as linhas copiadas. """
+    cursor.execute(f"SELECT MIN({chave}), MAX({chave}) FROM {tabela} PARTITION ({particao})")
+    minimo, maximo = cursor.fetchone()
+    if minimo is None:
+        return 0, None, None
+    copiadas, inicio = 0, minimo
+    while inicio <= maximo:
+        # INSERT IGNORE: rodar de novo após uma interrupção não duplica nada.
+        cursor.execute(f"""
+            INSERT IGNORE INTO {tabela}_arquivo ({_COLUNAS[tabela]})
+            SELECT {_COLUNAS[tabela]} FROM {tabela} PARTITION ({particao})
+            WHERE {chave} BETWEEN %s AND %s
+        """, (inicio, inicio + TAMANHO_LOTE - 1))
+        copiadas += cursor.rowcount
+        conn.commit()
+        inicio += TAMANHO_LOTE
+    return copiadas, minimo, maximo
+
+
+def _mover_itens(conn, cursor, particao, minimo, maximo):
+    """ Move para `item_venda_arquivo` os itens das vendas de uma partição de `venda`. """
+    movidos, inicio = 0, minimo
+    colunas = ", ".join(f"i.{c.strip()}" for c in _COLUNAS['item_venda'].split(','))
+    while inicio <= maximo:
+        faixa = (inicio, inicio + TAMANHO_LOTE - 1)
+        cursor.execute(f"""
+            INSERT IGNORE INTO item_venda_arquivo ({_COLUNAS['item_venda']})
+            SELECT {colunas} FROM item_venda i
+            JOIN venda PARTITION ({particao}) v ON v.cod_venda = i.cod_venda
+            WHERE v.cod_venda BETWEEN %s AND %s
+        """, faixa)
+        cursor.execute(f"""
+            DELETE i FROM item_venda i
+            JOIN venda PARTITION ({particao}) v ON v.cod_venda = i.cod_venda
+            WHERE v.cod_venda BETWEEN %s AND %s
+        """, faixa)
+        movidos += cursor.rowcount
+        conn.commit()
+        inicio += TAMANHO_LOTE
+    return movidos
+
+
+def _faltantes(cursor, tabela, particao, chave):
+    """ Chaves das linhas da partição que ainda não estão na tabela fria. """
+    cursor.execute(f"""
+        SELECT {chave} FROM {tabela} PARTITION ({particao})
+        WHERE NOT EXISTS (SELECT 1 FROM {tabela}_arquivo WHERE {tabela}_arquivo.{chave} = {tabela}.{chave})
+    """)
+    return [codigo for (codigo,) in cursor.fetchall()]
+
+
+def _copiar_faltantes(cursor, tabela, particao, chave):
+    """
+    Copia as linhas da partição que escaparam da cópia em lotes (e, para
+    `venda`, os seus itens). Roda com as tabelas travadas; retorna
+    (linhas, itens) copiados.
+    """
+    codigos = _faltantes(cursor, tabela, particao, chave)
+    if not codigos:
+        return 0, 0
+    marcadores = ", ".join(["%s"] * len(codigos))
+    cursor.execute(f"""
+        INSERT INTO {tabela}_arquivo ({_COLUNAS[tabela]})
+        SELECT {_COLUNAS[tabela]} FROM {tabela} WHERE {chave} IN ({marcadores})
+    """, codigos)
+    itens = 0
+    if tabela == 'venda':
+        cursor.execute(f"""
+            INSERT IGNORE INTO item_venda_arquivo ({_COLUNAS['item_venda']})
+            SELECT {_COLUNAS['item_venda']} FROM item_venda WHERE cod_venda IN ({marcadores})
+        """, codigos)
+        cursor.execute(f"DELETE FROM item_venda WHERE cod_venda IN ({marcadores})", codigos)
+        itens = cursor.rowcount
+    return len(codigos), itens
+
+
+def _remover_particao(conn, cursor, tabela, particao, chave):
+    """
+    Remove a partição depois de conferir, com as tabelas travadas, que todas
+    as suas linhas estão na tabela fria. Retorna (linhas, itens) copiados
+    nessa conferência.
+    """
+    travas = [f"{tabela} WRITE", f"{tabela}_arquivo WRITE"]
+    if tabela == 'venda':
+        travas += ["item_venda WRITE", "item_venda_arquivo WRITE"]
+    conn.commit()
+    cursor.execute("LOCK TABLES " + ", ".join(travas))
+    try:
+        copiadas, itens = _copiar_faltantes(cursor, tabela, particao, chave)
+        conn.commit()
+        if _faltantes(cursor, tabela, particao, chave):
+            raise ArquivamentoInvalido(f"{tabela}.{particao} tem linhas fora da tabela fria; arquivamento interrompido.")
+        # DROP PARTITION não dispara triggers: os contadores do painel continuam valendo.
+        cursor.execute(f"ALTER TABLE {tabela} DROP PARTITION {particao}")
+    finally:
+        cursor.execute("UNLOCK TABLES")
+    return copiadas, itens
+
+
+def _validar_periodo(cursor, ate):
+    """ Só meses completos, já fechados no caixa e já agregados nos relatórios podem sair da tabela quente. """
+    if ate > primeiro_dia(date.today()):
+        raise ArquivamentoInvalido("Só é possível arquivar meses já encerrados.")
+    # Só dias com movimentação ganham fechamento: o período está fechado se
+    # não há movimentação depois do último fechamento (um último dia sem
+    # movimento não impede o arquivamento).
+    cursor.execute("SELECT MAX(data_fechamento) FROM fechamento_caixa")
+    ultimo_fechamento = cursor.fetchone()[0]
+    desde = datetime.min if ultimo_fechamento is None else \
+        datetime.combine(ultimo_fechamento + timedelta(days=1), datetime.min.time())
+    cursor.execute("SELECT 1 FROM caixa WHERE data_movimentacao >= %s AND data_movimentacao < %s LIMIT 1",
+                   (desde, datetime.combine(ate, datetime.min.time())))
+    if cursor.fetchone():
+        raise ArquivamentoInvalido("Há dias sem fechamento de caixa no período; rode `flask fechar-caixa` antes.")
+    cursor.execute("""
+        SELECT COUNT(*) FROM rollup_pendente r JOIN venda v ON v.cod_venda = r.cod_venda
+        WHERE v.data_venda < %s
+    """, (datetime.combine(ate, datetime.min.time()),))
+    if cursor.fetchone()[0]:
+        raise ArquivamentoInvalido("Há vendas do período ainda não agregadas; rode `flask atualizar-relatorios` antes.")
+
+
+def arquivar(conn, ate):
+    """
+    Move para as tabelas `*_arquivo` todos os meses anteriores a `ate`
+    (primeiro dia de um mês) e remove as partições correspondentes.
+    Retorna {tabela: linhas movidas} e a lista de partições removidas.
+    """
+    ate = primeiro_dia(ate)
+    cursor = conn.cursor()
+    _validar_periodo(cursor, ate)
+
+    movidas = {'venda': 0, 'item_venda': 0, 'caixa': 0}
+    removidas = []
+    for tabela, (_, chave) in TABELAS_PARTICIONADAS.items():
+        for particao in particoes(cursor, tabela):
+            if somar_meses(_mes_da_particao(particao), 1) > ate:
+                break
+            copiadas, minimo, maximo = _copiar_em_lotes(conn, cursor, tabela, particao, chave)
+            movidas[tabela] += copiadas
+            if tabela == 'venda' and minimo is not None:
+                movidas['item_venda'] += _mover_itens(conn, cursor, particao, minimo, maximo)
+            copiadas, itens = _remover_particao(conn, cursor, tabela, particao, chave)
+            movidas[tabela] += copiadas
+            movidas['item_venda'] += itens
+            removidas.append(f"{tabela}.{particao}")
+    cursor.close()
+    return movidas, removidas
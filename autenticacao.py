@@ -0,0 +1,175 @@
+# =====================================================================
+# AUTENTICAÇÃO: LIMITE DE TENTATIVAS E HASH DE SENHAS
+# - Limitador de janela deslizante por IP e por nome de usuário, consultado
+#   ANTES de ir ao banco ou calcular hash: uma rajada de tentativas (credential
+#   stuffing) é barrada sem custo de CPU nem de MySQL.
+# - Busca do usuário só com as colunas necessárias, pelo índice único de
+#   `username_usuario`.
+# - Custo do hash configurável; hashes antigos são refeitos de forma
+#   transparente no próximo login bem-sucedido.
+# =====================================================================
+import threading
+import time
+from collections import OrderedDict
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+try:
+    from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS
+except ImportError:  # Versões antigas do werkzeug.
+    DEFAULT_PBKDF2_ITERATIONS = 600_000
+
+# Método padrão do hash (formato do werkzeug). scrypt com N=2^15, r=8, p=1.
+METODO_HASH_PADRAO = 'scrypt:32768:8:1'
+
+# Parâmetros que o werkzeug assume quando o método não traz todos
+# ("scrypt", "pbkdf2:sha256").
+_PARAMETROS_PADRAO = {'scrypt': ('32768', '8', '1'), 'pbkdf2': ('sha256', str(DEFAULT_PBKDF2_ITERATIONS))}
+
+
+def parametros_hash(metodo):
+    """ ('scrypt', 32768, 8, 1) para 'scrypt:32768:8:1' ou 'scrypt': método com os padrões preenchidos. """
+    nome, *parametros = metodo.strip().lower().split(':')
+    parametros += _PARAMETROS_PADRAO.get(nome, ())[len(parametros):]
+    return (nome, *(int(p) if p.isdigit() else p for p in parametros))
+
+
+class ArmazemMemoria:
+    """
+    Contadores por chave guardados no próprio processo. Para vários workers ou
+    servidores, basta outro armazém com a mesma interface (`incrementar`,
+    `obter`) sobre um armazenamento compartilhado (ex.: Redis).
+
+    No máximo `max_chaves` chaves: acima disso sai a usada há mais tempo (LRU),
+    em O(1). Sob credential stuffing cada tentativa traz um nome de usuário
+    novo, então a memória precisa de um teto fixo; as chaves de quem continua
+    tentando (o IP do atacante) são sempre as mais recentes e não saem.
+    """
+
+    def __init__(self, max_chaves=100_000):
+        self._dados = OrderedDict()  # chave -> {janela: contagem}, da menos para a mais recente
+        self._lock = threading.Lock()
+        self.max_chaves = max_chaves
+
+    def incrementar(self, chave, janela):
+        with self._lock:
+            contagens = self._dados.get(chave)
+            if contagens is None:
+                contagens = self._dados[chave] = {}
+                while len(self._dados) > self.max_chaves:
+                    self._dados.popitem(last=False)
+            else:
+                self._dados.move_to_end(chave)
+            contagens[janela] = contagens.get(janela, 0) + 1
+            # Só as duas janelas mais recentes importam.
+            for antiga in [j for j in contagens if j < janela - 1]:
+                del contagens[antiga]
+
+    def obter(self, chave, janela):
+        contagens = self._dados.get(chave)
+        if not contagens:
+            return 0, 0
+        return contagens.get(janela, 0), contagens.get(janela - 1, 0)
+
+    def __len__(self):
+        return len(self._dados)
+
+
+class LimitadorTentativas:
+    """
+    Janela deslizante aproximada: soma a contagem da janela atual com a da
+    anterior, ponderada pela fração dela que ainda cai nos últimos `janela`
+    segundos. Memória O(1) por chave.
+    """
+
+    def __init__(self, limite, janela, armazem=None):
+        self.limite = limite
+        self.janela = janela
+        self.armazem = armazem or ArmazemMemoria()
+
+    def _estimativa(self, chave, agora):
+        indice = int(agora // self.janela)
+        atual, anterior = self.armazem.obter(chave, indice)
+        decorrido = (agora % self.janela) / self.janela
+        return atual + anterior * (1 - decorrido)
+
+    def bloqueado(self, chave, agora=None):
+        return self._estimativa(chave, agora or time.time()) >= self.limite
+
+    def registrar(self, chave, agora=None):
+        self.armazem.incrementar(chave, int((agora or time.time()) // self.janela))
+
+
+class TentativasExcedidas(Exception):
+    """ Muitas tentativas recentes (login falho ou cadastro) para o IP ou nome de usuário. """
+
+
+class Autenticador:
+    def __init__(self, metodo_hash=METODO_HASH_PADRAO, limite_ip=30, limite_usuario=5,
+                 janela=300, limite_cadastro_ip=10, janela_cadastro=3600, armazem=None):
+        self.metodo_hash = metodo_hash
+        self._parametros = parametros_hash(metodo_hash)
+        armazem = armazem or ArmazemMemoria()
+        self.por_ip = LimitadorTentativas(limite_ip, janela, armazem)
+        self.por_usuario = LimitadorTentativas(limite_usuario, janela, armazem)
+        self.cadastros = LimitadorTentativas(limite_cadastro_ip, janela_cadastro, armazem)
+        # Hash de referência para usuários inexistentes: o tempo de resposta não
+        # revela se o nome de usuário existe.
+        self._hash_ficticio = generate_password_hash('senha-ficticia', method=metodo_hash)
+
+    def gerar_hash(self, senha):
+        return generate_password_hash(senha, method=self.metodo_hash)
+
+    def precisa_refazer_hash(self, hash_salvo):
+        """
+        True se o hash foi gerado com outro método/custo que não o configurado.
+        Compara os parâmetros, não o texto: 'pbkdf2:sha256' e
+        'pbkdf2:sha256:<padrão>' são o mesmo custo e não refazem o hash a cada login.
+        """
+        return parametros_hash(hash_salvo.split('$', 1)[0]) != self._parametros
+
+    def bloqueado(self, ip, username):
+        return self.por_ip.bloqueado(f"ip:{ip}") or self.por_usuario.bloqueado(f"usuario:{username.lower()}")
+
+    def registrar_falha(self, ip, username):
+        self.por_ip.registrar(f"ip:{ip}")
+        self.por_usuario.registrar(f"usuario:{username.lower()}")
+
+    def registrar_cadastro(self, ip):
+        """ Conta uma tentativa de cadastro do IP; levanta `TentativasExcedidas` acima do limite. """
+        chave = f"cadastro:{ip}"
+        if self.cadastros.bloqueado(chave):
+            raise TentativasExcedidas()
+        self.cadastros.registrar(chave)
+
+    def autenticar(self, conn, username, senha, ip):
+        """
+        Retorna o usuário (dict) se as credenciais forem válidas, None se não
+        forem, ou levanta `TentativasExcedidas` se o IP/usuário estiver bloqueado.
+        """
+        if self.bloqueado(ip, username):
+            raise TentativasExcedidas()
+
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("""
+            SELECT cod_usuario, nome_usuario, password_usuario, tipo_usuario, conta_ativa
+            FROM usuario WHERE username_usuario = %s
+        """, (username,))
+        usuario = cursor.fetchone()
+        cursor.close()
+
+        if usuario is None:
+            check_password_hash(self._hash_ficticio, senha)
+            self.registrar_falha(ip, username)
+            return None
+        if not check_password_hash(usuario['password_usuario'], senha):
+            self.registrar_falha(ip, username)
+            return None
+
+        if self.precisa_refazer_hash(usuario['password_usuario']):
+            cursor = conn.cursor()
+            cursor.execute("UPDATE usuario SET password_usuario = %s WHERE cod_usuario = %s",
+                           (self.gerar_hash(senha), usuario['cod_usuario']))
+            conn.commit()
+            cursor.close()
+        return usuario
@@ -0,0 +1,280 @@
+# =====================================================================
+# POOL DE CONEXÕES COM O MYSQL
+# Mantém um conjunto de conexões abertas e reutilizáveis, para que cada
+# requisição não precise abrir uma nova conexão TCP (e refazer o handshake)
+# com o banco de dados.
+# =====================================================================
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import mysql.connector
+from mysql.connector import errors
+from flask import current_app, g
+
+from metricas import envolver_conexao
+
+
+class PoolEsgotado(errors.PoolError):
+    """ Lançada quando nenhuma conexão fica livre dentro do tempo de espera. """
+
+
+class PoolConexoes:
+    """
+    Pool de conexões thread-safe com tamanho fixo mais um "overflow" opcional.
+
+    - `tamanho`: conexões mantidas abertas permanentemente.
+    - `overflow`: conexões extras criadas em picos e fechadas ao serem devolvidas.
+    - `timeout`: segundos que uma requisição espera por uma conexão livre.
+    - `reciclar`: idade máxima (segundos) de uma conexão antes de ser reaberta.
+    - `verificar_apos`: tempo ocioso (segundos) após o qual a conexão é testada
+      com um `ping` antes de ser entregue.
+    """
+
+    def __init__(self, config, tamanho=10, overflow=5, timeout=10.0,
+                 reciclar=3600, verificar_apos=30.0):
+        self._config = dict(config)
+        self.tamanho = tamanho
+        self.overflow = overflow
+        self.timeout = timeout
+        self.reciclar = reciclar
+        self.verificar_apos = verificar_apos
+
+        # Pilha (LIFO): a conexão usada mais recentemente é reaproveitada primeiro,
+        # o que deixa as menos usadas ociosas o suficiente para serem recicladas.
+        self._livres = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._abertas = 0
+        self._criada_em = {}  # id(conexão) -> instante de criação
+
+        self._metricas = {
+            'emprestimos': 0,
+            'criadas': 0,
+            'tempo_conexao_total': 0.0,  # Soma do tempo gasto abrindo conexões (handshake).
+            'descartadas': 0,
+            'reconexoes': 0,
+            'esperas': 0,
+            'timeouts': 0,
+            'tempo_espera_total': 0.0,
+            'tempo_espera_max': 0.0,
+            'em_uso_max': 0,
+        }
+
+    # --- Criação e descarte ---
+    def _criar(self):
+        inicio = time.perf_counter()
+        conn = mysql.connector.connect(**self._config)
+        with self._lock:
+            self._criada_em[id(conn)] = time.monotonic()
+            self._metricas['criadas'] += 1
+            self._metricas['tempo_conexao_total'] += time.perf_counter() - inicio
+        return conn
+
+    def _descartar(self, conn):
+        with self._lock:
+            self._abertas -= 1
+            self._criada_em.pop(id(conn), None)
+            self._metricas['descartadas'] += 1
+        try:
+            conn.close()
+        except errors.Error:
+            pass
+
+    # --- Empréstimo ---
+    def obter(self):
+        """ Empresta uma conexão do pool, criando ou esperando quando necessário. """
+        inicio = time.perf_counter()
+        limite = inicio + self.timeout
+        esperou = False
+        while True:
+            try:
+                conn, devolvida_em = self._livres.get_nowait()
+            except queue.Empty:
+                pass
+            else:
+                self._registrar_emprestimo(inicio, esperou)
+                return self._validar(conn, devolvida_em)
+
+            if self._reservar_vaga():
+                try:
+                    conn = self._criar()
+                except errors.Error:
+                    with self._lock:
+                        self._abertas -= 1
+                    raise
+                self._registrar_emprestimo(inicio, esperou)
+                return conn
+
+            # Pool cheio: espera alguma conexão ser devolvida (ou uma vaga ser
+            # liberada pelo fechamento de uma conexão de overflow).
+            restante = limite - time.perf_counter()
+            if restante <= 0:
+                with self._lock:
+                    self._metricas['timeouts'] += 1
+                raise PoolEsgotado(
+                    f"Nenhuma conexão livre após {self.timeout}s "
+                    f"({self._abertas} abertas)."
+                )
+            esperou = True
+            try:
+                conn, devolvida_em = self._livres.get(timeout=min(restante, 0.05))
+            except queue.Empty:
+                continue
+            self._registrar_emprestimo(inicio, esperou)
+            return self._validar(conn, devolvida_em)
+
+    def _reservar_vaga(self):
+        with self._lock:
+            if self._abertas < self.tamanho + self.overflow:
+                self._abertas += 1
+                return True
+        return False
+
+    def _validar(self, conn, devolvida_em):
+        """ Recicla conexões velhas e testa as que ficaram ociosas por muito tempo. """
+        agora = time.monotonic()
+        criada_em = self._criada_em.get(id(conn), agora)
+        if self.reciclar and agora - criada_em > self.reciclar:
+            self._descartar(conn)
+            return self._substituir()
+        if agora - devolvida_em > self.verificar_apos:
+            try:
+                conn.ping()
+            except errors.Error:
+                # Conexão caiu (timeout do servidor, restart etc.): abre outra.
+                self._descartar(conn)
+                return self._substituir()
+        return conn
+
+    def _substituir(self):
+        with self._lock:
+            self._abertas += 1
+        try:
+            conn = self._criar()
+        except errors.Error:
+            with self._lock:
+                self._abertas -= 1
+            raise
+        with self._lock:
+            self._metricas['reconexoes'] += 1
+        return conn
+
+    def _registrar_emprestimo(self, inicio, esperou):
+        espera = time.perf_counter() - inicio
+        with self._lock:
+            m = self._metricas
+            m['emprestimos'] += 1
+            m['tempo_espera_total'] += espera
+            m['tempo_espera_max'] = max(m['tempo_espera_max'], espera)
+            if esperou:
+                m['esperas'] += 1
+            m['em_uso_max'] = max(m['em_uso_max'], self._abertas - self._livres.qsize())
+
+    # --- Devolução ---
+    def devolver(self, conn, descartar=False):
+        """
+        Devolve a conexão ao pool, desfazendo qualquer transação pendente.
+        Com `descartar=True` a conexão é fechada (por exemplo, quando ficou no
+        meio de um resultado grande que não vale a pena consumir).
+        """
+        if descartar:
+            self._descartar(conn)
+            return
+        try:
+            # O rollback também encerra o snapshot de leitura (REPEATABLE READ),
+            # para que a próxima requisição enxergue dados atualizados.
+            if conn.in_transaction or conn.unread_result:
+                conn.rollback()
+        except errors.Error:
+            self._descartar(conn)
+            return
+
+        # Conexões de overflow são fechadas quando o pool já tem o suficiente.
+        if self._livres.qsize() >= self.tamanho:
+            self._descartar(conn)
+            return
+        self._livres.put((conn, time.monotonic()))
+
+    def fechar_todas(self):
+        """ Fecha todas as conexões ociosas (usado no encerramento do processo). """
+        while True:
+            try:
+                conn, _ = self._livres.get_nowait()
+            except queue.Empty:
+                break
+            self._descartar(conn)
+
+    # --- Métricas ---
+    def estatisticas(self):
+        """ Retorna um retrato da ocupação do pool e dos tempos de espera. """
+        with self._lock:
+            m = dict(self._metricas)
+            abertas = self._abertas
+        livres = self._livres.qsize()
+        m.update({
+            'tamanho': self.tamanho,
+            'overflow': self.overflow,
+            'abertas': abertas,
+            'livres': livres,
+            'em_uso': abertas - livres,
+            'tempo_espera_medio': (m['tempo_espera_total'] / m['emprestimos']) if m['emprestimos'] else 0.0,
+        })
+        return m
+
+
+# =====================================================================
+# INTEGRAÇÃO COM O FLASK
+# Cada requisição pega no máximo uma conexão do pool (guardada em `g`) e a
+# devolve automaticamente ao final, no `teardown_appcontext`.
+# =====================================================================
+def iniciar_pool(app, config):
+    """ Cria o pool a partir de `app.config` e registra a devolução automática. """
+    app.extensions['pool_mysql'] = PoolConexoes(
+        config,
+        tamanho=app.config.get('DB_POOL_TAMANHO', 10),
+        overflow=app.config.get('DB_POOL_OVERFLOW', 5),
+        timeout=app.config.get('DB_POOL_TIMEOUT', 10.0),
+        reciclar=app.config.get('DB_POOL_RECICLAR', 3600),
+        verificar_apos=app.config.get('DB_POOL_VERIFICAR_APOS', 30.0),
+    )
+    app.teardown_appcontext(fechar_db)
+    return app.extensions['pool_mysql']
+
+
+def obter_pool():
+    return current_app.extensions['pool_mysql']
+
+
+def get_db():
+    """ Retorna a conexão da requisição atual, emprestando uma do pool na primeira chamada. """
+    if 'db' not in g:
+        inicio = time.perf_counter()
+        conn = obter_pool().obter()
+        # Com a instrumentação ligada, a conexão vem embrulhada para medir cada comando SQL.
+        g.db = envolver_conexao(current_app, conn, time.perf_counter() - inicio)
+    return g.db
+
+
+@contextmanager
+def conexao_avulsa():
+    """
+    Conexão própria do pool, devolvida ao sair do bloco. Usada para carregar
+    caches compartilhados: a conexão da requisição pode estar presa a um
+    snapshot (REPEATABLE READ) anterior à versão do cache que acabou de ser
+    lida, e o que ela leria ficaria guardado sob a versão nova. A conexão
+    avulsa começa o snapshot na primeira leitura, depois da versão.
+    """
+    pool = obter_pool()
+    conn = pool.obter()
+    try:
+        yield conn
+    finally:
+        pool.devolver(conn)
+
+
+def fechar_db(exc=None):
+    """ Devolve ao pool a conexão emprestada pela requisição (se houver). """
+    conn = g.pop('db', None)
+    if conn is not None:
+        obter_pool().devolver(getattr(conn, 'conexao', conn))
@@ -0,0 +1,90 @@
+# =====================================================================
+# BENCHMARK DA BUSCA POR NOME (busca.py / catalogo.py)
+# Monta um catálogo sintético (sem banco de dados) com nomes em português,
+# com e sem acento, e mede a carga do índice, a memória e a latência
+# p50/p99/máxima das consultas de autocompletar.
+#
+# Uso:
+#   python benchmarks/busca.py --produtos 1000000
+# =====================================================================
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from catalogo import IndiceProdutos, ProdutoPDV  # noqa: E402
+
+TIPOS = ['Arroz', 'Feijão', 'Açúcar', 'Café', 'Leite', 'Pão', 'Maçã', 'Banana', 'Sabão', 'Detergente',
+         'Hortifrúti', 'Biscoito', 'Macarrão', 'Óleo', 'Farinha', 'Queijo', 'Presunto', 'Suco', 'Água',
+         'Refrigerante', 'Chocolate', 'Iogurte', 'Manteiga', 'Sabonete', 'Xampu', 'Papel Higiênico']
+VARIANTES = ['Integral', 'Tradicional', 'Orgânico', 'Light', 'Zero', 'Premium', 'Extra', 'Caseiro',
+             'Tipo 1', 'Refinado', 'Cristal', 'Desnatado', 'Mineral', 'com Gás', 'sem Lactose', 'Limão']
+MARCAS = [f"Marca{n}" for n in range(2000)]
+MEDIDAS = ['1kg', '5kg', '500g', '200g', '1L', '2L', '350ml', '12un', '6un']
+
+CONSULTAS = ['a', 'ar', 'arr', 'hortifruti', 'hortifrúti', 'feijao', 'acuc', 'cafe ext', 'leite desn 1l',
+             'marca12', 'marca1999 zero', 'agua com gas', 'sab', 'papel hig', 'macarrao integral 500',
+             'queijo marca7', 'xyz inexistente', 'organ mac', 'su lim 2l', 'p']
+
+
+def nome_aleatorio(rnd):
+    return f"{rnd.choice(TIPOS)} {rnd.choice(VARIANTES)} {rnd.choice(MARCAS)} {rnd.choice(MEDIDAS)}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark da busca por nome de produto.')
+    parser.add_argument('--produtos', type=int, default=1_000_000)
+    parser.add_argument('--repeticoes', type=int, default=200, help='Execuções de cada consulta.')
+    parser.add_argument('--limite', type=int, default=10, help='Resultados por consulta.')
+    args = parser.parse_args()
+    rnd = random.Random(42)
+
+    tracemalloc.start()
+    indice = IndiceProdutos()
+    nomes = []
+    inicio = time.perf_counter()
+    for cod in range(1, args.produtos + 1):
+        indice._aplicar(ProdutoPDV(cod, f"789{cod:010d}", nome_aleatorio(rnd), 1000, 'un',
+                                   rnd.random() > 0.05, 1, 1, 500), nomes)
+    indice._indexar_nomes(nomes)
+    del nomes
+    carga = time.perf_counter() - inicio
+    memoria, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"produtos={len(indice)} palavras={len(indice._por_nome._ordenadas)} carga={carga:.2f}s "
+          f"memoria={memoria / 2**20:.1f} MiB")
+    todas = []
+    for consulta in CONSULTAS:
+        tempos = []
+        for _ in range(args.repeticoes):
+            inicio = time.perf_counter()
+            resultado = indice.buscar(consulta, args.limite)
+            tempos.append(time.perf_counter() - inicio)
+        tempos.sort()
+        todas += tempos
+        primeiro = resultado[0].nome if resultado else '-'
+        print(f"{consulta!r:24} p50={tempos[len(tempos) // 2] * 1e3:6.2f}ms "
+              f"max={tempos[-1] * 1e3:6.2f}ms resultados={len(resultado):2} primeiro={primeiro}")
+    todas.sort()
+    print(f"geral p50={todas[len(todas) // 2] * 1e3:.2f}ms p99={todas[int(len(todas) * 0.99)] * 1e3:.2f}ms "
+          f"max={todas[-1] * 1e3:.2f}ms")
+
+    # Atualização incremental: renomeia 1% dos produtos, como faria `atualizar`.
+    alterados = rnd.sample(range(1, args.produtos + 1), max(1, args.produtos // 100))
+    nomes = []
+    inicio = time.perf_counter()
+    for cod in alterados:
+        produto = indice.por_cod_produto(cod)
+        indice._aplicar(ProdutoPDV(cod, produto.codigo_barras, nome_aleatorio(rnd), 1000, 'un',
+                                   True, 1, 1, 500), nomes)
+    indice._indexar_nomes(nomes)
+    print(f"atualizacao de {len(alterados)} nomes={(time.perf_counter() - inicio) * 1e3:.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+# =====================================================================
+# BENCHMARK DO ÍNDICE DE CÓDIGOS DE BARRAS (catalogo.py)
+# Monta um índice sintético (sem banco de dados) e mede a memória ocupada e
+# o tempo de cada busca por código de barras.
+#
+# Uso:
+#   python benchmarks/catalogo.py --produtos 1000000
+# =====================================================================
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from catalogo import IndiceProdutos, ProdutoPDV  # noqa: E402
+
+UNIDADES = ['un', 'kg', 'g', 'L', 'mL', 'cx', 'pct', 'dz']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do índice de códigos de barras.')
+    parser.add_argument('--produtos', type=int, default=1_000_000)
+    parser.add_argument('--buscas', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    indice = IndiceProdutos()
+    nomes = []
+    inicio = time.perf_counter()
+    for cod in range(1, args.produtos + 1):
+        indice._aplicar(ProdutoPDV(cod, f"789{cod:010d}", f"Produto de teste número {cod}",
+                                   random.randint(100, 100_000), sys.intern(random.choice(UNIDADES)),
+                                   True, random.randint(1, 20), random.randint(1, 21),
+                                   random.randint(100, 100_000)), nomes)
+    indice._indexar_nomes(nomes)
+    del nomes
+    carga = time.perf_counter() - inicio
+    memoria, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    codigos = [f"789{random.randint(1, args.produtos):010d}" for _ in range(args.buscas)]
+    busca = indice.por_codigo_barras
+    inicio = time.perf_counter()
+    for codigo in codigos:
+        busca(codigo)
+    duracao = time.perf_counter() - inicio
+
+    print(f"produtos={len(indice)} carga={carga:.2f}s")
+    print(f"memoria medida (tracemalloc)={memoria / 2**20:.1f} MiB "
+          f"estimada={indice.memoria_estimada() / 2**20:.1f} MiB "
+          f"({memoria / len(indice):.0f} bytes/produto)")
+    print(f"busca media={duracao / args.buscas * 1e6:.3f}us ({args.buscas / duracao:,.0f} buscas/s)")
+
+
+if __name__ == '__main__':
+    main()
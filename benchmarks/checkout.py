@@ -0,0 +1,207 @@
+# =====================================================================
+# BENCHMARK DE CARGA DO CHECKOUT (/sistema/pdv/vendas)
+# Simula vários terminais de caixa registrando vendas ao mesmo tempo sobre um
+# conjunto pequeno de produtos (máxima disputa pelas mesmas linhas) e confere
+# no final que nenhuma baixa de estoque foi perdida.
+#
+# Os terminais falam HTTP de verdade com um servidor já no ar (python wsgi.py),
+# cada um com sua conexão keep-alive e seu login, espalhados por vários
+# processos para que o próprio gerador de carga não fique preso ao GIL. O
+# benchmark não importa app.py: só acessa o banco para preparar os produtos e
+# conferir o estoque no final.
+#
+# Uso (servidor em outro terminal, mesmo banco configurado por CAIXA_DB_*):
+#   python wsgi.py
+#   python benchmarks/checkout.py --servidor http://127.0.0.1:8000 \
+#       --processos 4 --terminais 16 --vendas 200 --produtos 20
+# =====================================================================
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlencode, urlsplit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import mysql.connector  # noqa: E402
+
+from autenticacao import Autenticador  # noqa: E402
+
+PREFIXO = 'BENCH'
+ESTOQUE_INICIAL = 10_000_000
+USUARIO = 'bench_checkout'
+SENHA = 'senha-do-benchmark'
+
+# Mesmas variáveis de ambiente que app.py usa para o banco.
+DB_CONFIG = {
+    'host': os.environ.get('CAIXA_DB_HOST', 'localhost'),
+    'user': os.environ.get('CAIXA_DB_USUARIO', 'root'),
+    'password': os.environ.get('CAIXA_DB_SENHA', ''),
+    'database': os.environ.get('CAIXA_DB_NOME', 'caixa_prog'),
+}
+
+
+def preparar(conn, n_produtos):
+    """ Cria (ou reaproveita) os produtos e o usuário do benchmark. """
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO usuario (nome_usuario, username_usuario, password_usuario, email_usuario, tipo_usuario, conta_ativa)
+        VALUES (%s, %s, %s, %s, 1, TRUE)
+        ON DUPLICATE KEY UPDATE password_usuario = VALUES(password_usuario), conta_ativa = TRUE
+    """, ('Benchmark do checkout', USUARIO, Autenticador().gerar_hash(SENHA), f"{USUARIO}@benchmark.local"))
+
+    cursor.execute("SELECT cod_categoria, pvp_categoria FROM categoria_produto ORDER BY cod_categoria LIMIT 1")
+    linha = cursor.fetchone()
+    if not linha:
+        sys.exit("Cadastre ao menos uma categoria de produto antes de rodar o benchmark.")
+    cod_categoria, cod_pvp = linha
+    cursor.executemany("""
+        INSERT INTO produto (nome_produto, preco_compra, preco_venda, quantidade, unidade_medida,
+                             codigo_barras, cod_categoria, cod_pvp)
+        VALUES (%s, 1.00, 1.20, %s, 'un', %s, %s, %s)
+        ON DUPLICATE KEY UPDATE quantidade = VALUES(quantidade), ativo = TRUE
+    """, [(f"Produto benchmark {i}", ESTOQUE_INICIAL, f"{PREFIXO}{i:08d}", cod_categoria, cod_pvp)
+          for i in range(n_produtos)])
+    conn.commit()
+    cursor.execute("SELECT cod_produto FROM produto WHERE codigo_barras LIKE %s", (PREFIXO + '%',))
+    produtos = [linha[0] for linha in cursor.fetchall()][:n_produtos]
+    cursor.close()
+    return produtos
+
+
+class Terminal:
+    """ Um caixa: conexão HTTP persistente e o cookie de sessão do seu login. """
+
+    def __init__(self, servidor):
+        url = urlsplit(servidor)
+        classe = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        self.conexao = classe(url.hostname, url.port, timeout=30)
+        self.cookie = None
+
+    def _enviar(self, caminho, corpo, tipo):
+        cabecalhos = {'Content-Type': tipo}
+        if self.cookie:
+            cabecalhos['Cookie'] = self.cookie
+        self.conexao.request('POST', caminho, body=corpo, headers=cabecalhos)
+        resposta = self.conexao.getresponse()
+        resposta.read()  # Esvazia a resposta para reaproveitar a conexão.
+        cookie = resposta.getheader('Set-Cookie')
+        if cookie:
+            self.cookie = cookie.split(';', 1)[0]
+        return resposta.status
+
+    def entrar(self):
+        self._enviar('/login', urlencode({'username': USUARIO, 'senha': SENHA}),
+                     'application/x-www-form-urlencoded')
+        if not self.cookie:
+            raise RuntimeError("login do benchmark recusado pelo servidor")
+
+    def vender(self, itens):
+        return self._enviar('/sistema/pdv/vendas', json.dumps({'itens': itens}), 'application/json')
+
+
+def terminal(servidor, produtos, n_vendas, itens_por_venda, resultados):
+    caixa = Terminal(servidor)
+    caixa.entrar()
+    latencias, vendido, status = [], Counter(), Counter()
+    for _ in range(n_vendas):
+        itens = [{'cod_produto': cod, 'quantidade': random.randint(1, 3)}
+                 for cod in random.sample(produtos, min(itens_por_venda, len(produtos)))]
+        inicio = time.perf_counter()
+        codigo = caixa.vender(itens)
+        latencias.append(time.perf_counter() - inicio)
+        status[codigo] += 1
+        if codigo == 201:
+            for item in itens:
+                vendido[item['cod_produto']] += item['quantidade']
+    resultados.append((latencias, vendido, status))
+
+
+def processo(servidor, produtos, terminais, n_vendas, itens_por_venda, fila):
+    """ Roda `terminais` terminais em threads e devolve os resultados somados. """
+    resultados = []
+    threads = [threading.Thread(target=terminal, args=(servidor, produtos, n_vendas, itens_por_venda, resultados))
+               for _ in range(terminais)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    latencias, vendido, status = [], Counter(), Counter()
+    for suas_latencias, seu_vendido, seu_status in resultados:
+        latencias += suas_latencias
+        vendido.update(seu_vendido)
+        status.update(seu_status)
+    fila.put((latencias, vendido, status, len(resultados)))
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de carga do checkout contra um servidor no ar.')
+    parser.add_argument('--servidor', default='http://127.0.0.1:8000', help='URL do servidor (python wsgi.py)')
+    parser.add_argument('--processos', type=int, default=os.cpu_count() or 1, help='processos geradores de carga')
+    parser.add_argument('--terminais', type=int, default=16, help='terminais no total')
+    parser.add_argument('--vendas', type=int, default=200, help='vendas por terminal')
+    parser.add_argument('--produtos', type=int, default=20)
+    parser.add_argument('--itens', type=int, default=5, help='itens por venda')
+    args = parser.parse_args()
+
+    conn = mysql.connector.connect(**DB_CONFIG)
+    produtos = preparar(conn, args.produtos)
+
+    n_processos = max(1, min(args.processos, args.terminais))
+    por_processo = [args.terminais // n_processos + (i < args.terminais % n_processos) for i in range(n_processos)]
+    fila = multiprocessing.Queue()
+    processos = [multiprocessing.Process(target=processo,
+                                         args=(args.servidor, produtos, n, args.vendas, args.itens, fila))
+                 for n in por_processo]
+    inicio = time.perf_counter()
+    for p in processos:
+        p.start()
+    partes = [fila.get() for _ in processos]
+    duracao = time.perf_counter() - inicio
+    for p in processos:
+        p.join()
+
+    latencias, vendido, status, conectados = [], Counter(), Counter(), 0
+    for suas_latencias, seu_vendido, seu_status, terminais in partes:
+        latencias += suas_latencias
+        vendido.update(seu_vendido)
+        status.update(seu_status)
+        conectados += terminais
+    if not latencias:
+        sys.exit("Nenhuma venda enviada: confira --servidor e o login do benchmark.")
+
+    # Verificação de atualizações perdidas: estoque final deve bater exatamente.
+    conn.commit()  # Snapshot novo, depois das vendas.
+    cursor = conn.cursor()
+    marcadores = ", ".join(["%s"] * len(produtos))
+    cursor.execute(f"SELECT cod_produto, quantidade FROM produto WHERE cod_produto IN ({marcadores})", produtos)
+    perdidas = sum(1 for cod, qtd in cursor.fetchall() if qtd != ESTOQUE_INICIAL - vendido.get(cod, 0))
+    cursor.close()
+    conn.close()
+
+    total = len(latencias)
+    print(f"processos={n_processos} terminais={conectados} vendas={total} duracao={duracao:.2f}s")
+    print("status HTTP: " + " ".join(f"{codigo}={n}" for codigo, n in sorted(status.items())))
+    print(f"vazao={status[201] / duracao:.1f} vendas/s")
+    print(f"latencia p50={percentil(latencias, 50) * 1000:.1f}ms "
+          f"p95={percentil(latencias, 95) * 1000:.1f}ms "
+          f"p99={percentil(latencias, 99) * 1000:.1f}ms "
+          f"media={statistics.mean(latencias) * 1000:.1f}ms")
+    print(f"produtos com estoque divergente (atualizações perdidas): {perdidas}")
+    sys.exit(1 if perdidas else 0)
+
+
+if __name__ == '__main__':
+    main()
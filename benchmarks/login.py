@@ -0,0 +1,106 @@
+# =====================================================================
+# BENCHMARK DO LOGIN SOB CARGA DE ATAQUE (/login)
+# Um processo por núcleo, cada um com seu próprio cliente de teste, rodando um
+# dos cenários:
+#   validos    - logins corretos de um usuário existente (custo real do hash);
+#   stuffing   - pares usuário/senha vazados: nomes aleatórios, um IP diferente
+#                por tentativa (só o limite por usuário não ajuda);
+#   forca_bruta - muitas senhas para o mesmo usuário a partir de poucos IPs
+#                (o limitador deve responder 429 sem ir ao banco).
+# Reporta logins/s totais e por núcleo e a distribuição de status HTTP.
+#
+# Uso (com o banco configurado em app.py):
+#   python benchmarks/login.py --cenario forca_bruta --tentativas 2000
+#   python benchmarks/login.py --cenario validos --metodo pbkdf2:sha256:600000
+# =====================================================================
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import mysql.connector  # noqa: E402
+
+import app as aplicacao  # noqa: E402
+from autenticacao import Autenticador  # noqa: E402
+
+USUARIO = 'bench_login'
+SENHA = 'senha-do-benchmark'
+CENARIOS = ('validos', 'stuffing', 'forca_bruta')
+
+
+def preparar(metodo):
+    """ Cria (ou atualiza) o usuário do benchmark com a senha no método escolhido. """
+    conn = mysql.connector.connect(**aplicacao.db_config)
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO usuario (nome_usuario, username_usuario, password_usuario, email_usuario, tipo_usuario, conta_ativa)
+        VALUES (%s, %s, %s, %s, 1, TRUE)
+        ON DUPLICATE KEY UPDATE password_usuario = VALUES(password_usuario), conta_ativa = TRUE
+    """, ('Benchmark de login', USUARIO, Autenticador(metodo_hash=metodo).gerar_hash(SENHA),
+          f"{USUARIO}@benchmark.local"))
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+
+def tentativa(cenario, numero, processo):
+    """ (username, senha, ip) da tentativa `numero` do cenário. """
+    if cenario == 'validos':
+        return USUARIO, SENHA, f"10.0.{processo}.{numero % 250 + 1}"
+    if cenario == 'stuffing':
+        return (f"vazado_{random.getrandbits(40):x}", f"senha_{random.getrandbits(32):x}",
+                f"10.{random.randint(1, 250)}.{random.randint(1, 250)}.{random.randint(1, 250)}")
+    return USUARIO, f"chute_{numero}", f"192.168.{processo}.{numero % 4 + 1}"
+
+
+def trabalhador(cenario, tentativas, metodo, processo, fila):
+    aplicacao.autenticador = Autenticador(metodo_hash=metodo)
+    cliente = aplicacao.app.test_client()
+    status = Counter()
+    inicio = time.perf_counter()
+    for numero in range(tentativas):
+        username, senha, ip = tentativa(cenario, numero, processo)
+        resposta = cliente.post('/login', data={'username': username, 'senha': senha},
+                                environ_base={'REMOTE_ADDR': ip})
+        status[resposta.status_code] += 1
+    fila.put((time.perf_counter() - inicio, status))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do login sob carga de ataque.')
+    parser.add_argument('--cenario', choices=CENARIOS, default='forca_bruta')
+    parser.add_argument('--processos', type=int, default=os.cpu_count() or 1, help='padrão: um por núcleo')
+    parser.add_argument('--tentativas', type=int, default=500, help='tentativas por processo')
+    parser.add_argument('--metodo', default=aplicacao.app.config['SENHA_METODO_HASH'],
+                        help='método de hash do werkzeug (ex.: scrypt:32768:8:1, pbkdf2:sha256:600000)')
+    args = parser.parse_args()
+
+    preparar(args.metodo)
+
+    fila = multiprocessing.Queue()
+    processos = [multiprocessing.Process(target=trabalhador,
+                                         args=(args.cenario, args.tentativas, args.metodo, n, fila))
+                 for n in range(args.processos)]
+    inicio = time.perf_counter()
+    for p in processos:
+        p.start()
+    resultados = [fila.get() for _ in processos]
+    for p in processos:
+        p.join()
+    duracao = time.perf_counter() - inicio
+
+    status = sum((s for _, s in resultados), Counter())
+    total = sum(status.values())
+    print(f"cenario={args.cenario} metodo={args.metodo} processos={args.processos} "
+          f"tentativas={total} duracao={duracao:.2f}s")
+    print(f"vazao={total / duracao:.1f} logins/s  por_nucleo={total / duracao / args.processos:.1f} logins/s")
+    print("status: " + ", ".join(f"{codigo}={qtd}" for codigo, qtd in sorted(status.items())))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+# =====================================================================
+# CARGA DE DADOS SINTÉTICOS PARA OS BENCHMARKS
+# Cria (ou recria) um banco separado a partir de sql/caixa.sql e o preenche
+# com volumes configuráveis de usuários, produtos e vendas (com itens e
+# lançamentos de caixa) distribuídas pelos últimos dias. Com a mesma semente,
+# os dados gerados são sempre os mesmos. As migrações de sql/migracoes são
+# aplicadas depois da carga, então as partições mensais cobrem todo o período.
+#
+# Uso:
+#   python benchmarks/semear.py --banco caixa_bench --recriar \
+#       --usuarios 50 --produtos 50000 --vendas 1000000
+# Depois, rode a suíte com o mesmo banco:
+#   CAIXA_DB_NOME=caixa_bench python benchmarks/suite.py
+# =====================================================================
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+RAIZ = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, RAIZ)
+
+import mysql.connector  # noqa: E402
+
+from migracoes import comandos_sql, migrar  # noqa: E402
+
+# Credenciais dos usuários criados (usadas também pela suíte).
+ADMIN = 'bench_admin'
+SENHA = 'senha-do-benchmark'
+PREFIXO_OPERADOR = 'bench_op_'
+# Códigos de barras dos produtos sintéticos: '9' + 12 dígitos.
+PREFIXO_BARRAS = '9'
+
+LOTE = 5_000
+
+
+def criar_banco(config, banco, recriar):
+    conn = mysql.connector.connect(**{**config, 'database': None})
+    cursor = conn.cursor()
+    if recriar:
+        cursor.execute(f"DROP DATABASE IF EXISTS `{banco}`")
+    cursor.execute("SHOW DATABASES LIKE %s", (banco,))
+    existe = cursor.fetchone() is not None
+    if not existe:
+        cursor.execute(f"CREATE DATABASE `{banco}` CHARACTER SET utf8mb4")
+    cursor.close()
+    conn.close()
+    if existe:
+        return
+    conn = mysql.connector.connect(**{**config, 'database': banco})
+    cursor = conn.cursor()
+    with open(os.path.join(RAIZ, 'sql', 'caixa.sql'), encoding='utf-8') as arquivo:
+        for comando in comandos_sql(arquivo.read()):
+            cursor.execute(comando)
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+
+def inserir_em_lotes(conn, cursor, sql, linhas):
+    """ `executemany` em lotes (o conector transforma cada lote em um INSERT de várias linhas). """
+    total = 0
+    for inicio in range(0, len(linhas), LOTE):
+        cursor.executemany(sql, linhas[inicio:inicio + LOTE])
+        conn.commit()
+        total += len(linhas[inicio:inicio + LOTE])
+    return total
+
+
+def semear_usuarios(conn, cursor, n_operadores):
+    from autenticacao import Autenticador
+    # Um único hash para todos: gerar milhares de hashes só atrasaria a carga.
+    senha = Autenticador().gerar_hash(SENHA)
+    linhas = [('Administrador benchmark', ADMIN, f"{ADMIN}@benchmark.local", senha, 1)]
+    linhas += [(f"Operador {i}", f"{PREFIXO_OPERADOR}{i}", f"{PREFIXO_OPERADOR}{i}@benchmark.local", senha, 2)
+               for i in range(n_operadores)]
+    cursor.executemany("""
+        INSERT IGNORE INTO usuario (nome_usuario, username_usuario, email_usuario, password_usuario, tipo_usuario)
+        VALUES (%s, %s, %s, %s, %s)
+    """, linhas)
+    conn.commit()
+    cursor.execute("SELECT cod_usuario FROM usuario WHERE username_usuario LIKE %s", (PREFIXO_OPERADOR + '%',))
+    return [linha[0] for linha in cursor.fetchall()]
+
+
+def semear_produtos(conn, cursor, n_produtos, rnd):
+    cursor.execute("SELECT cod_categoria, pvp_categoria FROM categoria_produto")
+    categorias = cursor.fetchall()
+    cursor.execute("SELECT sigla_unidade FROM unidade_medida")
+    unidades = [linha[0] for linha in cursor.fetchall()]
+    linhas = []
+    for i in range(n_produtos):
+        cod_categoria, cod_pvp = rnd.choice(categorias)
+        compra = Decimal(rnd.randint(50, 20_000)) / 100
+        linhas.append((f"Produto sintético {i}", compra, (compra * Decimal('1.30')).quantize(Decimal('0.01')),
+                       1_000_000, rnd.choice(unidades), f"{PREFIXO_BARRAS}{i:012d}",
+                       cod_categoria, cod_pvp, rnd.randint(0, 50)))
+    inserir_em_lotes(conn, cursor, """
+        INSERT IGNORE INTO produto (nome_produto, preco_compra, preco_venda, quantidade, unidade_medida,
+                                    codigo_barras, cod_categoria, cod_pvp, estoque_minimo)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """, linhas)
+    cursor.execute("SELECT cod_produto, preco_venda FROM produto WHERE codigo_barras LIKE %s",
+                   (PREFIXO_BARRAS + '%',))
+    return cursor.fetchall()
+
+
+def semear_vendas(conn, cursor, n_vendas, operadores, produtos, dias, max_itens, rnd):
+    """ Vendas em ordem cronológica (cod_venda crescente com a data, como no uso real). """
+    cursor.execute("SELECT COALESCE(MAX(cod_venda), 0) FROM venda")
+    proximo = cursor.fetchone()[0] + 1
+    inicio = datetime.now().replace(microsecond=0) - timedelta(days=dias)
+    passo = timedelta(days=dias).total_seconds() / max(n_vendas, 1)
+
+    for de in range(0, n_vendas, LOTE):
+        vendas, itens, caixa = [], [], []
+        for i in range(de, min(de + LOTE, n_vendas)):
+            cod_venda = proximo + i
+            data = inicio + timedelta(seconds=i * passo + rnd.random() * passo)
+            operador = rnd.choice(operadores)
+            total = Decimal('0.00')
+            for cod_produto, preco in rnd.sample(produtos, rnd.randint(1, max_itens)):
+                quantidade = rnd.randint(1, 3)
+                itens.append((cod_venda, cod_produto, quantidade, preco))
+                total += preco * quantidade
+            vendas.append((cod_venda, operador, data, total))
+            caixa.append(('entrada', total, f"Venda #{cod_venda}", data, operador))
+        cursor.executemany("INSERT INTO venda (cod_venda, cod_usuario, data_venda, total) VALUES (%s, %s, %s, %s)",
+                           vendas)
+        cursor.executemany("""
+            INSERT INTO item_venda (cod_venda, cod_produto, quantidade, preco_unitario) VALUES (%s, %s, %s, %s)
+        """, itens)
+        cursor.executemany("""
+            INSERT INTO caixa (tipo, valor, descricao, data_movimentacao, cod_usuario) VALUES (%s, %s, %s, %s, %s)
+        """, caixa)
+        conn.commit()
+        print(f"  vendas: {min(de + LOTE, n_vendas)}/{n_vendas}", end='\r', flush=True)
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Carga de dados sintéticos para os benchmarks.')
+    parser.add_argument('--banco', default='caixa_bench')
+    parser.add_argument('--recriar', action='store_true', help='apaga e recria o banco antes da carga')
+    parser.add_argument('--usuarios', type=int, default=20, help='operadores de caixa')
+    parser.add_argument('--produtos', type=int, default=10_000)
+    parser.add_argument('--vendas', type=int, default=100_000)
+    parser.add_argument('--itens', type=int, default=8, help='máximo de itens por venda')
+    parser.add_argument('--dias', type=int, default=365, help='período coberto pelas vendas')
+    parser.add_argument('--semente', type=int, default=42)
+    args = parser.parse_args()
+
+    os.environ['CAIXA_DB_NOME'] = args.banco
+    from app import app, db_config
+    from estatisticas import recalcular_resumo
+    from saldo import fechar_pendentes
+    import relatorios
+
+    inicio = time.perf_counter()
+    criar_banco(db_config, args.banco, args.recriar)
+    conn = mysql.connector.connect(**db_config)
+    cursor = conn.cursor()
+    rnd = random.Random(args.semente)
+
+    operadores = semear_usuarios(conn, cursor, args.usuarios)
+    produtos = semear_produtos(conn, cursor, args.produtos, rnd)
+    print(f"usuarios={len(operadores) + 1} produtos={len(produtos)}")
+    semear_vendas(conn, cursor, args.vendas, operadores, produtos, args.dias, args.itens, rnd)
+    cursor.close()
+
+    for migracao in migrar(conn):
+        print(f"migração {migracao.versao:04d} {migracao.nome} aplicada")
+
+    # Deixa as estruturas derivadas em dia, como estariam em produção.
+    with app.app_context():
+        recalcular_resumo(conn)
+        relatorios.atualizar_rollups(conn)
+        fechar_pendentes(conn)
+    conn.close()
+    print(f"carga concluída em {time.perf_counter() - inicio:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
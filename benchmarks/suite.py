@@ -0,0 +1,248 @@
+# =====================================================================
+# SUÍTE DE BENCHMARKS DA APLICAÇÃO
+# Roda cenários realistas contra o app Flask (cliente de teste, várias threads
+# concorrentes) sobre um banco preenchido por benchmarks/semear.py e gera um
+# JSON com latência p50/p95/p99, vazão e comandos SQL por cenário, junto com o
+# commit testado. Dois JSONs podem ser comparados com --comparar.
+#
+# Uso:
+#   python benchmarks/semear.py --banco caixa_bench --recriar
+#   python benchmarks/suite.py --banco caixa_bench --saida resultado.json
+#   python benchmarks/suite.py --banco caixa_bench --comparar antes.json
+# =====================================================================
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from semear import ADMIN, SENHA, PREFIXO_BARRAS, PREFIXO_OPERADOR  # noqa: E402
+
+
+# --- Cenários ---
+# Cada cenário recebe (cliente, dados, rnd) e faz UMA requisição, devolvendo a resposta.
+def cenario_checkout(cliente, dados, rnd):
+    itens = [{'cod_produto': cod, 'quantidade': rnd.randint(1, 3)}
+             for cod in rnd.sample(dados['produtos'], rnd.randint(1, 8))]
+    return cliente.post('/sistema/pdv/vendas', json={'itens': itens})
+
+
+def cenario_leitura_barras(cliente, dados, rnd):
+    return cliente.get(f"/sistema/pdv/produtos/barras/{rnd.choice(dados['codigos_barras'])}")
+
+
+def cenario_busca(cliente, dados, rnd):
+    # Autocompletar do caixa: prefixos crescentes, sem acento, de "Produto sintético <n>".
+    consulta = rnd.choice(['p', 'prod', 'sint', 'sintetico', 'produto sint'])
+    if rnd.random() < 0.5:
+        consulta += f" {rnd.randint(1, 999)}"
+    return cliente.get('/sistema/pdv/produtos/busca', query_string={'q': consulta})
+
+
+def cenario_dashboard(cliente, dados, rnd):
+    # A página e o gráfico que ela busca ao carregar.
+    resposta = cliente.get('/sistema/admin/dashboard')
+    if resposta.status_code != 200:
+        return resposta
+    return cliente.get('/sistema/admin/relatorios/dia?dias=7')
+
+
+def cenario_listagem(cliente, dados, rnd):
+    rota = rnd.choice(['/sistema/admin/usuarios', '/sistema/admin/pvps', '/sistema/admin/categorias',
+                       '/sistema/admin/usuarios?q=bench_op_1', '/sistema/admin/pvps?ativo=1',
+                       '/sistema/admin/estoque/alertas'])
+    return cliente.get(rota)
+
+
+def cenario_login(cliente, dados, rnd):
+    return cliente.post('/login', data={'username': ADMIN, 'senha': SENHA},
+                        environ_base={'REMOTE_ADDR': f"10.1.{rnd.randint(0, 255)}.{rnd.randint(1, 254)}"})
+
+
+# nome -> (função, perfil da sessão, status HTTP considerados sucesso)
+CENARIOS = {
+    'checkout': (cenario_checkout, 'operador', {201}),
+    'leitura_barras': (cenario_leitura_barras, 'operador', {200}),
+    'busca': (cenario_busca, 'operador', {200}),
+    'dashboard': (cenario_dashboard, 'admin', {200}),
+    'listagem': (cenario_listagem, 'admin', {200}),
+    'login': (cenario_login, None, {302}),
+}
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+def carregar_dados(conn):
+    """ Usuários e produtos sintéticos que os cenários usam. """
+    cursor = conn.cursor()
+    cursor.execute("SELECT cod_usuario FROM usuario WHERE username_usuario = %s", (ADMIN,))
+    linha = cursor.fetchone()
+    if linha is None:
+        sys.exit("Banco sem dados de benchmark: rode benchmarks/semear.py antes.")
+    admin = linha[0]
+    cursor.execute("SELECT cod_usuario FROM usuario WHERE username_usuario LIKE %s LIMIT 100",
+                   (PREFIXO_OPERADOR + '%',))
+    operadores = [linha[0] for linha in cursor.fetchall()]
+    cursor.execute("SELECT cod_produto, codigo_barras FROM produto WHERE codigo_barras LIKE %s AND ativo",
+                   (PREFIXO_BARRAS + '%',))
+    produtos = cursor.fetchall()
+    cursor.execute("SELECT chave, SUM(valor) FROM resumo_sistema GROUP BY chave")
+    volumes = {chave: int(valor) for chave, valor in cursor.fetchall() if chave.startswith('total_')}
+    cursor.close()
+    return {
+        'admin': admin,
+        'operadores': operadores or [admin],
+        'produtos': [cod for cod, _ in produtos],
+        'codigos_barras': [barras for _, barras in produtos],
+        'volumes': volumes,
+    }
+
+
+def trabalhador(app, nome, dados, n_requisicoes, semente, latencias, erros, lock):
+    funcao, perfil, sucesso = CENARIOS[nome]
+    rnd = random.Random(semente)
+    cliente = app.test_client()
+    if perfil is not None:
+        with cliente.session_transaction() as sessao:
+            sessao['usuario_id'] = dados['admin'] if perfil == 'admin' else rnd.choice(dados['operadores'])
+            sessao['tipo_usuario'] = 1 if perfil == 'admin' else 2
+    minhas, meus_erros = [], 0
+    for _ in range(n_requisicoes):
+        inicio = time.perf_counter()
+        resposta = funcao(cliente, dados, rnd)
+        minhas.append(time.perf_counter() - inicio)
+        if resposta.status_code not in sucesso:
+            meus_erros += 1
+    with lock:
+        latencias.extend(minhas)
+        erros[0] += meus_erros
+
+
+def rodar_cenario(app, nome, dados, concorrencia, n_requisicoes, semente):
+    registro = app.extensions['metricas']
+    # Aquecimento fora da medição (índices e caches em memória carregados).
+    trabalhador(app, nome, dados, 3, semente, [], [0], threading.Lock())
+
+    sql_antes = registro.total('caixa_requisicao_sql_total')
+    latencias, erros, lock = [], [0], threading.Lock()
+    threads = [threading.Thread(target=trabalhador,
+                                args=(app, nome, dados, n_requisicoes, semente + i, latencias, erros, lock))
+               for i in range(concorrencia)]
+    inicio = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    duracao = time.perf_counter() - inicio
+    consultas = registro.total('caixa_requisicao_sql_total') - sql_antes
+
+    total = len(latencias)
+    return {
+        'requisicoes': total,
+        'erros': erros[0],
+        'duracao_s': round(duracao, 3),
+        'vazao_rps': round(total / duracao, 1),
+        'latencia_ms': {
+            'p50': round(percentil(latencias, 50) * 1000, 2),
+            'p95': round(percentil(latencias, 95) * 1000, 2),
+            'p99': round(percentil(latencias, 99) * 1000, 2),
+            'media': round(statistics.mean(latencias) * 1000, 2),
+        },
+        'consultas_sql': consultas,
+        'consultas_por_requisicao': round(consultas / total, 2),
+    }
+
+
+def commit_atual():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       cwd=os.path.dirname(__file__)).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(atual, base):
+    """ Imprime a variação de cada métrica de latência/vazão em relação a um resultado anterior. """
+    print(f"\ncomparação {base.get('commit')} -> {atual.get('commit')}")
+    for nome, resultado in atual['cenarios'].items():
+        anterior = base.get('cenarios', {}).get(nome)
+        if not anterior:
+            continue
+        partes = []
+        for rotulo, novo, velho in (
+            ('p50', resultado['latencia_ms']['p50'], anterior['latencia_ms']['p50']),
+            ('p95', resultado['latencia_ms']['p95'], anterior['latencia_ms']['p95']),
+            ('p99', resultado['latencia_ms']['p99'], anterior['latencia_ms']['p99']),
+            ('vazao', resultado['vazao_rps'], anterior['vazao_rps']),
+            ('sql/req', resultado['consultas_por_requisicao'], anterior['consultas_por_requisicao']),
+        ):
+            variacao = (novo - velho) / velho * 100 if velho else 0.0
+            partes.append(f"{rotulo} {velho}->{novo} ({variacao:+.1f}%)")
+        print(f"  {nome:15} " + "  ".join(partes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Suíte de benchmarks da aplicação.')
+    parser.add_argument('--banco', default=os.environ.get('CAIXA_DB_NOME', 'caixa_bench'))
+    parser.add_argument('--cenarios', default=','.join(CENARIOS), help='lista separada por vírgulas')
+    parser.add_argument('--concorrencia', type=int, default=8, help='threads por cenário')
+    parser.add_argument('--requisicoes', type=int, default=200, help='requisições por thread')
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--saida', help='arquivo JSON de resultado (padrão: stdout)')
+    parser.add_argument('--comparar', help='JSON de uma execução anterior para comparação')
+    args = parser.parse_args()
+
+    nomes = [n.strip() for n in args.cenarios.split(',') if n.strip()]
+    desconhecidos = [n for n in nomes if n not in CENARIOS]
+    if desconhecidos:
+        sys.exit(f"Cenários desconhecidos: {', '.join(desconhecidos)}. Disponíveis: {', '.join(CENARIOS)}.")
+
+    os.environ['CAIXA_DB_NOME'] = args.banco
+    import mysql.connector
+    import app as aplicacao
+    app = aplicacao.app
+    # Uma conexão por thread, sem fila no pool; limites de login fora do caminho.
+    app.extensions['pool_mysql'].tamanho = args.concorrencia
+    aplicacao.autenticador.por_ip.limite = aplicacao.autenticador.por_usuario.limite = float('inf')
+
+    conn = mysql.connector.connect(**aplicacao.db_config)
+    dados = carregar_dados(conn)
+    conn.close()
+
+    resultado = {
+        'commit': commit_atual(),
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'banco': args.banco,
+        'volumes': dados['volumes'],
+        'concorrencia': args.concorrencia,
+        'requisicoes_por_thread': args.requisicoes,
+        'cenarios': {},
+    }
+    for nome in nomes:
+        print(f"cenário {nome}...", file=sys.stderr)
+        resultado['cenarios'][nome] = rodar_cenario(app, nome, dados, args.concorrencia,
+                                                    args.requisicoes, args.semente)
+
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(texto + "\n")
+    else:
+        print(texto)
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as arquivo:
+            comparar(resultado, json.load(arquivo))
+
+
+if __name__ == '__main__':
+    main()
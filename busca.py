@@ -0,0 +1,257 @@
+# =====================================================================
+# BUSCA POR TEXTO COM AUTOCOMPLETAR (PRODUTOS E USUÁRIOS)
+# Índice invertido em memória: cada palavra normalizada (minúsculas e sem
+# acentos, "Hortifrúti" -> "hortifruti") aponta para os códigos dos
+# registros que a contêm, e a lista ordenada das palavras distintas acha por
+# busca binária todas as que começam com o que foi digitado. Uma consulta
+# nunca varre a tabela inteira: percorre os códigos da palavra mais seletiva
+# (no máximo LIMITE_VARREDURA) e confere as demais por conjuntos de códigos;
+# só os candidatos que passam têm o texto normalizado e conferido.
+#
+# O índice de produtos acompanha o índice do PDV (catalogo.py), que já relê
+# só os produtos alterados. O de usuários é pequeno: é refeito quando algum
+# usuário é cadastrado ou editado (contadores de versão de cache.py).
+# =====================================================================
+import bisect
+import re
+import sys
+import unicodedata
+from array import array
+
+from cache import CacheTTL, versao, nova_versao
+
+# Códigos percorridos por consulta, no máximo (limita a latência de
+# consultas com várias palavras que quase nunca aparecem juntas).
+LIMITE_VARREDURA = 20_000
+
+# Acima destes limites um prefixo é "largo" demais (ex.: uma letra só) para
+# virar conjunto de códigos: é conferido no texto de cada candidato.
+LIMITE_PALAVRAS = 2000
+LIMITE_CONJUNTO = 100_000
+
+# Candidatos reunidos por resultado pedido antes de ordenar por relevância.
+CANDIDATOS_POR_RESULTADO = 5
+
+# Palavras novas de uma vez acima das quais a lista ordenada é refeita com
+# `sorted` em vez de inserções uma a uma.
+LIMIAR_REORDENAR = 1000
+
+# Fração de entradas obsoletas (nomes alterados) que dispara a reconstrução.
+FRACAO_OBSOLETAS = 0.2
+
+_SEPARADORES = re.compile(r'[\W_]+')
+
+# Caracteres que não são ASCII nem acentos combinantes (letras de outros alfabetos).
+_NAO_LATINOS = re.compile('[^\x00-\x7f\u0300-\u036f]')
+
+
+def normalizar(texto):
+    """ Minúsculas e sem acentos, para que "Hortifrúti" e "hortifruti" sejam iguais. """
+    if texto.isascii():
+        return texto.lower()
+    decomposto = unicodedata.normalize('NFKD', texto.casefold())
+    if _NAO_LATINOS.search(decomposto) is None:
+        # Caminho rápido: os únicos caracteres não ASCII são os acentos separados.
+        return decomposto.encode('ascii', 'ignore').decode('ascii')
+    return ''.join(c for c in decomposto if not unicodedata.combining(c))
+
+
+def palavras(texto):
+    """ Palavras normalizadas do texto, na ordem em que aparecem. """
+    return [p for p in _SEPARADORES.split(normalizar(texto or '')) if p]
+
+
+def _pontuacao(termos, consulta, suas):
+    """ Menor é melhor: texto começando pela consulta, mais palavras completas, texto mais curto. """
+    frase = ' '.join(suas)
+    return (not frase.startswith(consulta), -sum(t in suas for t in termos), len(frase), frase)
+
+
+class IndicePrefixos:
+    """
+    Índice palavra -> códigos, com busca por prefixo de palavra.
+
+    Alterações não removem as entradas antigas na hora: a consulta confere
+    cada candidato com o texto atual (`texto_de(codigo)`), o que descarta as
+    obsoletas e também os registros que não devem aparecer (texto None).
+    Quando as obsoletas passam de FRACAO_OBSOLETAS, `precisa_reconstruir`
+    avisa o dono do índice para chamar `reconstruir`.
+    """
+
+    def __init__(self):
+        self._ordenadas = []  # Palavras distintas, em ordem.
+        self._codigos = {}    # palavra -> array('q') de códigos
+        self._entradas = 0
+        self._obsoletas = 0
+
+    def __len__(self):
+        return self._entradas
+
+    def indexar(self, alteracoes):
+        """ Aplica uma lista de (codigo, texto, texto_anterior ou None). """
+        codigos = self._codigos
+        novas = []
+        for codigo, texto, anterior in alteracoes:
+            antigas = set(palavras(anterior)) if anterior is not None else set()
+            atuais = set(palavras(texto))
+            self._obsoletas += len(antigas - atuais)
+            for palavra in atuais - antigas:
+                lista = codigos.get(palavra)
+                if lista is None:
+                    # `intern`: a mesma string serve de chave e de item da lista ordenada.
+                    palavra = sys.intern(palavra)
+                    lista = codigos[palavra] = array('q')
+                    novas.append(palavra)
+                lista.append(codigo)
+                self._entradas += 1
+        if len(novas) > LIMIAR_REORDENAR:
+            self._ordenadas = sorted(codigos)
+        else:
+            for palavra in novas:
+                bisect.insort(self._ordenadas, palavra)
+
+    def precisa_reconstruir(self):
+        return self._obsoletas > FRACAO_OBSOLETAS * max(self._entradas, 1)
+
+    def reconstruir(self, pares):
+        """ Refaz o índice a partir de (codigo, texto) e troca o atual de uma vez. """
+        novo = IndicePrefixos()
+        novo.indexar((codigo, texto, None) for codigo, texto in pares)
+        self._ordenadas, self._codigos = novo._ordenadas, novo._codigos
+        self._entradas, self._obsoletas = novo._entradas, 0
+
+    def _intervalo(self, prefixo):
+        """
+        (total de códigos, palavras que começam com `prefixo`); o total é None
+        se o intervalo passa de LIMITE_PALAVRAS palavras.
+        """
+        ordenadas, codigos = self._ordenadas, self._codigos
+        inicio = bisect.bisect_left(ordenadas, prefixo)
+        fim = bisect.bisect_left(ordenadas, prefixo + '\U0010ffff', inicio)
+        if fim - inicio > LIMITE_PALAVRAS:
+            return None, ordenadas[inicio:fim]
+        intervalo = ordenadas[inicio:fim]
+        return sum(len(codigos.get(p, ())) for p in intervalo), intervalo
+
+    def buscar(self, consulta, limite, texto_de):
+        """
+        Até `limite` códigos cujo texto tem, para cada palavra da consulta, uma
+        palavra que começa com ela, do mais relevante para o menos relevante.
+        """
+        return self.buscar_com_corte(consulta, limite, texto_de)[0]
+
+    def buscar_com_corte(self, consulta, limite, texto_de):
+        """
+        Como `buscar`, e diz se a busca parou antes de conferir todos os
+        candidatos (LIMITE_VARREDURA ou mais de `limite` encontrados): (códigos, cortada).
+        """
+        termos = list(dict.fromkeys(palavras(consulta)))
+        if not termos or limite <= 0:
+            return [], False
+        codigos = self._codigos
+        intervalos = sorted((self._intervalo(t) for t in termos),
+                            key=lambda item: float('inf') if item[0] is None else item[0])
+        if not intervalos[0][1]:
+            return [], False  # Alguma palavra da consulta não existe no índice.
+
+        # O prefixo com menos códigos guia a varredura; os outros viram conjuntos
+        # de códigos, exceto os largos demais, conferidos no texto.
+        conjuntos = []
+        for total, intervalo in intervalos[1:]:
+            if total is not None and total <= LIMITE_CONJUNTO:
+                conjunto = set()
+                for palavra in intervalo:
+                    conjunto.update(codigos.get(palavra, ()))
+                conjuntos.append(conjunto)
+        # A palavra exata vem primeiro no intervalo; depois, as demais em ordem alfabética.
+        guia = (codigo for palavra in intervalos[0][1] for codigo in codigos.get(palavra, ()))
+
+        frase = ' '.join(termos)
+        maximo = limite * CANDIDATOS_POR_RESULTADO
+        vistos, encontrados, cortada = set(), [], False
+        for varridos, codigo in enumerate(guia, 1):
+            if varridos > LIMITE_VARREDURA:
+                cortada = True
+                break
+            if codigo in vistos or not all(codigo in conjunto for conjunto in conjuntos):
+                continue
+            vistos.add(codigo)
+            # O texto atual descarta entradas obsoletas e registros ocultos (None).
+            texto = texto_de(codigo)
+            suas = palavras(texto) if texto is not None else ()
+            if suas and all(any(p.startswith(t) for p in suas) for t in termos):
+                encontrados.append((_pontuacao(termos, frase, suas), codigo))
+                if len(encontrados) >= maximo:
+                    cortada = True
+                    break
+        encontrados.sort()
+        return [codigo for _, codigo in encontrados[:limite]], cortada or len(encontrados) > limite
+
+    def memoria_estimada(self):
+        """ Estimativa em bytes (palavras, listas de códigos e dicionário). """
+        total = sys.getsizeof(self._ordenadas) + sys.getsizeof(self._codigos)
+        for palavra, lista in self._codigos.items():
+            total += sys.getsizeof(palavra) + sys.getsizeof(lista)
+        return total
+
+
+# --- Usuários ---
+# Poucos registros: o índice inteiro é refeito quando muda a versão 'usuario'
+# (edição, ver sessoes.py) ou 'busca_usuario' (cadastro). O TTL cobre
+# alterações feitas direto no banco.
+TTL_USUARIOS = 300.0
+
+_usuarios = CacheTTL(ttl=TTL_USUARIOS, versao=lambda chave: (versao('usuario'), versao('busca_usuario')))
+
+
+def _texto_usuario(usuario):
+    return f"{usuario['nome_usuario']} {usuario['username_usuario']} {usuario['email_usuario']}"
+
+
+def _carregar_usuarios(conn_factory):
+    # Conexão nova (banco.conexao_avulsa): a da requisição pode ter um
+    # snapshot anterior à versão lida pelo cache.
+    with conn_factory() as conn:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SELECT cod_usuario, nome_usuario, username_usuario, email_usuario, tipo_usuario, "
+                       "conta_ativa FROM usuario")
+        usuarios = {u['cod_usuario']: u for u in cursor.fetchall()}
+        cursor.close()
+    indice = IndicePrefixos()
+    indice.indexar((cod, _texto_usuario(u), None) for cod, u in usuarios.items())
+    return indice, usuarios
+
+
+def buscar_usuarios(conn_factory, consulta, limite=10):
+    """
+    Usuários por nome, login ou e-mail (prefixo de palavra, sem acentos). Não
+    altere as linhas. `conn_factory` devolve um gerenciador de contexto com
+    uma conexão (`banco.conexao_avulsa`).
+    """
+    indice, usuarios = _usuarios.obter('usuarios', lambda: _carregar_usuarios(conn_factory))
+    codigos = indice.buscar(consulta, limite, lambda cod: _texto_usuario(usuarios[cod]))
+    return [usuarios[cod] for cod in codigos]
+
+
+def buscar_codigos_usuarios(conn_factory, consulta, limite):
+    """
+    Códigos dos usuários encontrados (até `limite`) e se a busca foi cortada,
+    ou seja, se pode haver mais usuários que casam com a consulta.
+    """
+    indice, usuarios = _usuarios.obter('usuarios', lambda: _carregar_usuarios(conn_factory))
+    return indice.buscar_com_corte(consulta, limite, lambda cod: _texto_usuario(usuarios[cod]))
+
+
+def consulta_fulltext(consulta):
+    """
+    Texto do MATCH ... AGAINST (IN BOOLEAN MODE) equivalente à busca do
+    índice: toda palavra obrigatória, como prefixo. None se não há palavras.
+    As palavras só têm letras e dígitos, então não levam operadores.
+    """
+    termos = list(dict.fromkeys(palavras(consulta)))
+    return " ".join(f"+{termo}*" for termo in termos) or None
+
+
+def invalidar_busca_usuarios():
+    """ Chamada após cadastrar um usuário: todos os workers refazem o índice na próxima busca. """
+    nova_versao('busca_usuario')
@@ -0,0 +1,168 @@
+# =====================================================================
+# CACHE EM MEMÓRIA COM EXPIRAÇÃO (TTL)
+# Guarda resultados caros (consultas agregadas, listas de apoio etc.) por
+# alguns segundos dentro do processo, com invalidação explícita quando uma
+# rota altera os dados de origem.
+#
+# A invalidação explícita só alcança o próprio processo. Para que alcance
+# todos os workers da máquina, o cache pode conferir um contador de versão
+# compartilhado (`versao`/`nova_versao`): um arquivo mapeado em memória, lido
+# sem nenhuma chamada ao sistema e incrementado pela rota que altera os dados.
+# =====================================================================
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+try:
+    import fcntl
+except ImportError:  # Windows: só o servidor de desenvolvimento (um processo).
+    fcntl = None
+
+
+class CacheTTL:
+    """
+    Cache chave -> valor com tempo de vida por entrada.
+
+    `obter(chave, carregar)` devolve o valor em cache ou chama `carregar()`
+    para recalculá-lo. Apenas uma thread recalcula cada chave por vez; as
+    demais aguardam e reaproveitam o resultado.
+
+    Com `ttl=None` as entradas não expiram. Com `versao(chave)`, uma entrada
+    carregada sob outra versão é descartada na leitura seguinte.
+    """
+
+    def __init__(self, ttl=5.0, versao=None):
+        self.ttl = ttl
+        self.versao = versao
+        self._dados = {}  # chave -> (valor, expira_em, versão)
+        self._lock = threading.Lock()
+        self._locks_carga = {}
+        self._geracao = 0  # Incrementada a cada invalidação.
+        self.acertos = 0
+        self.falhas = 0
+
+    def _valido(self, chave, item):
+        return (item is not None and item[1] > time.monotonic()
+                and (self.versao is None or item[2] == self.versao(chave)))
+
+    def obter(self, chave, carregar):
+        item = self._dados.get(chave)
+        if self._valido(chave, item):
+            self.acertos += 1
+            return item[0]
+
+        with self._lock:
+            lock_carga = self._locks_carga.setdefault(chave, threading.Lock())
+        with lock_carga:
+            # Outra thread pode ter recarregado enquanto esperávamos o lock.
+            item = self._dados.get(chave)
+            if self._valido(chave, item):
+                self.acertos += 1
+                return item[0]
+            self.falhas += 1
+            geracao = self._geracao
+            # Versão lida antes da carga: se mudar durante ela, a entrada
+            # guardada já fica desatualizada e é recarregada na próxima leitura.
+            versao = self.versao(chave) if self.versao is not None else None
+            valor = carregar()
+            with self._lock:
+                # Se houve invalidação durante a carga, o valor já nasce velho:
+                # devolve ao chamador, mas não guarda.
+                if geracao == self._geracao:
+                    expira_em = time.monotonic() + self.ttl if self.ttl is not None else float('inf')
+                    self._dados[chave] = (valor, expira_em, versao)
+            return valor
+
+    def invalidar(self, chave=None):
+        """ Remove uma chave do cache (ou todas, se `chave` for None). """
+        with self._lock:
+            self._geracao += 1
+            if chave is None:
+                self._dados.clear()
+            else:
+                self._dados.pop(chave, None)
+
+
+# --- Versões compartilhadas entre processos ---
+class VersoesLocais:
+    """ Contadores de versão dentro do processo (padrão até `iniciar_versoes`). """
+
+    def __init__(self):
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def ler(self, nome):
+        return self._valores.get(nome, 0)
+
+    def incrementar(self, nome):
+        with self._lock:
+            self._valores[nome] = self._valores.get(nome, 0) + 1
+            return self._valores[nome]
+
+
+class VersoesCompartilhadas:
+    """
+    Contadores de 64 bits em um arquivo mapeado em memória (MAP_SHARED), vistos
+    por todos os processos da máquina que abrem o mesmo arquivo. Cada nome
+    ocupa uma posição escolhida pelo CRC32 do nome: dois nomes na mesma
+    posição só causam recargas a mais, nunca dados velhos.
+    """
+
+    def __init__(self, caminho, posicoes=64):
+        os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+        self.posicoes = posicoes
+        self._fd = os.open(caminho, os.O_RDWR | os.O_CREAT, 0o600)
+        tamanho = posicoes * 8
+        # lockf (e não flock): o bloqueio é por processo, inclusive após fork.
+        fcntl.lockf(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size < tamanho:
+                os.ftruncate(self._fd, tamanho)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN)
+        self._mapa = mmap.mmap(self._fd, tamanho)
+        self._lock = threading.Lock()
+
+    def _deslocamento(self, nome):
+        return zlib.crc32(nome.encode()) % self.posicoes * 8
+
+    def ler(self, nome):
+        return struct.unpack_from('<Q', self._mapa, self._deslocamento(nome))[0]
+
+    def incrementar(self, nome):
+        deslocamento = self._deslocamento(nome)
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                valor = struct.unpack_from('<Q', self._mapa, deslocamento)[0] + 1
+                struct.pack_into('<Q', self._mapa, deslocamento, valor)
+                return valor
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+
+_versoes = VersoesLocais()
+
+
+def iniciar_versoes(caminho):
+    """
+    Passa a usar o arquivo `caminho` para os contadores de versão (todos os
+    workers da aplicação devem apontar para o mesmo arquivo). Sem `fcntl`
+    (Windows), continua com os contadores do próprio processo.
+    """
+    global _versoes
+    if fcntl is not None:
+        _versoes = VersoesCompartilhadas(caminho)
+
+
+def versao(nome):
+    """ Versão atual dos dados `nome` (ex.: o nome da tabela). """
+    return _versoes.ler(nome)
+
+
+def nova_versao(nome):
+    """ Marca os dados `nome` como alterados em todos os processos. """
+    return _versoes.incrementar(nome)
@@ -0,0 +1,302 @@
+# =====================================================================
+# ÍNDICE DE PRODUTOS DO PDV (LEITURA DE CÓDIGO DE BARRAS E BUSCA POR NOME)
+# Mantém em memória só os campos que o caixa precisa de cada produto,
+# indexados por `codigo_barras`, por `cod_produto` e pelas palavras do nome
+# (busca.py). A carga inicial é feita
+# em lotes e depois apenas as linhas alteradas (coluna `atualizado_em`) são
+# relidas, sem recarregar o catálogo inteiro.
+#
+# `atualizado_em` é gravado quando a linha é alterada, não quando a
+# transação confirma: uma transação longa pode confirmar uma linha com data
+# anterior à última leitura. Por isso a marca da leitura seguinte é o início
+# da transação aberta mais antiga que está escrevendo (`marca_segura`), e
+# não o maior `atualizado_em` lido. Produtos apagados são retirados pelas
+# lápides de `produto_removido` (migração 0007), e uma releitura completa
+# periódica (`iniciar_manutencao`) corrige qualquer divergência restante.
+# =====================================================================
+import logging
+import sys
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from mysql.connector import errors
+
+from busca import IndicePrefixos
+
+log = logging.getLogger(__name__)
+
+# Tamanho dos lotes lidos do cursor na carga inicial.
+LOTE_CARGA = 10_000
+
+# Intervalo mínimo (segundos) entre duas atualizações incrementais.
+INTERVALO_ATUALIZACAO = 2.0
+
+# Intervalo (segundos) entre duas releituras completas do catálogo.
+INTERVALO_RECONCILIACAO = 600.0
+
+# Margem somada à marca calculada pelas transações abertas: cobre um comando
+# que já leu o relógio, mas ainda não aparece como escrevendo.
+FOLGA = timedelta(seconds=2)
+
+# Margem usada quando o usuário do banco não pode consultar as transações
+# abertas (information_schema.INNODB_TRX exige o privilégio PROCESS). Nesse
+# caso, transações mais longas só aparecem na releitura completa.
+SOBREPOSICAO = timedelta(seconds=60)
+
+COLUNAS = """cod_produto, codigo_barras, nome_produto, preco_venda, unidade_medida,
+             ativo, cod_categoria, cod_pvp, preco_compra, atualizado_em"""
+
+
+def marca_segura(conn):
+    """
+    Instante a partir do qual a próxima leitura incremental deve reler
+    `atualizado_em`. Uma alteração ainda não confirmada pertence a uma
+    transação aberta agora e tem `atualizado_em` igual ou posterior ao início
+    dela; sem transações escrevendo, vale o relógio do banco. Chame antes da
+    leitura, com a conexão sem snapshot aberto (logo depois de um commit).
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT NOW(), MIN(trx_started) FROM information_schema.INNODB_TRX
+            WHERE trx_mysql_thread_id <> CONNECTION_ID()
+              AND (trx_rows_modified > 0 OR trx_rows_locked > 0 OR trx_tables_locked > 0)
+        """)
+        agora, mais_antiga = cursor.fetchone()
+        folga = FOLGA
+    except errors.DatabaseError:
+        cursor.execute("SELECT NOW()")
+        agora, mais_antiga = cursor.fetchone()[0], None
+        folga = SOBREPOSICAO
+    finally:
+        cursor.close()
+    return min(agora, mais_antiga or agora) - folga
+
+
+class ProdutoPDV:
+    """ Registro compacto de um produto (preços guardados em centavos). """
+    __slots__ = ('cod_produto', 'codigo_barras', 'nome', 'preco_centavos',
+                 'unidade_medida', 'ativo', 'cod_categoria', 'cod_pvp',
+                 'preco_compra_centavos')
+
+    def __init__(self, cod_produto, codigo_barras, nome, preco_centavos,
+                 unidade_medida, ativo, cod_categoria, cod_pvp=None,
+                 preco_compra_centavos=None):
+        self.cod_produto = cod_produto
+        self.codigo_barras = codigo_barras
+        self.nome = nome
+        self.preco_centavos = preco_centavos
+        self.unidade_medida = unidade_medida
+        self.ativo = ativo
+        self.cod_categoria = cod_categoria
+        self.cod_pvp = cod_pvp
+        self.preco_compra_centavos = preco_compra_centavos
+
+    def como_dict(self):
+        return {
+            'cod_produto': self.cod_produto,
+            'codigo_barras': self.codigo_barras,
+            'nome_produto': self.nome,
+            'preco_venda': str(Decimal(self.preco_centavos) / 100),
+            'unidade_medida': self.unidade_medida,
+            'ativo': self.ativo,
+            'cod_categoria': self.cod_categoria,
+        }
+
+
+def _produto_da_linha(linha):
+    cod, barras, nome, preco, unidade, ativo, categoria, pvp, compra = linha[:9]
+    # As siglas de unidade se repetem em todo o catálogo: `intern` guarda uma
+    # única cópia de cada string.
+    return ProdutoPDV(cod, barras, nome, int(round(preco * 100)),
+                      sys.intern(unidade), bool(ativo), categoria, pvp,
+                      int(round(compra * 100)))
+
+
+class IndiceProdutos:
+    """
+    Índice em memória do catálogo. As buscas são leituras simples de
+    dicionário; as atualizações acontecem sob um lock e no máximo uma vez a
+    cada `intervalo` segundos.
+    """
+
+    def __init__(self, intervalo=INTERVALO_ATUALIZACAO):
+        self.intervalo = intervalo
+        self._por_barras = {}
+        self._por_codigo = {}
+        self._por_nome = IndicePrefixos()
+        self._marca = None          # `atualizado_em` a partir do qual a próxima leitura relê.
+        self._ultima_verificacao = 0.0
+        self._lock = threading.Lock()
+        self.carregado = False
+
+    # --- Buscas ---
+    def por_codigo_barras(self, codigo_barras):
+        return self._por_barras.get(codigo_barras)
+
+    def por_cod_produto(self, cod_produto):
+        return self._por_codigo.get(cod_produto)
+
+    def buscar(self, consulta, limite=10, somente_ativos=True):
+        """ Produtos cujo nome tem palavras começando com as da consulta (sem acentos), por relevância. """
+        def nome(cod):
+            produto = self._por_codigo.get(cod)
+            if produto is None or (somente_ativos and not produto.ativo):
+                return None
+            return produto.nome
+        return [self._por_codigo[cod] for cod in self._por_nome.buscar(consulta, limite, nome)]
+
+    def __len__(self):
+        return len(self._por_codigo)
+
+    # --- Carga e atualização ---
+    def precisa_atualizar(self):
+        """ Indica se já passou o intervalo desde a última verificação (ou se nunca carregou). """
+        return not self.carregado or time.monotonic() - self._ultima_verificacao >= self.intervalo
+
+    def _aplicar(self, produto, nomes):
+        anterior = self._por_codigo.get(produto.cod_produto)
+        if anterior is not None and anterior.codigo_barras != produto.codigo_barras:
+            self._por_barras.pop(anterior.codigo_barras, None)
+        self._por_codigo[produto.cod_produto] = produto
+        self._por_barras[produto.codigo_barras] = produto
+        if anterior is None or anterior.nome != produto.nome:
+            nomes.append((produto.cod_produto, produto.nome, anterior.nome if anterior is not None else None))
+
+    def _remover(self, cod_produto, nomes):
+        anterior = self._por_codigo.pop(cod_produto, None)
+        if anterior is None:
+            return
+        if self._por_barras.get(anterior.codigo_barras) is anterior:
+            del self._por_barras[anterior.codigo_barras]
+        nomes.append((cod_produto, '', anterior.nome))
+
+    def _indexar_nomes(self, nomes):
+        self._por_nome.indexar(nomes)
+        if self._por_nome.precisa_reconstruir():
+            self._por_nome.reconstruir((p.cod_produto, p.nome) for p in list(self._por_codigo.values()))
+
+    def _ler_tudo(self, conn):
+        """ Lê o catálogo inteiro em lotes, com cursor sem buffer. """
+        conn.commit()  # Snapshot novo: a marca vale para a leitura que vem a seguir.
+        marca = marca_segura(conn)
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT {COLUNAS} FROM produto")
+        nomes = []
+        while True:
+            linhas = cursor.fetchmany(LOTE_CARGA)
+            if not linhas:
+                break
+            for linha in linhas:
+                self._aplicar(_produto_da_linha(linha), nomes)
+        cursor.close()
+        self._indexar_nomes(nomes)
+        self._marca = marca
+        self._ultima_verificacao = time.monotonic()
+        self.carregado = True
+
+    def carregar(self, conn):
+        """ Carga completa do catálogo (só na primeira vez). """
+        with self._lock:
+            if not self.carregado:
+                self._ler_tudo(conn)
+
+    def reconciliar(self, conn):
+        """
+        Relê o catálogo inteiro em um índice novo e troca o atual por ele,
+        corrigindo o que a leitura incremental não viu. As buscas continuam
+        usando o índice atual durante a leitura.
+        """
+        novo = IndiceProdutos(self.intervalo)
+        novo._ler_tudo(conn)
+        with self._lock:
+            # A marca do índice novo é anterior à leitura dele: o que o índice
+            # atual aplicou nesse meio tempo é relido na próxima atualização.
+            self._por_barras, self._por_codigo, self._por_nome = novo._por_barras, novo._por_codigo, novo._por_nome
+            self._marca = novo._marca
+            self.carregado = True
+        return len(novo)
+
+    def atualizar(self, conn, forcar=False):
+        """
+        Relê apenas os produtos alterados (e retira os apagados) desde a última
+        marca. `conn` não deve ter alterações pendentes: a leitura começa com
+        um commit para abrir um snapshot novo. Retorna quantos registros foram
+        aplicados (0 se ainda não era hora de verificar ou se outra thread já
+        está atualizando).
+        """
+        if not self.carregado:
+            self.carregar(conn)
+            return len(self)
+        if not forcar and not self.precisa_atualizar():
+            return 0
+        # Não bloqueia: se outra thread já está atualizando, segue com o índice atual.
+        if not self._lock.acquire(blocking=False):
+            return 0
+        try:
+            self._ultima_verificacao = time.monotonic()
+            conn.commit()
+            marca = marca_segura(conn)
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT {COLUNAS} FROM produto WHERE atualizado_em >= %s", (self._marca,))
+            linhas = cursor.fetchall()
+            cursor.execute("SELECT cod_produto FROM produto_removido WHERE removido_em >= %s", (self._marca,))
+            removidos = [linha[0] for linha in cursor.fetchall()]
+            cursor.close()
+            nomes = []
+            for linha in linhas:
+                self._aplicar(_produto_da_linha(linha), nomes)
+            for cod in removidos:
+                self._remover(cod, nomes)
+            self._indexar_nomes(nomes)
+            self._marca = marca
+            return len(linhas) + len(removidos)
+        finally:
+            self._lock.release()
+
+    def iniciar_manutencao(self, obter_conexao, devolver_conexao, intervalo=INTERVALO_RECONCILIACAO):
+        """
+        Inicia uma thread daemon que carrega o índice assim que o servidor sobe
+        (a primeira leitura no caixa não espera a carga) e o relê por inteiro a
+        cada `intervalo` segundos. Retorna o Event que a encerra.
+        """
+        parar = threading.Event()
+
+        def executar():
+            while True:
+                conn = None
+                try:
+                    conn = obter_conexao()
+                    if self.carregado:
+                        self.reconciliar(conn)
+                    else:
+                        self.carregar(conn)
+                except Exception:
+                    log.exception("Falha ao carregar o índice de produtos do PDV.")
+                finally:
+                    if conn is not None:
+                        devolver_conexao(conn)
+                if parar.wait(intervalo):
+                    return
+
+        threading.Thread(target=executar, name='indice-produtos', daemon=True).start()
+        return parar
+
+    # --- Memória ---
+    def memoria_estimada(self):
+        """ Estimativa em bytes da memória ocupada pelo índice (objetos, dicionários e busca por nome). """
+        total = sys.getsizeof(self._por_barras) + sys.getsizeof(self._por_codigo)
+        unidades = set()
+        for produto in self._por_codigo.values():
+            total += sys.getsizeof(produto)
+            total += sys.getsizeof(produto.nome) + sys.getsizeof(produto.codigo_barras)
+            total += sys.getsizeof(produto.preco_centavos)
+            unidades.add(produto.unidade_medida)
+        total += sum(sys.getsizeof(u) for u in unidades)
+        return total + self._por_nome.memoria_estimada()
+
+
+# Índice compartilhado por todas as requisições do processo.
+indice_produtos = IndiceProdutos()
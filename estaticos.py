@@ -0,0 +1,230 @@
+# =====================================================================
+# ARQUIVOS ESTÁTICOS COMPILADOS (PRODUÇÃO)
+# `flask construir-estaticos` compila o CSS do Tailwind (em vez do JIT
+# carregado da CDN a cada página) e copia cada arquivo de static/ para
+# static/dist/ com o hash do conteúdo no nome, já comprimido em gzip (e
+# brotli, se o módulo estiver instalado), mais um manifesto nome -> nome
+# com hash.
+#
+# Em produção (`servir_compilados`, chamada por wsgi.py) o
+# `url_for('static', ...)` dos templates passa a apontar para a versão com
+# hash, e um middleware WSGI entrega esses arquivos antes do Flask: escolhe
+# a variante comprimida aceita pelo navegador e manda cache de 1 ano
+# (`immutable`). Como o nome muda quando o conteúdo muda, não há risco de
+# servir versão antiga. No desenvolvimento nada disso é usado: os arquivos
+# originais continuam servidos direto de static/.
+# =====================================================================
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import shutil
+import subprocess
+
+from werkzeug.wsgi import wrap_file
+
+try:
+    import brotli
+except ImportError:  # Opcional: sem ele só são gerados os .gz.
+    brotli = None
+
+log = logging.getLogger(__name__)
+
+PASTA_COMPILADOS = 'dist'
+MANIFESTO = 'manifesto.json'
+
+# Fonte e saída do CSS do Tailwind (caminhos relativos a static/).
+TAILWIND_ENTRADA = 'src/tailwind.css'
+TAILWIND_SAIDA = 'css/tailwind.css'
+
+# Só vale comprimir texto; imagens e fontes woff já são comprimidas.
+COMPRIMIVEIS = {'.css', '.js', '.map', '.json', '.svg', '.txt', '.html', '.ttf', '.eot', '.ico'}
+
+CACHE_IMUTAVEL = 'public, max-age=31536000, immutable'
+
+# Codificações na ordem de preferência quando o navegador aceita mais de uma.
+CODIFICACOES = (('br', '.br'), ('gzip', '.gz'))
+
+
+class ErroEstaticos(Exception):
+    """ Falha na compilação do CSS. """
+
+
+def compilar_css(pasta_static, executavel=None):
+    """
+    Gera static/css/tailwind.css só com as classes usadas nos templates
+    (tailwind.config.js na raiz do projeto). Usa o executável standalone do
+    Tailwind (`tailwindcss` no PATH ou CAIXA_TAILWIND). Retorna o caminho do
+    arquivo gerado, ou None se o executável não foi encontrado.
+    """
+    executavel = executavel or os.environ.get('CAIXA_TAILWIND') or shutil.which('tailwindcss')
+    if not executavel:
+        return None
+    raiz = os.path.dirname(os.path.abspath(pasta_static))
+    saida = os.path.join(pasta_static, TAILWIND_SAIDA)
+    comando = [executavel, '-c', os.path.join(raiz, 'tailwind.config.js'),
+               '-i', os.path.join(pasta_static, TAILWIND_ENTRADA), '-o', saida, '--minify']
+    resultado = subprocess.run(comando, cwd=raiz, capture_output=True, text=True)
+    if resultado.returncode != 0:
+        raise ErroEstaticos(f"tailwindcss terminou com código {resultado.returncode}: {resultado.stderr.strip()}")
+    return saida
+
+
+def _comprimir(caminho, dados):
+    """ Grava as variantes comprimidas que ficarem menores que o original. """
+    gz = gzip.compress(dados, compresslevel=9, mtime=0)
+    if len(gz) < len(dados):
+        with open(caminho + '.gz', 'wb') as arquivo:
+            arquivo.write(gz)
+    if brotli is not None:
+        br = brotli.compress(dados, quality=11)
+        if len(br) < len(dados):
+            with open(caminho + '.br', 'wb') as arquivo:
+                arquivo.write(br)
+
+
+def construir_estaticos(pasta_static):
+    """
+    Recria static/dist/ a partir dos arquivos de static/ (menos os fontes de
+    static/src/). Retorna o manifesto {nome original: nome com hash}, com os
+    nomes relativos a static/ e separados por '/'.
+    """
+    destino = os.path.join(pasta_static, PASTA_COMPILADOS)
+    shutil.rmtree(destino, ignore_errors=True)
+    ignorar = {PASTA_COMPILADOS, os.path.dirname(TAILWIND_ENTRADA)}
+
+    manifesto = {}
+    for raiz, pastas, arquivos in os.walk(pasta_static):
+        if raiz == pasta_static:
+            pastas[:] = [p for p in pastas if p not in ignorar]
+        for nome in sorted(arquivos):
+            origem = os.path.join(raiz, nome)
+            relativo = os.path.relpath(origem, pasta_static).replace(os.sep, '/')
+            with open(origem, 'rb') as arquivo:
+                dados = arquivo.read()
+            base, extensao = os.path.splitext(relativo)
+            com_hash = f"{base}.{hashlib.sha256(dados).hexdigest()[:12]}{extensao}"
+
+            caminho = os.path.join(destino, *com_hash.split('/'))
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+            with open(caminho, 'wb') as arquivo:
+                arquivo.write(dados)
+            if extensao.lower() in COMPRIMIVEIS:
+                _comprimir(caminho, dados)
+            manifesto[relativo] = com_hash
+
+    with open(os.path.join(destino, MANIFESTO), 'w', encoding='utf-8') as arquivo:
+        json.dump(manifesto, arquivo, indent=1, sort_keys=True)
+    return manifesto
+
+
+def _aceitas(cabecalho):
+    """ Codificações com q > 0 no Accept-Encoding. """
+    aceitas = set()
+    for parte in (cabecalho or '').split(','):
+        nome, _, parametros = parte.strip().partition(';')
+        qualidade = parametros.strip()
+        if qualidade.startswith('q='):
+            try:
+                if float(qualidade[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if nome:
+            aceitas.add(nome.strip().lower())
+    return aceitas
+
+
+class ServirCompilados:
+    """
+    Middleware WSGI que entrega os arquivos de static/dist/ sem passar pelo
+    Flask. A lista de arquivos (e variantes comprimidas) é montada uma vez, a
+    partir do manifesto: os arquivos compilados não mudam com o processo no ar.
+    """
+
+    def __init__(self, wsgi_app, pasta, prefixo, manifesto):
+        self.wsgi_app = wsgi_app
+        self.arquivos = {}  # caminho da URL -> (tipo, hash, {codificação: (caminho, tamanho)})
+        for com_hash in manifesto.values():
+            caminho = os.path.join(pasta, *com_hash.split('/'))
+            if not os.path.isfile(caminho):
+                continue
+            variantes = {None: (caminho, os.path.getsize(caminho))}
+            for codificacao, sufixo in CODIFICACOES:
+                if os.path.isfile(caminho + sufixo):
+                    variantes[codificacao] = (caminho + sufixo, os.path.getsize(caminho + sufixo))
+            tipo = mimetypes.guess_type(caminho)[0] or 'application/octet-stream'
+            if tipo.startswith('text/') or tipo in ('application/javascript', 'image/svg+xml'):
+                tipo += '; charset=utf-8'
+            hash_ = os.path.splitext(com_hash)[0].rsplit('.', 1)[1]
+            self.arquivos[f"{prefixo}/{com_hash}"] = (tipo, hash_, variantes)
+
+    def __call__(self, environ, start_response):
+        item = self.arquivos.get(environ.get('PATH_INFO', ''))
+        if item is None or environ['REQUEST_METHOD'] not in ('GET', 'HEAD'):
+            return self.wsgi_app(environ, start_response)
+
+        tipo, hash_, variantes = item
+        aceitas = _aceitas(environ.get('HTTP_ACCEPT_ENCODING'))
+        codificacao = next((c for c, _ in CODIFICACOES if c in variantes and c in aceitas), None)
+        caminho, tamanho = variantes[codificacao]
+        etag = f'"{hash_}-{codificacao}"' if codificacao else f'"{hash_}"'
+
+        cabecalhos = [('Cache-Control', CACHE_IMUTAVEL), ('ETag', etag)]
+        if len(variantes) > 1:
+            cabecalhos.append(('Vary', 'Accept-Encoding'))
+        if etag in environ.get('HTTP_IF_NONE_MATCH', ''):
+            start_response('304 Not Modified', cabecalhos)
+            return []
+
+        cabecalhos += [('Content-Type', tipo), ('Content-Length', str(tamanho))]
+        if codificacao:
+            cabecalhos.append(('Content-Encoding', codificacao))
+        start_response('200 OK', cabecalhos)
+        if environ['REQUEST_METHOD'] == 'HEAD':
+            return []
+        return wrap_file(environ, open(caminho, 'rb'))
+
+
+def registrar_estaticos(app):
+    """
+    Disponibiliza `estatico_existe(nome)` aos templates, para que usem um
+    arquivo gerado pelo build (ex.: o CSS do Tailwind) só quando ele existe.
+    """
+    existentes = {}
+
+    def estatico_existe(nome):
+        if nome not in existentes or app.debug:
+            existentes[nome] = os.path.isfile(os.path.join(app.static_folder, nome))
+        return existentes[nome]
+
+    app.add_template_global(estatico_existe)
+
+
+def servir_compilados(app):
+    """
+    Liga os arquivos de static/dist/ (se `flask construir-estaticos` já foi
+    executado): reescreve `url_for('static', filename=...)` para o nome com
+    hash e instala o middleware. Retorna False se não há manifesto.
+    """
+    if 'estaticos' in app.extensions:
+        return True
+    pasta = os.path.join(app.static_folder, PASTA_COMPILADOS)
+    try:
+        with open(os.path.join(pasta, MANIFESTO), encoding='utf-8') as arquivo:
+            manifesto = json.load(arquivo)
+    except FileNotFoundError:
+        log.warning("static/%s/%s não encontrado: rode `flask construir-estaticos`. "
+                    "Servindo os arquivos estáticos originais, sem cache longo.", PASTA_COMPILADOS, MANIFESTO)
+        return False
+
+    @app.url_defaults
+    def _nome_com_hash(endpoint, valores):
+        if endpoint == 'static' and valores.get('filename') in manifesto:
+            valores['filename'] = f"{PASTA_COMPILADOS}/{manifesto[valores['filename']]}"
+
+    app.wsgi_app = ServirCompilados(app.wsgi_app, pasta, f"{app.static_url_path}/{PASTA_COMPILADOS}", manifesto)
+    app.extensions['estaticos'] = manifesto
+    return True
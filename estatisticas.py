@@ -0,0 +1,74 @@
+# =====================================================================
+# ESTATÍSTICAS DO DASHBOARD
+# Lê os indicadores do painel da tabela `resumo_sistema` (mantida por
+# triggers) em uma única consulta e guarda o resultado em um cache curto,
+# para que o tempo de carga do dashboard não dependa do tamanho das tabelas.
+# Cada contador é dividido em fatias (migração 0006) para que as vendas
+# simultâneas não disputem a mesma linha; o valor é a soma das fatias.
+# =====================================================================
+from banco import get_db
+from cache import CacheTTL
+
+# Segundos que os números do painel podem ficar em cache.
+TTL_PAINEL = 5.0
+
+_cache = CacheTTL(ttl=TTL_PAINEL)
+
+
+def _carregar_painel():
+    conn = get_db()
+    cursor = conn.cursor(dictionary=True)
+
+    # Uma leitura pela chave primária soma as fatias de todos os contadores.
+    cursor.execute("SELECT chave, SUM(valor) AS valor FROM resumo_sistema GROUP BY chave")
+    resumo = {linha['chave']: linha['valor'] for linha in cursor.fetchall()}
+
+    # Usa o índice idx_venda_data: lê só as 5 últimas linhas, sem ordenar a tabela.
+    cursor.execute("""
+        SELECT v.cod_venda, v.total, v.data_venda, u.nome_usuario
+        FROM venda v JOIN usuario u ON v.cod_usuario = u.cod_usuario
+        ORDER BY v.data_venda DESC LIMIT 5
+    """)
+    vendas_recentes = cursor.fetchall()
+    cursor.close()
+
+    return {
+        'total_produtos': int(resumo.get('total_produtos', 0)),
+        'total_categorias': int(resumo.get('total_categorias', 0)),
+        'total_vendas': int(resumo.get('total_vendas', 0)),
+        'saldo_caixa': resumo.get('saldo_caixa', 0),
+        'vendas_recentes': vendas_recentes,
+    }
+
+
+def obter_painel():
+    """ Retorna os dados do dashboard, do cache quando possível. """
+    return _cache.obter('painel', _carregar_painel)
+
+
+def invalidar_painel():
+    """ Descarta os números em cache; chamada pelas rotas que alteram os dados do painel. """
+    _cache.invalidar()
+
+
+def recalcular_resumo(conn):
+    """
+    Reconstrói os contadores de `resumo_sistema` a partir das tabelas de origem.
+    Útil após cargas em massa feitas com os triggers desativados ou para
+    conferir a consistência dos totais. Vendas e movimentações já arquivadas
+    continuam contando.
+    """
+    cursor = conn.cursor()
+    # Zera as fatias e grava o total na fatia 0, na mesma transação.
+    cursor.execute("DELETE FROM resumo_sistema")
+    cursor.execute("""
+        INSERT INTO resumo_sistema (chave, fatia, valor)
+        SELECT 'total_produtos', 0, COUNT(*) FROM produto
+        UNION ALL SELECT 'total_categorias', 0, COUNT(*) FROM categoria_produto
+        UNION ALL SELECT 'total_vendas', 0, (SELECT COUNT(*) FROM venda) + (SELECT COUNT(*) FROM venda_arquivo)
+        UNION ALL SELECT 'saldo_caixa', 0, COALESCE(SUM(CASE WHEN tipo = 'entrada' THEN valor ELSE -valor END), 0)
+               FROM (SELECT tipo, valor FROM caixa UNION ALL SELECT tipo, valor FROM caixa_arquivo) movimentacoes
+    """)
+    conn.commit()
+    cursor.close()
+    invalidar_painel()
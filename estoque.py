@@ -0,0 +1,183 @@
+# =====================================================================
+# ESTOQUE: MOVIMENTAÇÕES, ALERTAS E GIRO
+# Reposições e ajustes alteram `produto.quantidade` e gravam a movimentação
+# na mesma transação (as vendas fazem o mesmo em vendas.py). Os alertas usam
+# o índice da coluna gerada `folga_estoque` (quantidade - estoque_minimo), e
+# o giro (média de vendas por dia e dias de estoque restantes) é recalculado
+# em lote por uma tarefa periódica.
+# =====================================================================
+import logging
+import threading
+
+TIPOS_MANUAIS = ('reposicao', 'ajuste')
+
+# Janela (dias) usada no cálculo da média de vendas por dia.
+JANELA_GIRO = 30
+
+# Intervalo (segundos) da tarefa periódica que recalcula o giro.
+INTERVALO_GIRO = 3600
+
+# Produtos (faixa de cod_produto) recalculados por transação no giro.
+LOTE_GIRO = 5_000
+
+log = logging.getLogger(__name__)
+
+
+class MovimentacaoInvalida(ValueError):
+    pass
+
+
+def movimentar(conn, cod_produto, tipo, quantidade, cod_usuario=None, observacao=None):
+    """
+    Registra uma reposição (quantidade positiva) ou um ajuste (positivo ou
+    negativo) e atualiza o estoque do produto. Retorna a nova quantidade.
+    """
+    if tipo not in TIPOS_MANUAIS:
+        raise MovimentacaoInvalida("Tipo de movimentação inválido.")
+    if quantidade == 0 or (tipo == 'reposicao' and quantidade < 0):
+        raise MovimentacaoInvalida("Quantidade inválida para este tipo de movimentação.")
+
+    cursor = conn.cursor()
+    cursor.execute("SELECT quantidade FROM produto WHERE cod_produto = %s FOR UPDATE", (cod_produto,))
+    linha = cursor.fetchone()
+    if linha is None:
+        conn.rollback()
+        cursor.close()
+        raise MovimentacaoInvalida("Produto não encontrado.")
+    if linha[0] + quantidade < 0:
+        conn.rollback()
+        cursor.close()
+        raise MovimentacaoInvalida(f"O ajuste deixaria o estoque negativo (estoque atual: {linha[0]}).")
+    cursor.execute("UPDATE produto SET quantidade = quantidade + %s WHERE cod_produto = %s",
+                   (quantidade, cod_produto))
+    cursor.execute("""
+        INSERT INTO movimentacao_estoque (cod_produto, tipo, quantidade, cod_usuario, observacao)
+        VALUES (%s, %s, %s, %s, %s)
+    """, (cod_produto, tipo, quantidade, cod_usuario, observacao))
+    conn.commit()
+    cursor.close()
+    return linha[0] + quantidade
+
+
+def definir_minimo(conn, cod_produto, estoque_minimo):
+    cursor = conn.cursor()
+    cursor.execute("UPDATE produto SET estoque_minimo = %s WHERE cod_produto = %s",
+                   (estoque_minimo, cod_produto))
+    conn.commit()
+    alterado = cursor.rowcount
+    cursor.close()
+    return alterado
+
+
+def abaixo_do_minimo(conn, limite=100):
+    """
+    Produtos ativos com estoque no mínimo ou abaixo dele, dos mais críticos
+    para os menos críticos. Lê só a faixa `folga_estoque <= 0` do índice.
+    """
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("""
+        SELECT p.cod_produto, p.nome_produto, p.codigo_barras, p.quantidade, p.estoque_minimo,
+               p.folga_estoque, g.media_diaria, g.dias_restantes
+        FROM produto p
+        LEFT JOIN produto_giro g ON g.cod_produto = p.cod_produto
+        WHERE p.folga_estoque <= 0 AND p.ativo = TRUE
+        ORDER BY p.folga_estoque ASC
+        LIMIT %s
+    """, (limite,))
+    linhas = cursor.fetchall()
+    cursor.close()
+    return linhas
+
+
+def historico(conn, cod_produto, limite=100):
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("""
+        SELECT cod_movimentacao, tipo, quantidade, cod_venda, cod_usuario, observacao, data_movimentacao
+        FROM movimentacao_estoque
+        WHERE cod_produto = %s
+        ORDER BY data_movimentacao DESC, cod_movimentacao DESC
+        LIMIT %s
+    """, (cod_produto, limite))
+    linhas = cursor.fetchall()
+    cursor.close()
+    return linhas
+
+
+def calcular_giro(conn, janela=JANELA_GIRO, lote=LOTE_GIRO):
+    """
+    Recalcula média diária de vendas e dias de estoque restantes de todos os
+    produtos a partir dos rollups diários (relatorios.py), sem ler as vendas
+    brutas. Retorna o número de linhas afetadas.
+
+    Roda em faixas de `lote` códigos, uma transação por faixa. A leitura de
+    `produto` é uma leitura simples (sem lock): um INSERT ... SELECT travaria
+    as linhas lidas e faria o checkout (SELECT ... FOR UPDATE) esperar.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT MIN(cod_produto), MAX(cod_produto) FROM produto")
+    minimo, maximo = cursor.fetchone()
+    afetadas = 0
+    inicio = minimo
+    while inicio is not None and inicio <= maximo:
+        fim = inicio + lote - 1
+        cursor.execute("""
+            SELECT p.cod_produto,
+                   COALESCE(r.vendido, 0) / %s AS media,
+                   IF(COALESCE(r.vendido, 0) > 0, GREATEST(p.quantidade, 0) / (r.vendido / %s), NULL)
+            FROM produto p
+            LEFT JOIN (
+                SELECT cod_produto, SUM(quantidade) AS vendido
+                FROM rollup_produto_dia
+                WHERE dia >= CURDATE() - INTERVAL %s DAY AND cod_produto BETWEEN %s AND %s
+                GROUP BY cod_produto
+            ) r ON r.cod_produto = p.cod_produto
+            WHERE p.cod_produto BETWEEN %s AND %s
+        """, (janela, janela, janela, inicio, fim, inicio, fim))
+        linhas = cursor.fetchall()
+        if linhas:
+            cursor.execute(f"""
+                INSERT INTO produto_giro (cod_produto, media_diaria, dias_restantes)
+                VALUES {", ".join(["(%s, %s, %s)"] * len(linhas))}
+                ON DUPLICATE KEY UPDATE media_diaria = VALUES(media_diaria),
+                                        dias_restantes = VALUES(dias_restantes)
+            """, [valor for linha in linhas for valor in linha])
+            afetadas += cursor.rowcount
+        # Commit por faixa: termina o snapshot e solta os locks de produto_giro.
+        conn.commit()
+        inicio = fim + 1
+    cursor.close()
+    return afetadas
+
+
+def iniciar_calculo_periodico(obter_conexao, devolver_conexao, antes=None, intervalo=INTERVALO_GIRO):
+    """
+    Inicia uma thread daemon que recalcula o giro a cada `intervalo` segundos.
+    Com vários workers, o GET_LOCK do MySQL garante que só um deles calcule
+    por vez. `antes(conn)` roda antes do cálculo (ex.: atualizar os rollups).
+    """
+    parar = threading.Event()
+
+    def executar():
+        while not parar.wait(intervalo):
+            conn = None
+            try:
+                conn = obter_conexao()
+                cursor = conn.cursor()
+                cursor.execute("SELECT GET_LOCK('caixa_prog_giro_estoque', 0)")
+                if cursor.fetchone()[0] == 1:
+                    try:
+                        if antes is not None:
+                            antes(conn)
+                        calcular_giro(conn)
+                    finally:
+                        cursor.execute("SELECT RELEASE_LOCK('caixa_prog_giro_estoque')")
+                        cursor.fetchone()
+                cursor.close()
+            except Exception:
+                log.exception("Falha no cálculo periódico do giro de estoque.")
+            finally:
+                if conn is not None:
+                    devolver_conexao(conn)
+
+    threading.Thread(target=executar, name='giro-estoque', daemon=True).start()
+    return parar
@@ -0,0 +1,111 @@
+# =====================================================================
+# EXPORTAÇÃO EM STREAMING (CSV / NDJSON)
+# Lê as linhas com um cursor sem buffer (o MySQL envia as linhas conforme são
+# consumidas) e as entrega ao cliente aos poucos, por um gerador. A memória do
+# processo fica constante, seja a exportação de cem ou de milhões de linhas.
+#
+# Meses arquivados (arquivamento.py) saem das tabelas quentes para as frias
+# (`*_arquivo`): cada exportação lê as duas com UNION ALL. Enquanto um
+# arquivamento está em andamento a mesma linha pode estar nas duas; a parte
+# fria pula as que ainda existem na quente (busca pela chave primária).
+# =====================================================================
+import csv
+import io
+import json
+from datetime import timedelta
+
+# Linhas lidas do cursor e escritas na resposta de cada vez.
+LOTE = 1_000
+
+# Consultas de cada exportação: (SELECT ... FROM ..., coluna de data, coluna de
+# usuário, chave primária das linhas exportadas, (tabela quente, apelido) dela). Os
+# nomes das tabelas ficam entre chaves: {venda} vira `venda` ou `venda_arquivo`.
+EXPORTACOES = {
+    'vendas': (
+        "SELECT v.cod_venda, v.cod_usuario, v.data_venda, v.total FROM {venda} v",
+        'v.data_venda', 'v.cod_usuario', 'cod_venda', ('venda', 'v'),
+    ),
+    'itens': (
+        """SELECT i.cod_item, i.cod_venda, v.data_venda, v.cod_usuario, i.cod_produto,
+                  i.quantidade, i.preco_unitario
+           FROM {item_venda} i JOIN {venda} v ON v.cod_venda = i.cod_venda""",
+        'v.data_venda', 'v.cod_usuario', 'cod_item', ('item_venda', 'i'),
+    ),
+    'caixa': (
+        "SELECT c.cod_caixa, c.tipo, c.valor, c.descricao, c.data_movimentacao, c.cod_usuario FROM {caixa} c",
+        'c.data_movimentacao', 'c.cod_usuario', 'cod_caixa', ('caixa', 'c'),
+    ),
+}
+
+_QUENTES = {'venda': 'venda', 'item_venda': 'item_venda', 'caixa': 'caixa'}
+_FRIAS = {tabela: f"{tabela}_arquivo" for tabela in _QUENTES}
+
+FORMATOS = {'csv': 'text/csv; charset=utf-8', 'ndjson': 'application/x-ndjson'}
+
+
+def montar_consulta(tipo, de=None, ate=None, cod_usuario=None):
+    """
+    Retorna (sql, params) da exportação `tipo` com os filtros de data
+    (inclusive) e usuário, sobre as tabelas quentes e as de arquivo.
+    """
+    select, coluna_data, coluna_usuario, coluna_chave, (tabela, apelido) = EXPORTACOES[tipo]
+    condicoes, params = [], []
+    if de is not None:
+        condicoes.append(f"{coluna_data} >= %s")
+        params.append(de)
+    if ate is not None:
+        condicoes.append(f"{coluna_data} < %s")
+        params.append(ate + timedelta(days=1))
+    if cod_usuario is not None:
+        condicoes.append(f"{coluna_usuario} = %s")
+        params.append(cod_usuario)
+    quente = select.format(**_QUENTES) + (f" WHERE {' AND '.join(condicoes)}" if condicoes else "")
+    # Linhas copiadas por um arquivamento ainda em andamento saem só da tabela quente.
+    fria = select.format(**_FRIAS) + " WHERE " + " AND ".join(
+        condicoes + [f"NOT EXISTS (SELECT 1 FROM {tabela} q WHERE q.{coluna_chave} = {apelido}.{coluna_chave})"])
+    return f"{quente} UNION ALL {fria} ORDER BY {coluna_chave}", params + params
+
+
+def _valor(v):
+    return v.isoformat() if hasattr(v, 'isoformat') else v
+
+
+def gerar_linhas(pool, sql, params, formato):
+    """
+    Gerador com o conteúdo da exportação. Usa uma conexão própria do pool
+    (a resposta continua sendo enviada depois que a rota retorna) e a devolve
+    ao terminar — ou a descarta se o cliente desconectar no meio.
+    """
+    conn = pool.obter()
+    completo = False
+    try:
+        cursor = conn.cursor(buffered=False)
+        cursor.execute(sql, params)
+        colunas = [c[0] for c in cursor.description]
+
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        if formato == 'csv':
+            escritor.writerow(colunas)
+
+        while True:
+            linhas = cursor.fetchmany(LOTE)
+            if not linhas:
+                break
+            for linha in linhas:
+                if formato == 'csv':
+                    escritor.writerow([_valor(v) for v in linha])
+                else:
+                    buffer.write(json.dumps(dict(zip(colunas, map(_valor, linha))), default=str))
+                    buffer.write('\n')
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+        cursor.close()
+        completo = True
+    finally:
+        # Se o cliente desconectou, ainda há linhas pendentes no socket: fechar a
+        # conexão é mais barato do que ler o resto do resultado só para descartá-lo.
+        pool.devolver(conn, descartar=not completo)
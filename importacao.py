@@ -0,0 +1,289 @@
+# =====================================================================
+# IMPORTAÇÃO EM MASSA DO CATÁLOGO DE PRODUTOS (CSV)
+# Lê o arquivo do fornecedor linha a linha, valida cada produto contra
+# categorias, PVPs e unidades de medida carregadas uma única vez em memória e
+# grava em lotes com `INSERT ... ON DUPLICATE KEY UPDATE` (chave: código de
+# barras), um lote por transação. Linhas inválidas são relatadas sem
+# interromper o restante do arquivo.
+#
+# O estoque inicial dos produtos novos entra como reposição em
+# `movimentacao_estoque`, na mesma transação do lote (como em estoque.py).
+#
+# Colunas aceitas (cabeçalho obrigatório, separador "," ou ";"):
+#   codigo_barras, nome_produto, preco_compra, unidade_medida, cod_categoria
+#   (ou categoria, pelo nome) e, opcionais, descricao_produto, preco_venda,
+#   quantidade, cod_pvp, ativo.
+# =====================================================================
+import csv
+import time
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from mysql.connector import errors
+
+# Produtos por INSERT (e por transação).
+TAMANHO_LOTE = 1_000
+
+# Máximo de erros guardados no relatório (o total continua sendo contado).
+MAX_ERROS_RELATADOS = 1_000
+
+COLUNAS = ('nome_produto', 'descricao_produto', 'preco_compra', 'preco_venda', 'quantidade',
+           'unidade_medida', 'codigo_barras', 'ativo', 'cod_categoria', 'cod_pvp')
+
+# A quantidade em estoque de um produto já existente não é sobrescrita pelo
+# arquivo do fornecedor: ela só muda por vendas e movimentações de estoque.
+_ATUALIZAR = ", ".join(f"{c} = VALUES({c})" for c in COLUNAS if c not in ('codigo_barras', 'quantidade'))
+_BARRAS = COLUNAS.index('codigo_barras')
+_QUANTIDADE = COLUNAS.index('quantidade')
+
+CENTAVO = Decimal('0.01')
+MAXIMO_PRECO = Decimal('99999999.99')  # DECIMAL(10,2)
+VERDADEIRO = {'1', 'true', 'sim', 's', 'ativo', 'yes'}
+FALSO = {'0', 'false', 'nao', 'não', 'n', 'inativo', 'no'}
+
+
+class LinhaInvalida(ValueError):
+    pass
+
+
+class Referencias:
+    """ Tabelas de apoio carregadas uma vez para validar todas as linhas sem consultas extras. """
+
+    def __init__(self, conn):
+        cursor = conn.cursor()
+        cursor.execute("SELECT cod_categoria, nome_categoria, pvp_categoria FROM categoria_produto")
+        self.categorias = {}
+        self.categorias_por_nome = {}
+        for cod, nome, pvp in cursor.fetchall():
+            self.categorias[cod] = pvp
+            self.categorias_por_nome[nome.strip().lower()] = cod
+        cursor.execute("SELECT cod_pvp, percentual, tipo_pvp, ativo FROM pvp")
+        self.pvps = {}
+        self.global_ativo = None
+        for cod, percentual, tipo, ativo in cursor.fetchall():
+            self.pvps[cod] = (percentual, bool(ativo))
+            if tipo == 'global' and ativo:
+                self.global_ativo = cod
+        cursor.execute("SELECT nome_unidade, sigla_unidade FROM unidade_medida")
+        self.unidades = {}
+        for nome, sigla in cursor.fetchall():
+            self.unidades[sigla] = sigla
+            self.unidades[sigla.lower()] = sigla
+            self.unidades[nome.strip().lower()] = sigla
+        cursor.close()
+
+
+class ResultadoImportacao:
+    def __init__(self):
+        self.lidas = 0
+        self.gravadas = 0
+        self.total_erros = 0
+        self.erros = []  # [(linha, mensagem)]
+        self.segundos = 0.0
+
+    def erro(self, linha, mensagem):
+        self.total_erros += 1
+        if len(self.erros) < MAX_ERROS_RELATADOS:
+            self.erros.append((linha, mensagem))
+
+    @property
+    def linhas_por_segundo(self):
+        return self.lidas / self.segundos if self.segundos else 0.0
+
+    def como_dict(self):
+        return {
+            'lidas': self.lidas,
+            'gravadas': self.gravadas,
+            'erros': self.total_erros,
+            'detalhes_erros': [{'linha': n, 'erro': m} for n, m in self.erros],
+            'segundos': round(self.segundos, 3),
+            'linhas_por_segundo': round(self.linhas_por_segundo, 1),
+        }
+
+
+def _decimal(texto, campo):
+    texto = (texto or '').strip()
+    if ',' in texto:
+        # Formato brasileiro: 1.234,56
+        texto = texto.replace('.', '').replace(',', '.')
+    try:
+        valor = Decimal(texto)
+    except InvalidOperation:
+        raise LinhaInvalida(f"{campo} inválido: {texto!r}.")
+    # NaN/Infinity passam pelo Decimal() e só falham na comparação ou no quantize.
+    if not valor.is_finite():
+        raise LinhaInvalida(f"{campo} inválido: {texto!r}.")
+    if valor < 0:
+        raise LinhaInvalida(f"{campo} não pode ser negativo.")
+    if valor > MAXIMO_PRECO:
+        raise LinhaInvalida(f"{campo} acima do máximo permitido ({MAXIMO_PRECO}).")
+    return _centavos(valor, campo)
+
+
+def _centavos(valor, campo):
+    try:
+        return valor.quantize(CENTAVO, ROUND_HALF_UP)
+    except ArithmeticError:
+        raise LinhaInvalida(f"{campo} inválido: {valor!r}.")
+
+
+def _inteiro(texto, campo, padrao=None):
+    texto = (texto or '').strip()
+    if not texto:
+        if padrao is None:
+            raise LinhaInvalida(f"{campo} é obrigatório.")
+        return padrao
+    try:
+        valor = int(texto)
+    except ValueError:
+        raise LinhaInvalida(f"{campo} inválido: {texto!r}.")
+    if valor < 0:
+        raise LinhaInvalida(f"{campo} não pode ser menor que zero.")
+    return valor
+
+
+def validar_linha(campos, refs):
+    """ Converte uma linha do CSV na tupla de COLUNAS, ou lança LinhaInvalida. """
+    codigo_barras = (campos.get('codigo_barras') or '').strip()
+    if not codigo_barras or len(codigo_barras) > 13:
+        raise LinhaInvalida("codigo_barras vazio ou com mais de 13 caracteres.")
+    nome = (campos.get('nome_produto') or '').strip()
+    if not nome or len(nome) > 100:
+        raise LinhaInvalida("nome_produto vazio ou com mais de 100 caracteres.")
+
+    if (campos.get('cod_categoria') or '').strip():
+        cod_categoria = _inteiro(campos['cod_categoria'], 'cod_categoria')
+    else:
+        cod_categoria = refs.categorias_por_nome.get((campos.get('categoria') or '').strip().lower())
+    if cod_categoria not in refs.categorias:
+        raise LinhaInvalida("Categoria inexistente.")
+
+    unidade = refs.unidades.get((campos.get('unidade_medida') or '').strip()) \
+        or refs.unidades.get((campos.get('unidade_medida') or '').strip().lower())
+    if unidade is None:
+        raise LinhaInvalida(f"Unidade de medida desconhecida: {campos.get('unidade_medida')!r}.")
+
+    # PVP: o informado na linha ou, se ausente, o da categoria.
+    cod_pvp = _inteiro(campos.get('cod_pvp'), 'cod_pvp', padrao=refs.categorias[cod_categoria])
+    if cod_pvp not in refs.pvps:
+        raise LinhaInvalida(f"PVP inexistente: {cod_pvp}.")
+
+    preco_compra = _decimal(campos.get('preco_compra'), 'preco_compra')
+    if (campos.get('preco_venda') or '').strip():
+        preco_venda = _decimal(campos['preco_venda'], 'preco_venda')
+    else:
+        # Sem preço de venda no arquivo: aplica o primeiro PVP ativo entre o da
+        # categoria, o global e o do produto (mesma prioridade de precificacao.py).
+        percentual = None
+        for cod in (refs.categorias[cod_categoria], refs.global_ativo, cod_pvp):
+            if cod in refs.pvps and refs.pvps[cod][1]:
+                percentual = refs.pvps[cod][0]
+                break
+        if percentual is None:
+            raise LinhaInvalida("preco_venda ausente e nenhum PVP ativo para calculá-lo.")
+        preco_venda = _centavos(preco_compra * percentual, 'preco_venda')
+        if preco_venda > MAXIMO_PRECO:
+            raise LinhaInvalida(f"preco_venda calculado acima do máximo permitido ({MAXIMO_PRECO}).")
+
+    ativo_texto = (campos.get('ativo') or '1').strip().lower()
+    if ativo_texto not in VERDADEIRO | FALSO:
+        raise LinhaInvalida(f"ativo inválido: {campos.get('ativo')!r}.")
+
+    return (nome, (campos.get('descricao_produto') or '').strip() or None, preco_compra, preco_venda,
+            _inteiro(campos.get('quantidade'), 'quantidade', padrao=0), unidade, codigo_barras,
+            ativo_texto in VERDADEIRO, cod_categoria, cod_pvp)
+
+
+def _existentes(cursor, lote):
+    """ Códigos de barras do lote que já estão cadastrados (travados até o commit do lote). """
+    marcadores = ", ".join(["%s"] * len(lote))
+    cursor.execute(f"SELECT codigo_barras FROM produto WHERE codigo_barras IN ({marcadores}) FOR UPDATE",
+                   [valores[_BARRAS] for _, valores in lote])
+    return {linha[0] for linha in cursor.fetchall()}
+
+
+def _estoque_inicial(cursor, lote, existentes, cod_usuario):
+    """
+    Registra como reposição o estoque dos produtos que o lote acabou de criar
+    (nos já existentes a quantidade não muda). Roda na transação do lote.
+    """
+    quantidades = {}
+    for _, valores in lote:
+        # Código repetido no lote: o INSERT usa a primeira linha, as demais só atualizam.
+        quantidades.setdefault(valores[_BARRAS], valores[_QUANTIDADE])
+    novos = [barras for barras, qtd in quantidades.items() if qtd > 0 and barras not in existentes]
+    if not novos:
+        return
+    cursor.execute(f"SELECT cod_produto, codigo_barras FROM produto WHERE codigo_barras IN "
+                   f"({', '.join(['%s'] * len(novos))})", novos)
+    cursor.executemany("""
+        INSERT INTO movimentacao_estoque (cod_produto, tipo, quantidade, cod_usuario, observacao)
+        VALUES (%s, 'reposicao', %s, %s, 'Estoque inicial (importação de produtos)')
+    """, [(cod, quantidades[barras], cod_usuario) for cod, barras in cursor.fetchall()])
+
+
+def _gravar_lote(conn, cursor, lote, resultado, cod_usuario=None):
+    """ Grava um lote com um único INSERT de várias linhas; em caso de erro, isola as linhas ruins. """
+    marcadores = "(" + ", ".join(["%s"] * len(COLUNAS)) + ")"
+    sql = (f"INSERT INTO produto ({', '.join(COLUNAS)}) VALUES "
+           + ", ".join([marcadores] * len(lote))
+           + f" ON DUPLICATE KEY UPDATE {_ATUALIZAR}")
+    try:
+        existentes = _existentes(cursor, lote)
+        cursor.execute(sql, [valor for _, valores in lote for valor in valores])
+        _estoque_inicial(cursor, lote, existentes, cod_usuario)
+        conn.commit()
+    except errors.DatabaseError:
+        conn.rollback()
+        if len(lote) == 1:
+            raise
+        # Regrava linha a linha só este lote para descobrir quais falharam.
+        for numero, valores in lote:
+            try:
+                _gravar_lote(conn, cursor, [(numero, valores)], resultado, cod_usuario)
+            except errors.DatabaseError as err:
+                resultado.erro(numero, f"Erro do banco: {err.msg}")
+        return
+    resultado.gravadas += len(lote)
+
+
+def importar_produtos(conn, arquivo, tamanho_lote=TAMANHO_LOTE, progresso=None, cod_usuario=None):
+    """
+    Importa o CSV `arquivo` (objeto de texto, lido em streaming) para a tabela
+    `produto`. Retorna um `ResultadoImportacao`. `progresso(resultado)` é
+    chamada após cada lote gravado; `cod_usuario` fica nas movimentações de
+    estoque inicial.
+    """
+    inicio = time.perf_counter()
+    resultado = ResultadoImportacao()
+    refs = Referencias(conn)
+    cursor = conn.cursor()
+
+    cabecalho = arquivo.readline()
+    try:
+        dialeto = csv.Sniffer().sniff(cabecalho, delimiters=',;\t')
+    except csv.Error:
+        dialeto = csv.excel
+    nomes = [n.strip().lower() for n in next(csv.reader([cabecalho], dialeto))]
+
+    lote = []
+    # A linha 1 é o cabeçalho.
+    for numero, valores in enumerate(csv.reader(arquivo, dialeto), start=2):
+        if not any(v.strip() for v in valores):
+            continue
+        resultado.lidas += 1
+        try:
+            lote.append((numero, validar_linha(dict(zip(nomes, valores)), refs)))
+        except LinhaInvalida as err:
+            resultado.erro(numero, str(err))
+            continue
+        if len(lote) >= tamanho_lote:
+            _gravar_lote(conn, cursor, lote, resultado, cod_usuario)
+            lote = []
+            if progresso is not None:
+                progresso(resultado)
+    if lote:
+        _gravar_lote(conn, cursor, lote, resultado, cod_usuario)
+    cursor.close()
+
+    resultado.segundos = time.perf_counter() - inicio
+    return resultado
@@ -0,0 +1,324 @@
+# =====================================================================
+# INSTRUMENTAÇÃO DE DESEMPENHO
+# Mede, dentro do próprio processo e sem dependências externas:
+# - a latência de cada rota (histograma por endpoint e método);
+# - o tempo para obter a conexão do pool em cada requisição;
+# - cada comando SQL (texto normalizado, tempo de execução, tempo de leitura
+#   dos resultados e linhas lidas/alteradas);
+# - a renderização de cada template.
+# Comandos acima de um limite configurável vão para o log de consultas lentas.
+# Tudo é exposto no formato de texto do Prometheus.
+#
+# O custo por observação é uma busca binária nos limites do histograma e
+# alguns incrementos sob um lock (poucos microssegundos), desprezível perto
+# de uma ida ao MySQL.
+# =====================================================================
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+
+from flask import g, request, has_request_context, before_render_template, template_rendered
+
+# Limites (segundos) dos baldes dos histogramas.
+LIMITES_PADRAO = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Comandos SQL distintos (já normalizados) acompanhados; os demais são
+# somados em "outras".
+MAX_CONSULTAS = 500
+
+# Textos SQL crus guardados no cache de normalização (os menos usados saem).
+MAX_CACHE_SQL = 5000
+
+log_lentas = logging.getLogger('caixa.consultas_lentas')
+
+
+class Histograma:
+    __slots__ = ('contagens', 'soma', 'total')
+
+    def __init__(self, n_limites):
+        self.contagens = [0] * (n_limites + 1)  # O último balde é o +Inf.
+        self.soma = 0.0
+        self.total = 0
+
+
+class Registro:
+    """ Histogramas e contadores identificados por (nome, rótulos). """
+
+    def __init__(self, limites=LIMITES_PADRAO):
+        self.limites = tuple(limites)
+        self._histogramas = {}  # nome -> {rótulos: Histograma}
+        self._contadores = {}   # nome -> {rótulos: valor}
+        self._ajuda = {}
+        self._lock = threading.Lock()
+
+    def descrever(self, nome, ajuda):
+        self._ajuda[nome] = ajuda
+
+    def observar(self, nome, valor, rotulos=()):
+        with self._lock:
+            serie = self._histogramas.setdefault(nome, {})
+            histograma = serie.get(rotulos)
+            if histograma is None:
+                histograma = serie[rotulos] = Histograma(len(self.limites))
+            histograma.contagens[bisect_left(self.limites, valor)] += 1
+            histograma.soma += valor
+            histograma.total += 1
+
+    def incrementar(self, nome, valor=1, rotulos=()):
+        with self._lock:
+            serie = self._contadores.setdefault(nome, {})
+            serie[rotulos] = serie.get(rotulos, 0) + valor
+
+    def total(self, nome):
+        """ Soma de um contador em todos os rótulos (ou das contagens, para um histograma). """
+        with self._lock:
+            if nome in self._histogramas:
+                return sum(h.total for h in self._histogramas[nome].values())
+            return sum(self._contadores.get(nome, {}).values())
+
+    def texto_prometheus(self):
+        """ Todas as séries no formato de exposição de texto do Prometheus. """
+        with self._lock:
+            histogramas = {n: {r: (list(h.contagens), h.soma, h.total) for r, h in s.items()}
+                           for n, s in self._histogramas.items()}
+            contadores = {n: dict(s) for n, s in self._contadores.items()}
+
+        linhas = []
+        for nome, serie in sorted(histogramas.items()):
+            linhas += self._cabecalho(nome, 'histogram')
+            for rotulos, (contagens, soma, total) in sorted(serie.items()):
+                acumulado = 0
+                for limite, contagem in zip(self.limites + ('+Inf',), contagens):
+                    acumulado += contagem
+                    le = limite if limite == '+Inf' else repr(float(limite))
+                    linhas.append(f"{nome}_bucket{formatar_rotulos(rotulos + (('le', le),))} {acumulado}")
+                linhas.append(f"{nome}_sum{formatar_rotulos(rotulos)} {soma:.6f}")
+                linhas.append(f"{nome}_count{formatar_rotulos(rotulos)} {total}")
+        for nome, serie in sorted(contadores.items()):
+            linhas += self._cabecalho(nome, 'counter')
+            for rotulos, valor in sorted(serie.items()):
+                linhas.append(f"{nome}{formatar_rotulos(rotulos)} {valor}")
+        return "\n".join(linhas) + "\n"
+
+    def _cabecalho(self, nome, tipo):
+        linhas = [f"# HELP {nome} {self._ajuda[nome]}"] if nome in self._ajuda else []
+        return linhas + [f"# TYPE {nome} {tipo}"]
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def formatar_rotulos(rotulos):
+    if not rotulos:
+        return ""
+    return "{" + ",".join(f'{chave}="{_escapar(valor)}"' for chave, valor in rotulos) + "}"
+
+
+# --- Normalização de SQL ---
+_ESPACOS = re.compile(r"\s+")
+_LISTA_MARCADORES = re.compile(r"%s(?:\s*,\s*%s)+")
+_LISTA_TUPLAS = re.compile(r"(\([^()]*\))(?:\s*,\s*\([^()]*\))+")
+_LISTA_CASOS = re.compile(r"WHEN %s THEN %s(?: WHEN %s THEN %s)+", re.IGNORECASE)
+_normalizadas = OrderedDict()  # SQL cru -> rótulo, do uso mais antigo para o mais recente
+_rotulos = set()               # Rótulos distintos já emitidos (no máximo MAX_CONSULTAS)
+_lock_normalizadas = threading.Lock()
+
+
+def normalizar_sql(sql):
+    """
+    Texto do comando sem espaços extras e com listas de tamanho variável
+    (`IN (%s, %s, ...)`, INSERT de várias linhas, `CASE WHEN %s THEN %s ...`)
+    reduzidas a uma só forma, para agrupar execuções do mesmo comando.
+
+    O limite MAX_CONSULTAS vale para os rótulos normalizados, não para os
+    textos crus: um IN com um tamanho novo gera outro texto, mas o mesmo
+    rótulo. Os textos crus ficam num cache LRU à parte.
+    """
+    if isinstance(sql, bytes):
+        sql = sql.decode('utf-8', 'replace')
+    with _lock_normalizadas:
+        normalizado = _normalizadas.get(sql)
+        if normalizado is not None:
+            _normalizadas.move_to_end(sql)
+            return normalizado
+    normalizado = _ESPACOS.sub(" ", sql).strip()
+    normalizado = _LISTA_MARCADORES.sub("%s, ...", normalizado)
+    normalizado = _LISTA_TUPLAS.sub(r"\1, ...", normalizado)
+    normalizado = _LISTA_CASOS.sub("WHEN %s THEN %s ...", normalizado)
+    with _lock_normalizadas:
+        if normalizado not in _rotulos:
+            if len(_rotulos) >= MAX_CONSULTAS:
+                normalizado = "outras"
+            else:
+                _rotulos.add(normalizado)
+        _normalizadas[sql] = normalizado
+        _normalizadas.move_to_end(sql)
+        if len(_normalizadas) > MAX_CACHE_SQL:
+            _normalizadas.popitem(last=False)
+    return normalizado
+
+
+# --- Conexão e cursor instrumentados ---
+class CursorInstrumentado:
+    """ Repassa tudo ao cursor real, medindo `execute`, `executemany` e as leituras. """
+
+    def __init__(self, cursor, registro, limite_lenta):
+        self._cursor = cursor
+        self._registro = registro
+        self._limite_lenta = limite_lenta
+        self._consulta = ()
+
+    def __getattr__(self, nome):
+        return getattr(self._cursor, nome)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def _medir(self, metodo, operacao, *args, **kwargs):
+        inicio = time.perf_counter()
+        resultado = metodo(operacao, *args, **kwargs)
+        duracao = time.perf_counter() - inicio
+
+        self._consulta = (('consulta', normalizar_sql(operacao)),)
+        self._registro.observar('caixa_sql_segundos', duracao, self._consulta)
+        por_requisicao = g.get('metricas_consultas')
+        if por_requisicao is not None:
+            por_requisicao[0] += 1
+            por_requisicao[1] += duracao
+        if not getattr(self._cursor, 'with_rows', False) and self._cursor.rowcount > 0:
+            self._registro.incrementar('caixa_sql_linhas_total', self._cursor.rowcount, self._consulta)
+        if duracao >= self._limite_lenta:
+            rota = request.endpoint if has_request_context() else None
+            log_lentas.warning("%.3fs rota=%s linhas=%s sql=%s", duracao, rota,
+                               self._cursor.rowcount, self._consulta[0][1])
+        return resultado
+
+    def execute(self, operacao, *args, **kwargs):
+        return self._medir(self._cursor.execute, operacao, *args, **kwargs)
+
+    def executemany(self, operacao, *args, **kwargs):
+        return self._medir(self._cursor.executemany, operacao, *args, **kwargs)
+
+    def _contar_leitura(self, inicio, linhas):
+        self._registro.incrementar('caixa_sql_leitura_segundos_total', time.perf_counter() - inicio, self._consulta)
+        if linhas:
+            self._registro.incrementar('caixa_sql_linhas_total', linhas, self._consulta)
+
+    def fetchone(self):
+        inicio = time.perf_counter()
+        linha = self._cursor.fetchone()
+        self._contar_leitura(inicio, 0 if linha is None else 1)
+        return linha
+
+    def fetchmany(self, *args, **kwargs):
+        inicio = time.perf_counter()
+        linhas = self._cursor.fetchmany(*args, **kwargs)
+        self._contar_leitura(inicio, len(linhas))
+        return linhas
+
+    def fetchall(self):
+        inicio = time.perf_counter()
+        linhas = self._cursor.fetchall()
+        self._contar_leitura(inicio, len(linhas))
+        return linhas
+
+
+class ConexaoInstrumentada:
+    """ Conexão cujos cursores são instrumentados; `conexao` é a conexão real (devolvida ao pool). """
+
+    def __init__(self, conexao, registro, limite_lenta):
+        self.conexao = conexao
+        self._registro = registro
+        self._limite_lenta = limite_lenta
+
+    def __getattr__(self, nome):
+        return getattr(self.conexao, nome)
+
+    def cursor(self, *args, **kwargs):
+        return CursorInstrumentado(self.conexao.cursor(*args, **kwargs), self._registro, self._limite_lenta)
+
+
+# --- Integração com o Flask ---
+def _antes_da_requisicao():
+    g.metricas_inicio = time.perf_counter()
+    g.metricas_consultas = [0, 0.0]  # [comandos SQL, segundos]
+
+
+def _registrar_requisicao(registro, status):
+    inicio = g.pop('metricas_inicio', None)
+    if inicio is None:
+        return
+    rotulos = (('rota', request.endpoint or 'nao_encontrada'), ('metodo', request.method))
+    registro.observar('caixa_requisicao_segundos', time.perf_counter() - inicio, rotulos)
+    registro.incrementar('caixa_requisicoes_total', 1, rotulos + (('status', status),))
+    consultas, segundos = g.get('metricas_consultas', (0, 0.0))
+    if consultas:
+        registro.incrementar('caixa_requisicao_sql_total', consultas, rotulos)
+        registro.incrementar('caixa_requisicao_sql_segundos_total', segundos, rotulos)
+
+
+def instrumentar(app, registro=None):
+    """
+    Liga a instrumentação na aplicação. Configurações lidas de `app.config`:
+    `METRICAS_LIMITE_LENTA` (segundos; padrão 0.5) para o log de consultas lentas.
+    """
+    registro = registro or Registro()
+    registro.descrever('caixa_requisicao_segundos', 'Latência das requisições por rota.')
+    registro.descrever('caixa_requisicoes_total', 'Requisições atendidas por rota e status.')
+    registro.descrever('caixa_requisicao_sql_total', 'Comandos SQL executados pelas requisições de cada rota.')
+    registro.descrever('caixa_requisicao_sql_segundos_total', 'Tempo em SQL das requisições de cada rota.')
+    registro.descrever('caixa_db_emprestimo_segundos', 'Tempo para obter uma conexão do pool.')
+    registro.descrever('caixa_sql_segundos', 'Tempo de execução de cada comando SQL (texto normalizado).')
+    registro.descrever('caixa_sql_leitura_segundos_total', 'Tempo lendo os resultados de cada comando SQL.')
+    registro.descrever('caixa_sql_linhas_total', 'Linhas lidas ou alteradas por comando SQL.')
+    registro.descrever('caixa_template_segundos', 'Tempo de renderização por template.')
+    app.extensions['metricas'] = registro
+    app.config.setdefault('METRICAS_LIMITE_LENTA', 0.5)
+
+    app.before_request(_antes_da_requisicao)
+
+    @app.after_request
+    def _depois_da_requisicao(resposta):
+        _registrar_requisicao(registro, resposta.status_code)
+        return resposta
+
+    @app.teardown_request
+    def _requisicao_com_erro(exc=None):
+        # Só chega aqui com a marca ainda presente se a rota levantou exceção.
+        _registrar_requisicao(registro, 500)
+
+    def _inicio_template(remetente, template, context, **extra):
+        g.setdefault('metricas_templates', []).append(time.perf_counter())
+
+    def _fim_template(remetente, template, context, **extra):
+        pilha = g.get('metricas_templates')
+        if pilha:
+            registro.observar('caixa_template_segundos', time.perf_counter() - pilha.pop(),
+                              (('template', template.name),))
+
+    before_render_template.connect(_inicio_template, app, weak=False)
+    template_rendered.connect(_fim_template, app, weak=False)
+    return registro
+
+
+def envolver_conexao(app, conexao, segundos_emprestimo):
+    """ Registra o tempo de empréstimo e devolve a conexão instrumentada (ou a original, sem métricas). """
+    registro = app.extensions.get('metricas')
+    if registro is None:
+        return conexao
+    registro.observar('caixa_db_emprestimo_segundos', segundos_emprestimo)
+    return ConexaoInstrumentada(conexao, registro, app.config['METRICAS_LIMITE_LENTA'])
+
+
+def texto_pool(estatisticas):
+    """ Estatísticas do pool de conexões no formato do Prometheus. """
+    linhas = []
+    for chave, valor in sorted(estatisticas.items()):
+        tipo = 'counter' if chave in ('emprestimos', 'criadas', 'descartadas', 'reconexoes', 'esperas',
+                                      'timeouts', 'tempo_espera_total', 'tempo_conexao_total') else 'gauge'
+        linhas += [f"# TYPE caixa_pool_{chave} {tipo}", f"caixa_pool_{chave} {valor}"]
+    return "\n".join(linhas) + "\n"
@@ -0,0 +1,164 @@
+# =====================================================================
+# MIGRAÇÕES VERSIONADAS DO ESQUEMA
+# `sql/caixa.sql` é o esquema base. Toda alteração posterior vira um arquivo
+# em `sql/migracoes/` com um número de versão crescente:
+#   0001_descricao.sql  - comandos SQL (aceita DELIMITER, como o caixa.sql);
+#   0002_descricao.py   - função `aplicar(conn)`, para passos que dependem
+#                         dos dados (nomes de chaves, intervalo de datas etc.).
+# A tabela `schema_migracao` registra as versões aplicadas; `flask migrar`
+# aplica as pendentes em ordem, uma de cada vez.
+#
+# O MySQL confirma DDL implicitamente: uma migração que falha no meio não é
+# desfeita. Ela também não é registrada, então depois de corrigir a causa
+# basta rodar de novo (os comandos devem poder ser reexecutados ou a
+# migração deve conferir o que já foi feito).
+# =====================================================================
+import hashlib
+import importlib.util
+import os
+import re
+import time
+
+PASTA_MIGRACOES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sql', 'migracoes')
+
+_ARQUIVO = re.compile(r"^(\d{4})_(\w+)\.(sql|py)$")
+
+# Nome do lock do MySQL que impede duas execuções simultâneas (dois deploys).
+_LOCK = 'caixa_prog_migracoes'
+
+
+class ErroMigracao(Exception):
+    pass
+
+
+def comandos_sql(texto):
+    """ Divide um script SQL em comandos, respeitando `DELIMITER` (usado nos triggers). """
+    delimitador, atual = ';', []
+    for linha in texto.splitlines():
+        limpa = linha.strip()
+        if limpa.upper().startswith('DELIMITER '):
+            delimitador = limpa.split(None, 1)[1]
+            continue
+        if not atual and (not limpa or limpa.startswith('--') or limpa.startswith('#')):
+            continue
+        atual.append(linha)
+        if limpa.endswith(delimitador):
+            comando = "\n".join(atual).rstrip()[:-len(delimitador)].strip()
+            if comando:
+                yield comando
+            atual = []
+    if "".join(atual).strip():
+        yield "\n".join(atual).strip()
+
+
+class Migracao:
+    def __init__(self, versao, nome, caminho):
+        self.versao = versao
+        self.nome = nome
+        self.caminho = caminho
+
+    @property
+    def checksum(self):
+        with open(self.caminho, 'rb') as arquivo:
+            return hashlib.sha256(arquivo.read()).hexdigest()
+
+    def aplicar(self, conn):
+        if self.caminho.endswith('.py'):
+            spec = importlib.util.spec_from_file_location(f"migracao_{self.versao:04d}", self.caminho)
+            modulo = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(modulo)
+            modulo.aplicar(conn)
+        else:
+            with open(self.caminho, encoding='utf-8') as arquivo:
+                comandos = list(comandos_sql(arquivo.read()))
+            cursor = conn.cursor()
+            for numero, comando in enumerate(comandos, start=1):
+                try:
+                    cursor.execute(comando)
+                except Exception as err:
+                    raise ErroMigracao(f"{os.path.basename(self.caminho)}, comando {numero}: {err}") from err
+            cursor.close()
+        conn.commit()
+
+
+def listar_migracoes(pasta=PASTA_MIGRACOES):
+    """ Migrações disponíveis em ordem de versão. """
+    migracoes = []
+    for arquivo in sorted(os.listdir(pasta)):
+        encontrado = _ARQUIVO.match(arquivo)
+        if encontrado:
+            migracoes.append(Migracao(int(encontrado.group(1)), encontrado.group(2), os.path.join(pasta, arquivo)))
+    versoes = [m.versao for m in migracoes]
+    if len(versoes) != len(set(versoes)):
+        raise ErroMigracao("Há duas migrações com o mesmo número de versão.")
+    return migracoes
+
+
+def _garantir_tabela(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migracao (
+            versao INT PRIMARY KEY,
+            nome VARCHAR(200) NOT NULL,
+            checksum CHAR(64) NOT NULL,
+            segundos DECIMAL(10,3) NOT NULL,
+            aplicada_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def versoes_aplicadas(conn):
+    """ {versão: checksum} das migrações já registradas. """
+    cursor = conn.cursor()
+    _garantir_tabela(cursor)
+    cursor.execute("SELECT versao, checksum FROM schema_migracao")
+    aplicadas = dict(cursor.fetchall())
+    cursor.close()
+    return aplicadas
+
+
+def situacao(conn, pasta=PASTA_MIGRACOES):
+    """ Lista de (migração, estado), com estado 'aplicada', 'pendente' ou 'alterada' (arquivo mudou depois de aplicado). """
+    aplicadas = versoes_aplicadas(conn)
+    estados = []
+    for migracao in listar_migracoes(pasta):
+        if migracao.versao not in aplicadas:
+            estados.append((migracao, 'pendente'))
+        elif aplicadas[migracao.versao] != migracao.checksum:
+            estados.append((migracao, 'alterada'))
+        else:
+            estados.append((migracao, 'aplicada'))
+    return estados
+
+
+def migrar(conn, ate=None, pasta=PASTA_MIGRACOES, ao_aplicar=None):
+    """
+    Aplica em ordem as migrações pendentes (até a versão `ate`, inclusive).
+    `ao_aplicar(migracao, segundos)` é chamada após cada uma. Retorna a lista
+    das migrações aplicadas.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT GET_LOCK(%s, 0)", (_LOCK,))
+    if not cursor.fetchone()[0]:
+        cursor.close()
+        raise ErroMigracao("Outra execução de migrações está em andamento.")
+    try:
+        aplicadas = versoes_aplicadas(conn)
+        feitas = []
+        for migracao in listar_migracoes(pasta):
+            if migracao.versao in aplicadas or (ate is not None and migracao.versao > ate):
+                continue
+            inicio = time.perf_counter()
+            migracao.aplicar(conn)
+            segundos = time.perf_counter() - inicio
+            cursor.execute("""
+                INSERT INTO schema_migracao (versao, nome, checksum, segundos) VALUES (%s, %s, %s, %s)
+            """, (migracao.versao, migracao.nome, migracao.checksum, round(segundos, 3)))
+            conn.commit()
+            feitas.append(migracao)
+            if ao_aplicar:
+                ao_aplicar(migracao, segundos)
+        return feitas
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (_LOCK,))
+        cursor.fetchone()
+        cursor.close()
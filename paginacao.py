@@ -0,0 +1,138 @@
+# =====================================================================
+# PAGINAÇÃO POR CHAVE (KEYSET / SEEK)
+# Em vez de OFFSET (que lê e descarta todas as linhas anteriores), cada página
+# continua a partir da última linha exibida: `WHERE (nome, id) > (último)`,
+# usando o índice da coluna de ordenação. O custo de qualquer página é o
+# mesmo, seja a primeira ou a milésima.
+# =====================================================================
+import base64
+import json
+import math
+
+POR_PAGINA = 50
+
+# Tipos que um token pode trazer: viram parâmetros da consulta.
+_ESCALARES = (str, int, float, bool, type(None))
+
+
+class PosicaoInvalida(ValueError):
+    """ Token de paginação mal formado ou adulterado (resposta 400). """
+
+
+def codificar_posicao(valor, chave):
+    """ Transforma (valor da coluna de ordenação, chave primária) em um token de URL. """
+    return base64.urlsafe_b64encode(json.dumps([valor, chave]).encode()).decode().rstrip('=')
+
+
+def decodificar_posicao(token):
+    """ Inverso de `codificar_posicao`; None sem token e PosicaoInvalida para tokens mal formados. """
+    if not token:
+        return None
+    try:
+        posicao = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        valor, chave = posicao
+        # Listas e objetos chegariam até a ligação dos parâmetros do MySQL.
+        if not isinstance(valor, _ESCALARES) or isinstance(chave, bool) or not isinstance(chave, (int, str)):
+            raise TypeError
+        if isinstance(valor, float) and not math.isfinite(valor):
+            raise ValueError
+        return valor, int(chave)
+    except (ValueError, TypeError):
+        raise PosicaoInvalida("Posição de paginação inválida.") from None
+
+
+class Pagina:
+    def __init__(self, itens, proxima=None, anterior=None):
+        self.itens = itens
+        self.proxima = proxima    # Token para o parâmetro `apos` (ou None).
+        self.anterior = anterior  # Token para o parâmetro `antes` (ou None).
+
+
+def paginar(cursor, select, coluna_ordem, coluna_chave, condicoes=(), params=(),
+            apos=None, antes=None, por_pagina=POR_PAGINA):
+    """
+    Executa `select` (sem WHERE/ORDER BY) paginado por (`coluna_ordem`, `coluna_chave`).
+
+    - `condicoes`/`params`: filtros extras (ligados com AND).
+    - `apos`: token da última linha da página anterior (avançar).
+    - `antes`: token da primeira linha da página seguinte (voltar).
+    O cursor deve ser `dictionary=True`; os nomes das colunas no resultado
+    devem ser o nome da coluna sem o alias da tabela.
+    """
+    condicoes, params = list(condicoes), list(params)
+    campo_ordem = coluna_ordem.split('.')[-1]
+    campo_chave = coluna_chave.split('.')[-1]
+
+    posicao_apos = decodificar_posicao(apos)
+    posicao_antes = None if posicao_apos else decodificar_posicao(antes)
+    voltando = posicao_antes is not None
+    posicao = posicao_apos or posicao_antes
+    if posicao:
+        operador = '<' if voltando else '>'
+        condicoes.append(f"({coluna_ordem} {operador} %s OR ({coluna_ordem} = %s AND {coluna_chave} {operador} %s))")
+        params += [posicao[0], posicao[0], posicao[1]]
+
+    direcao = 'DESC' if voltando else 'ASC'
+    where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+    # Busca uma linha a mais só para saber se existe outra página nessa direção.
+    cursor.execute(f"{select} {where} ORDER BY {coluna_ordem} {direcao}, {coluna_chave} {direcao} LIMIT %s",
+                   params + [por_pagina + 1])
+    linhas = cursor.fetchall()
+    tem_mais = len(linhas) > por_pagina
+    linhas = linhas[:por_pagina]
+    if voltando:
+        linhas.reverse()
+
+    def token(linha):
+        return codificar_posicao(linha[campo_ordem], linha[campo_chave])
+
+    if voltando:
+        # Voltando, a página de onde viemos sempre existe à frente.
+        tem_proxima, tem_anterior = True, tem_mais
+    else:
+        tem_proxima, tem_anterior = tem_mais, posicao is not None
+
+    proxima = token(linhas[-1]) if linhas and tem_proxima else None
+    anterior = token(linhas[0]) if linhas and tem_anterior else None
+    return Pagina(linhas, proxima, anterior)
+
+
+def paginar_lista(itens, campo_ordem, campo_chave, apos=None, antes=None, por_pagina=POR_PAGINA):
+    """
+    A mesma paginação de `paginar` sobre uma lista já em memória (tabelas
+    pequenas servidas do cache), com tokens no mesmo formato. A ordem ignora
+    maiúsculas/minúsculas, como a collation do MySQL.
+    """
+    def ordem(valor, chave):
+        return str(valor).casefold(), chave
+
+    ordenados = sorted(itens, key=lambda item: ordem(item[campo_ordem], item[campo_chave]))
+    posicao_apos = decodificar_posicao(apos)
+    posicao_antes = None if posicao_apos else decodificar_posicao(antes)
+    if posicao_apos:
+        limite = ordem(*posicao_apos)
+        seguintes = [i for i in ordenados if ordem(i[campo_ordem], i[campo_chave]) > limite]
+        linhas, tem_proxima, tem_anterior = seguintes[:por_pagina], len(seguintes) > por_pagina, True
+    elif posicao_antes:
+        limite = ordem(*posicao_antes)
+        anteriores = [i for i in ordenados if ordem(i[campo_ordem], i[campo_chave]) < limite]
+        linhas, tem_proxima, tem_anterior = anteriores[-por_pagina:], True, len(anteriores) > por_pagina
+    else:
+        linhas, tem_proxima, tem_anterior = ordenados[:por_pagina], len(ordenados) > por_pagina, False
+
+    def token(linha):
+        return codificar_posicao(linha[campo_ordem], linha[campo_chave])
+
+    proxima = token(linhas[-1]) if linhas and tem_proxima else None
+    anterior = token(linhas[0]) if linhas and tem_anterior else None
+    return Pagina(linhas, proxima, anterior)
+
+
+def prefixo_like(texto):
+    """ Padrão LIKE de "começa com" (usa índice), escapando os curingas do usuário. """
+    return texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def filtros_da_requisicao(args, nomes):
+    """ Lê os filtros da query string, descartando os vazios (para montar os links). """
+    return {nome: args.get(nome).strip() for nome in nomes if args.get(nome, '').strip()}
@@ -0,0 +1,122 @@
+# =====================================================================
+# REPRECIFICAÇÃO EM MASSA (PVP)
+# Recalcula `produto.preco_venda = preco_compra * percentual` para todos os
+# produtos afetados por um PVP, em lotes por faixa de `cod_produto`. Cada lote
+# é uma transação curta, então o `produto` nunca fica bloqueado durante toda a
+# operação e as vendas continuam sendo registradas.
+#
+# Prioridade do PVP de um produto: o PVP da categoria (`pvp_categoria`), depois
+# o PVP global ativo e, só se nenhum dos dois vale, o PVP gravado no próprio
+# produto (`cod_pvp`). Só valem PVPs ativos e dentro da janela
+# `data_inicio`/`data_fim`.
+#
+# `produto.cod_pvp` é obrigatório e, na importação, recebe por padrão o PVP
+# da categoria: se ele viesse primeiro, o PVP da categoria e o global nunca
+# seriam aplicados, e trocar o PVP de uma categoria não mudaria preço nenhum.
+# Os PVPs só existem dos tipos 'categoria' e 'global'; o do produto fica como
+# último recurso (categoria sem PVP vigente e nenhum global).
+# =====================================================================
+import time
+
+# Produtos (faixa de cod_produto) atualizados por transação.
+TAMANHO_LOTE = 5_000
+
+_VIGENTE = "{a}.ativo = TRUE AND ({a}.data_inicio IS NULL OR {a}.data_inicio <= NOW()) " \
+           "AND ({a}.data_fim IS NULL OR {a}.data_fim > NOW())"
+
+# Junções que resolvem o percentual efetivo de cada produto.
+_JUNCOES = f"""
+    produto p
+    JOIN categoria_produto c ON c.cod_categoria = p.cod_categoria
+    LEFT JOIN pvp pp ON pp.cod_pvp = p.cod_pvp AND {_VIGENTE.format(a='pp')}
+    LEFT JOIN pvp pc ON pc.cod_pvp = c.pvp_categoria AND {_VIGENTE.format(a='pc')}
+    LEFT JOIN pvp pg ON pg.tipo_pvp = 'global' AND {_VIGENTE.format(a='pg')}
+"""
+
+_NOVO_PRECO = "ROUND(p.preco_compra * COALESCE(pc.percentual, pg.percentual, pp.percentual), 2)"
+
+
+def _filtro(cod_pvp=None, cod_categoria=None):
+    """ Condição SQL que limita a reprecificação aos produtos afetados. """
+    condicoes, params = [], []
+    if cod_pvp is not None:
+        # Produtos da categoria que usa o PVP, todos os que caem no global
+        # vigente (se for ele) e os que o têm como PVP próprio.
+        condicoes.append("""(pg.cod_pvp = %s OR p.cod_pvp = %s OR c.pvp_categoria = %s)""")
+        params += [cod_pvp, cod_pvp, cod_pvp]
+    if cod_categoria is not None:
+        condicoes.append("p.cod_categoria = %s")
+        params.append(cod_categoria)
+    return condicoes, params
+
+
+def _faixas(cursor, lote):
+    """ Divide o intervalo de cod_produto em faixas de `lote` códigos. """
+    cursor.execute("SELECT MIN(cod_produto), MAX(cod_produto) FROM produto")
+    minimo, maximo = cursor.fetchone()
+    if minimo is None:
+        return
+    inicio = minimo
+    while inicio <= maximo:
+        yield inicio, inicio + lote - 1
+        inicio += lote
+
+
+def reprecificar(conn, cod_pvp=None, cod_categoria=None, simular=False,
+                 lote=TAMANHO_LOTE, amostra=20, progresso=None):
+    """
+    Reprecifica os produtos afetados pelo PVP `cod_pvp` e/ou pela categoria
+    `cod_categoria` (sem nenhum dos dois, o catálogo inteiro), com o
+    percentual da categoria, senão o global, senão o do próprio produto.
+
+    Com `simular=True` nada é gravado: retorna quantos preços mudariam e uma
+    amostra com preço atual e novo. Retorna um dicionário com `alterados`,
+    `lotes`, `segundos` e, na simulação, `amostra`. `progresso(fracao)` é
+    chamada após cada lote (usada quando roda como tarefa em segundo plano).
+    """
+    inicio = time.perf_counter()
+    condicoes, params = _filtro(cod_pvp, cod_categoria)
+    # Só conta/atualiza linhas cujo preço realmente muda (um produto sem
+    # nenhum PVP vigente tem novo preço NULL e fica como está).
+    condicoes.append(f"p.preco_venda <> {_NOVO_PRECO}")
+    where = " AND ".join(["p.cod_produto BETWEEN %s AND %s"] + condicoes)
+
+    cursor = conn.cursor()
+    alterados, lotes, exemplos = 0, 0, []
+    faixas = list(_faixas(cursor, lote))
+    for de, ate in faixas:
+        lotes += 1
+        if progresso is not None:
+            progresso((lotes - 1) / len(faixas), f"Lote {lotes} de {len(faixas)}")
+        if simular:
+            cursor.execute(f"SELECT COUNT(*) FROM {_JUNCOES} WHERE {where}", [de, ate] + params)
+            alterados += cursor.fetchone()[0]
+            if len(exemplos) < amostra:
+                cursor.execute(f"""
+                    SELECT p.cod_produto, p.nome_produto, p.preco_venda, {_NOVO_PRECO}
+                    FROM {_JUNCOES} WHERE {where} LIMIT %s
+                """, [de, ate] + params + [amostra - len(exemplos)])
+                exemplos += [
+                    {'cod_produto': cod, 'nome_produto': nome,
+                     'preco_atual': str(atual), 'preco_novo': str(novo)}
+                    for cod, nome, atual, novo in cursor.fetchall()
+                ]
+            continue
+        cursor.execute(f"UPDATE {_JUNCOES} SET p.preco_venda = {_NOVO_PRECO} WHERE {where}",
+                       [de, ate] + params)
+        alterados += cursor.rowcount
+        # Commit por lote: os bloqueios de linha duram só o lote atual.
+        conn.commit()
+    if simular:
+        conn.rollback()
+    cursor.close()
+
+    resultado = {
+        'alterados': alterados,
+        'lotes': lotes,
+        'segundos': round(time.perf_counter() - inicio, 3),
+        'simulacao': simular,
+    }
+    if simular:
+        resultado['amostra'] = exemplos
+    return resultado
@@ -0,0 +1,138 @@
+# =====================================================================
+# RESOLUÇÃO DO PREÇO EFETIVO (HIERARQUIA DE PVP)
+# Mantém em memória todos os PVPs e o PVP de cada categoria, e responde
+# "qual markup e qual preço valem para o produto X no instante T" sem ir ao
+# MySQL. A prioridade é a mesma da reprecificação em massa (precificacao.py):
+# PVP da categoria, depois o PVP global vigente e, por último, o PVP gravado
+# no produto.
+#
+# A hierarquia em memória acompanha os contadores de versão de `pvp` e
+# `categoria_produto` (os mesmos de referencias.py): quando qualquer worker
+# grava um PVP ou uma categoria, os demais a remontam na próxima consulta.
+# =====================================================================
+import threading
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+
+from cache import versao
+
+CENTAVO = Decimal('0.01')
+
+
+class PVP:
+    __slots__ = ('cod_pvp', 'percentual', 'tipo', 'data_inicio', 'data_fim', 'ativo')
+
+    def __init__(self, cod_pvp, percentual, tipo, data_inicio, data_fim, ativo):
+        self.cod_pvp = cod_pvp
+        self.percentual = percentual
+        self.tipo = tipo
+        self.data_inicio = data_inicio
+        self.data_fim = data_fim
+        self.ativo = ativo
+
+    def vigente(self, instante):
+        """ Ativo e com `instante` dentro da janela [data_inicio, data_fim). """
+        return (self.ativo
+                and (self.data_inicio is None or self.data_inicio <= instante)
+                and (self.data_fim is None or instante < self.data_fim))
+
+
+class HierarquiaPVP:
+    """ Retrato imutável dos PVPs e das categorias, montado com duas consultas. """
+
+    def __init__(self, pvps, pvp_por_categoria):
+        self.pvps = pvps                            # cod_pvp -> PVP
+        self.pvp_por_categoria = pvp_por_categoria  # cod_categoria -> cod_pvp
+        # Globais do mais recente para o mais antigo: se houver mais de um
+        # vigente num instante, vale o que começou por último.
+        self.globais = sorted((p for p in pvps.values() if p.tipo == 'global'),
+                              key=lambda p: p.data_inicio or datetime.min, reverse=True)
+
+    @classmethod
+    def carregar(cls, conn):
+        cursor = conn.cursor()
+        cursor.execute("SELECT cod_pvp, percentual, tipo_pvp, data_inicio, data_fim, ativo FROM pvp")
+        pvps = {linha[0]: PVP(linha[0], linha[1], linha[2], linha[3], linha[4], bool(linha[5]))
+                for linha in cursor.fetchall()}
+        cursor.execute("SELECT cod_categoria, pvp_categoria FROM categoria_produto")
+        categorias = dict(cursor.fetchall())
+        cursor.close()
+        return cls(pvps, categorias)
+
+    def pvp_efetivo(self, cod_pvp, cod_categoria, instante):
+        """ Retorna (PVP, origem) aplicável, ou (None, None) se nenhum vale em `instante`. """
+        da_categoria = self.pvps.get(self.pvp_por_categoria.get(cod_categoria))
+        if da_categoria is not None and da_categoria.vigente(instante):
+            return da_categoria, 'categoria'
+        for global_ in self.globais:
+            if global_.vigente(instante):
+                return global_, 'global'
+        proprio = self.pvps.get(cod_pvp)
+        if proprio is not None and proprio.vigente(instante):
+            return proprio, 'produto'
+        return None, None
+
+
+_hierarquia = None  # (HierarquiaPVP, versões de pvp e categoria_produto)
+_lock = threading.Lock()
+
+
+def _versoes():
+    return versao('pvp'), versao('categoria_produto')
+
+
+def obter_hierarquia(conn_factory):
+    """
+    Retorna a hierarquia em memória, montando-a na primeira chamada (ou após
+    uma invalidação). `conn_factory` só é chamada quando é preciso ir ao banco
+    e devolve um gerenciador de contexto com uma conexão nova
+    (`banco.conexao_avulsa`): o snapshot começa depois da leitura das versões.
+    """
+    global _hierarquia
+    atuais = _versoes()
+    item = _hierarquia
+    if item is not None and item[1] == atuais:
+        return item[0]
+    with _lock:
+        if _hierarquia is None or _hierarquia[1] != atuais:
+            with conn_factory() as conn:
+                _hierarquia = (HierarquiaPVP.carregar(conn), atuais)
+        return _hierarquia[0]
+
+
+def invalidar_hierarquia():
+    """
+    Descarta a hierarquia deste processo. As rotas usam
+    `referencias.invalidar_referencias`, que alcança todos os workers.
+    """
+    global _hierarquia
+    with _lock:
+        _hierarquia = None
+
+
+def resolver(hierarquia, produto, instante=None):
+    """
+    Preço efetivo de um produto do índice do PDV (`catalogo.ProdutoPDV`) em
+    `instante` (padrão: agora). Sem PVP vigente, vale o preço de venda gravado.
+    """
+    instante = instante or datetime.now()
+    pvp, origem = hierarquia.pvp_efetivo(produto.cod_pvp, produto.cod_categoria, instante)
+    if pvp is None:
+        preco = Decimal(produto.preco_centavos) / 100
+        percentual = None
+    else:
+        preco = (Decimal(produto.preco_compra_centavos) / 100 * pvp.percentual).quantize(CENTAVO, ROUND_HALF_UP)
+        percentual = pvp.percentual
+    return {
+        'cod_produto': produto.cod_produto,
+        'cod_pvp': pvp.cod_pvp if pvp else None,
+        'origem': origem,
+        'percentual': str(percentual) if percentual is not None else None,
+        'preco_venda': str(preco),
+    }
+
+
+def resolver_lote(hierarquia, produtos, instante=None):
+    """ Resolve de uma vez uma lista de produtos (carrinho ou página do catálogo). """
+    instante = instante or datetime.now()
+    return [resolver(hierarquia, produto, instante) for produto in produtos]
@@ -0,0 +1,69 @@
+# =====================================================================
+# DADOS DE REFERÊNCIA (UNIDADES DE MEDIDA, CATEGORIAS E PVPs)
+# Tabelas pequenas e quase estáticas, lidas por quase todo formulário do
+# painel. Cada processo carrega cada tabela uma vez e a serve da memória,
+# sem expiração. As rotas que gravam nelas chamam `invalidar_referencias`,
+# que incrementa o contador de versão compartilhado da tabela (cache.py):
+# todos os workers percebem a mudança na próxima leitura e recarregam só
+# aquela tabela, sem consultar o banco para saber se algo mudou.
+#
+# `conn_factory` devolve um gerenciador de contexto com uma conexão nova
+# (`banco.conexao_avulsa`), e não a da requisição: a carga precisa enxergar
+# tudo o que foi gravado antes da versão lida pelo cache.
+# =====================================================================
+from cache import CacheTTL, versao, nova_versao
+
+_CONSULTAS = {
+    'unidade_medida': ("SELECT cod_unidade, nome_unidade, sigla_unidade FROM unidade_medida "
+                       "ORDER BY nome_unidade, cod_unidade", 'cod_unidade'),
+    'categoria_produto': ("SELECT cod_categoria, nome_categoria, descricao_categoria, pvp_categoria "
+                          "FROM categoria_produto ORDER BY nome_categoria, cod_categoria", 'cod_categoria'),
+    'pvp': ("SELECT * FROM pvp ORDER BY nome_pvp, cod_pvp", 'cod_pvp'),
+}
+
+# Chave do cache = nome da tabela = nome do contador de versão.
+_cache = CacheTTL(ttl=None, versao=versao)
+
+
+def _tabela(conn_factory, tabela):
+    """ (linhas em ordem de nome, {código: linha}). As linhas são compartilhadas: não as altere. """
+    def carregar():
+        sql, chave = _CONSULTAS[tabela]
+        with conn_factory() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(sql)
+            linhas = cursor.fetchall()
+            cursor.close()
+        return linhas, {linha[chave]: linha for linha in linhas}
+    return _cache.obter(tabela, carregar)
+
+
+def unidades(conn_factory):
+    return _tabela(conn_factory, 'unidade_medida')[0]
+
+
+def unidade(conn_factory, cod):
+    return _tabela(conn_factory, 'unidade_medida')[1].get(cod)
+
+
+def categorias(conn_factory):
+    return _tabela(conn_factory, 'categoria_produto')[0]
+
+
+def categoria(conn_factory, cod):
+    return _tabela(conn_factory, 'categoria_produto')[1].get(cod)
+
+
+def pvps(conn_factory, somente_ativos=False):
+    linhas = _tabela(conn_factory, 'pvp')[0]
+    return [p for p in linhas if p['ativo']] if somente_ativos else linhas
+
+
+def pvp(conn_factory, cod):
+    return _tabela(conn_factory, 'pvp')[1].get(cod)
+
+
+def invalidar_referencias(*tabelas):
+    """ Marca as tabelas como alteradas em todos os workers; chamada após o commit da rota que as grava. """
+    for tabela in tabelas:
+        nova_versao(tabela)
@@ -0,0 +1,224 @@
+# =====================================================================
+# RELATÓRIOS DE VENDAS (ROLLUPS INCREMENTAIS)
+# As vendas novas são somadas às tabelas rollup_* em lotes, sem reler o
+# histórico. Os relatórios consultam só os rollups, então "últimos 90 dias
+# por categoria" lê no máximo 90 x (nº de categorias) linhas,
+# independentemente de quantos anos de vendas existam.
+#
+# As vendas a agregar vêm da fila `rollup_pendente` (migração 0008), gravada
+# por trigger na mesma transação da venda: uma venda só aparece na fila
+# quando confirma, qualquer que seja o seu cod_venda ou a sua data (vendas
+# offline chegam com datas passadas). A agregação de um lote e a remoção dele
+# da fila são confirmadas juntas, então nenhuma venda é somada duas vezes nem
+# fica para trás. A atualização roda em uma thread do servidor
+# (`iniciar_atualizacao_periodica`) e pela tarefa/comando de relatórios;
+# as rotas só leem.
+# =====================================================================
+import logging
+import threading
+from datetime import date, timedelta
+
+log = logging.getLogger(__name__)
+
+# Vendas agregadas por transação.
+TAMANHO_LOTE = 5_000
+
+# Intervalo (segundos) da atualização periódica feita pelo servidor.
+INTERVALO_ATUALIZACAO = 30.0
+
+# Lock do MySQL que deixa um único processo agregando por vez.
+_LOCK = 'caixa_prog_rollups'
+
+
+def _agregar(cursor, codigos):
+    """ Soma nos rollups as vendas `codigos` (já confirmadas). """
+    marcadores = ", ".join(["%s"] * len(codigos))
+    cursor.execute(f"""
+        INSERT INTO rollup_venda_hora (hora, cod_usuario, vendas, receita)
+        SELECT TIMESTAMP(DATE(data_venda), MAKETIME(HOUR(data_venda), 0, 0)) AS hora,
+               cod_usuario, COUNT(*), SUM(total)
+        FROM venda WHERE cod_venda IN ({marcadores})
+        GROUP BY hora, cod_usuario
+        ON DUPLICATE KEY UPDATE vendas = vendas + VALUES(vendas), receita = receita + VALUES(receita)
+    """, codigos)
+    cursor.execute(f"""
+        INSERT INTO rollup_produto_dia (dia, cod_produto, cod_categoria, quantidade, receita, custo)
+        SELECT DATE(v.data_venda) AS dia, i.cod_produto, p.cod_categoria, SUM(i.quantidade),
+               SUM(i.quantidade * i.preco_unitario), SUM(i.quantidade * p.preco_compra)
+        FROM venda v
+        JOIN item_venda i ON i.cod_venda = v.cod_venda
+        JOIN produto p ON p.cod_produto = i.cod_produto
+        WHERE v.cod_venda IN ({marcadores})
+        GROUP BY dia, i.cod_produto, p.cod_categoria
+        ON DUPLICATE KEY UPDATE quantidade = quantidade + VALUES(quantidade),
+                                receita = receita + VALUES(receita),
+                                custo = custo + VALUES(custo)
+    """, codigos)
+    cursor.execute(f"""
+        INSERT INTO rollup_categoria_dia (dia, cod_categoria, quantidade, receita, custo)
+        SELECT DATE(v.data_venda) AS dia, p.cod_categoria, SUM(i.quantidade),
+               SUM(i.quantidade * i.preco_unitario), SUM(i.quantidade * p.preco_compra)
+        FROM venda v
+        JOIN item_venda i ON i.cod_venda = v.cod_venda
+        JOIN produto p ON p.cod_produto = i.cod_produto
+        WHERE v.cod_venda IN ({marcadores})
+        GROUP BY dia, p.cod_categoria
+        ON DUPLICATE KEY UPDATE quantidade = quantidade + VALUES(quantidade),
+                                receita = receita + VALUES(receita),
+                                custo = custo + VALUES(custo)
+    """, codigos)
+
+
+def atualizar_rollups(conn, lote=TAMANHO_LOTE):
+    """
+    Agrega nos rollups todas as vendas da fila. Retorna quantas vendas foram
+    processadas (0 também quando outro processo já está agregando).
+    `conn` não deve ter alterações pendentes: cada lote começa com um commit.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT GET_LOCK(%s, 0)", (_LOCK,))
+    if cursor.fetchone()[0] != 1:
+        cursor.close()
+        return 0
+    processadas = 0
+    try:
+        while True:
+            conn.commit()  # Snapshot novo: enxerga as vendas confirmadas até agora.
+            cursor.execute("SELECT cod_venda FROM rollup_pendente ORDER BY cod_venda LIMIT %s", (lote,))
+            codigos = [linha[0] for linha in cursor.fetchall()]
+            if not codigos:
+                break
+            _agregar(cursor, codigos)
+            cursor.execute(f"DELETE FROM rollup_pendente WHERE cod_venda IN ({', '.join(['%s'] * len(codigos))})",
+                           codigos)
+            conn.commit()
+            processadas += len(codigos)
+            if len(codigos) < lote:
+                break
+    finally:
+        conn.rollback()
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (_LOCK,))
+        cursor.fetchone()
+        cursor.close()
+    return processadas
+
+
+def iniciar_atualizacao_periodica(obter_conexao, devolver_conexao, intervalo=INTERVALO_ATUALIZACAO):
+    """ Inicia uma thread daemon que agrega as vendas novas a cada `intervalo` segundos. """
+    parar = threading.Event()
+
+    def executar():
+        while not parar.wait(intervalo):
+            conn = None
+            try:
+                conn = obter_conexao()
+                atualizar_rollups(conn)
+            except Exception:
+                log.exception("Falha na atualização periódica dos relatórios.")
+            finally:
+                if conn is not None:
+                    devolver_conexao(conn)
+
+    threading.Thread(target=executar, name='rollups', daemon=True).start()
+    return parar
+
+
+def _periodo(dias):
+    fim = date.today()
+    return fim - timedelta(days=dias - 1), fim
+
+
+def vendas_por_dia(conn, dias=7):
+    """ Série diária (todos os dias do período, inclusive os sem venda) para o gráfico. """
+    inicio, fim = _periodo(dias)
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT DATE(hora) AS dia, SUM(vendas), SUM(receita)
+        FROM rollup_venda_hora
+        WHERE hora >= %s AND hora < %s
+        GROUP BY dia
+    """, (inicio, fim + timedelta(days=1)))
+    por_dia = {dia: (int(qtd), receita) for dia, qtd, receita in cursor.fetchall()}
+    cursor.close()
+    serie = []
+    for n in range(dias):
+        dia = inicio + timedelta(days=n)
+        qtd, receita = por_dia.get(dia, (0, 0))
+        serie.append({'dia': dia.isoformat(), 'vendas': qtd, 'receita': str(receita)})
+    return serie
+
+
+def vendas_por_hora(conn, dia):
+    """ Vendas e receita de cada hora de um dia. """
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT HOUR(hora), SUM(vendas), SUM(receita)
+        FROM rollup_venda_hora
+        WHERE hora >= %s AND hora < %s
+        GROUP BY HOUR(hora)
+    """, (dia, dia + timedelta(days=1)))
+    por_hora = {h: (int(qtd), receita) for h, qtd, receita in cursor.fetchall()}
+    cursor.close()
+    return [{'hora': h, 'vendas': por_hora.get(h, (0, 0))[0], 'receita': str(por_hora.get(h, (0, 0))[1])}
+            for h in range(24)]
+
+
+def _com_margem(linhas, chaves):
+    resultado = []
+    for linha in linhas:
+        item = dict(zip(chaves, linha[:len(chaves)]))
+        quantidade, receita, custo = linha[len(chaves):]
+        item.update({'quantidade': int(quantidade), 'receita': str(receita),
+                     'custo': str(custo), 'margem': str(receita - custo)})
+        resultado.append(item)
+    return resultado
+
+
+def vendas_por_categoria(conn, dias=90):
+    inicio, fim = _periodo(dias)
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT r.cod_categoria, c.nome_categoria, SUM(r.quantidade), SUM(r.receita), SUM(r.custo)
+        FROM rollup_categoria_dia r
+        LEFT JOIN categoria_produto c ON c.cod_categoria = r.cod_categoria
+        WHERE r.dia BETWEEN %s AND %s
+        GROUP BY r.cod_categoria, c.nome_categoria
+        ORDER BY SUM(r.receita) DESC
+    """, (inicio, fim))
+    linhas = cursor.fetchall()
+    cursor.close()
+    return _com_margem(linhas, ('cod_categoria', 'nome_categoria'))
+
+
+def vendas_por_produto(conn, dias=30, limite=20):
+    inicio, fim = _periodo(dias)
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT r.cod_produto, p.nome_produto, SUM(r.quantidade), SUM(r.receita), SUM(r.custo)
+        FROM rollup_produto_dia r
+        JOIN produto p ON p.cod_produto = r.cod_produto
+        WHERE r.dia BETWEEN %s AND %s
+        GROUP BY r.cod_produto, p.nome_produto
+        ORDER BY SUM(r.receita) DESC
+        LIMIT %s
+    """, (inicio, fim, limite))
+    linhas = cursor.fetchall()
+    cursor.close()
+    return _com_margem(linhas, ('cod_produto', 'nome_produto'))
+
+
+def vendas_por_operador(conn, dias=30):
+    inicio, fim = _periodo(dias)
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT r.cod_usuario, u.nome_usuario, SUM(r.vendas), SUM(r.receita)
+        FROM rollup_venda_hora r
+        JOIN usuario u ON u.cod_usuario = r.cod_usuario
+        WHERE r.hora >= %s AND r.hora < %s
+        GROUP BY r.cod_usuario, u.nome_usuario
+        ORDER BY SUM(r.receita) DESC
+    """, (inicio, fim + timedelta(days=1)))
+    linhas = cursor.fetchall()
+    cursor.close()
+    return [{'cod_usuario': cod, 'nome_usuario': nome, 'vendas': int(qtd), 'receita': str(receita)}
+            for cod, nome, qtd, receita in linhas]
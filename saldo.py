@@ -0,0 +1,176 @@
+# =====================================================================
+# SALDO DO CAIXA E FECHAMENTOS DIÁRIOS
+# O saldo atual vem do contador `saldo_caixa` em `resumo_sistema` (soma das fatias). O saldo em
+# um instante passado usa o último fechamento diário anterior a ele mais a
+# soma das movimentações entre o fechamento e o instante pedido.
+# =====================================================================
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+# Lock do MySQL que serializa os fechamentos (cron e rota podem rodar juntos).
+_LOCK_FECHAMENTO = 'caixa_prog_fechamento'
+
+# Segundos que um fechamento espera o outro terminar.
+ESPERA_FECHAMENTO = 30
+
+
+class FechamentoEmAndamento(Exception):
+    """ Outro fechamento segurou o lock por mais que ESPERA_FECHAMENTO segundos. """
+
+
+def saldo_atual(conn):
+    """ Saldo corrente do caixa, lido do contador mantido por trigger. """
+    cursor = conn.cursor()
+    cursor.execute("SELECT SUM(valor) FROM resumo_sistema WHERE chave = 'saldo_caixa'")
+    linha = cursor.fetchone()
+    cursor.close()
+    return linha[0] if linha and linha[0] is not None else Decimal('0.00')
+
+
+def saldo_em(conn, instante):
+    """ Saldo do caixa no instante informado (inclusive). """
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT data_fechamento, saldo_final FROM fechamento_caixa
+        WHERE data_fechamento < %s
+        ORDER BY data_fechamento DESC LIMIT 1
+    """, (instante.date(),))
+    fechamento = cursor.fetchone()
+
+    if fechamento:
+        saldo_base = fechamento[1]
+        inicio = datetime.combine(fechamento[0] + timedelta(days=1), time.min)
+    else:
+        saldo_base = Decimal('0.00')
+        inicio = datetime.min
+
+    # Só as movimentações posteriores ao fechamento (no máximo poucos dias,
+    # se os fechamentos estiverem em dia), lidas do índice de data. Instantes
+    # de meses já arquivados caem na tabela fria; para os recentes, a consulta
+    # nela é uma única sondagem vazia no índice.
+    cursor.execute("""
+        SELECT COALESCE(SUM(IF(tipo = 'entrada', valor, -valor)), 0) FROM (
+            SELECT tipo, valor FROM caixa WHERE data_movimentacao >= %s AND data_movimentacao <= %s
+            UNION ALL
+            SELECT tipo, valor FROM caixa_arquivo WHERE data_movimentacao >= %s AND data_movimentacao <= %s
+        ) movimentacoes
+    """, (inicio, instante, inicio, instante))
+    delta = cursor.fetchone()[0]
+    cursor.close()
+    return saldo_base + delta
+
+
+def _totais_por_dia(cursor, desde=None, ate=None):
+    """ Entradas e saídas agrupadas por dia, em ordem cronológica. """
+    condicoes, params = [], []
+    if desde is not None:
+        condicoes.append("data_movimentacao >= %s")
+        params.append(datetime.combine(desde, time.min))
+    if ate is not None:
+        condicoes.append("data_movimentacao < %s")
+        params.append(datetime.combine(ate, time.min))
+    where = ("WHERE " + " AND ".join(condicoes)) if condicoes else ""
+    # Livro-caixa completo: movimentações recentes e as já arquivadas.
+    cursor.execute(f"""
+        SELECT DATE(data_movimentacao) AS dia,
+               COALESCE(SUM(IF(tipo = 'entrada', valor, 0)), 0),
+               COALESCE(SUM(IF(tipo = 'saida', valor, 0)), 0)
+        FROM (
+            SELECT tipo, valor, data_movimentacao FROM caixa {where}
+            UNION ALL
+            SELECT tipo, valor, data_movimentacao FROM caixa_arquivo {where}
+        ) movimentacoes
+        GROUP BY dia ORDER BY dia
+    """, params + params)
+    return cursor.fetchall()
+
+
+def _acumular(dias, saldo_inicial):
+    """ Converte totais diários em linhas de fechamento com saldo acumulado. """
+    saldo = saldo_inicial
+    linhas = []
+    for dia, entradas, saidas in dias:
+        saldo += entradas - saidas
+        linhas.append((dia, entradas, saidas, saldo))
+    return linhas
+
+
+def fechar_pendentes(conn, ate=None):
+    """
+    Gera os fechamentos de todos os dias ainda não fechados até `ate`
+    (exclusive; padrão: hoje, ou seja, fecha até ontem). Retorna quantos
+    dias foram gravados.
+
+    Execuções simultâneas (cron e `POST /caixa/fechamento`) esperam uma pela
+    outra no lock `_LOCK_FECHAMENTO`; a segunda encontra os dias já fechados e
+    não grava nada. Confirma a transação aberta da conexão antes de ler.
+    """
+    ate = ate or date.today()
+    cursor = conn.cursor()
+    cursor.execute("SELECT GET_LOCK(%s, %s)", (_LOCK_FECHAMENTO, ESPERA_FECHAMENTO))
+    if not cursor.fetchone()[0]:
+        cursor.close()
+        raise FechamentoEmAndamento("Outro fechamento do caixa está em andamento.")
+    try:
+        # Nova leitura consistente: enxerga o que o fechamento anterior gravou.
+        conn.commit()
+        cursor.execute("""
+            SELECT data_fechamento, saldo_final FROM fechamento_caixa
+            ORDER BY data_fechamento DESC LIMIT 1
+        """)
+        ultimo = cursor.fetchone()
+        desde = ultimo[0] + timedelta(days=1) if ultimo else None
+        saldo_inicial = ultimo[1] if ultimo else Decimal('0.00')
+
+        linhas = _acumular(_totais_por_dia(cursor, desde, ate), saldo_inicial)
+        if linhas:
+            cursor.executemany("""
+                INSERT INTO fechamento_caixa (data_fechamento, total_entradas, total_saidas, saldo_final)
+                VALUES (%s, %s, %s, %s)
+            """, linhas)
+        conn.commit()
+        return len(linhas)
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (_LOCK_FECHAMENTO,))
+        cursor.fetchone()
+        cursor.close()
+
+
+def verificar_fechamentos(conn, reconstruir=False):
+    """
+    Confere os fechamentos gravados contra o livro-caixa bruto.
+
+    Recalcula os totais de cada dia já fechado com uma única varredura agrupada
+    e retorna a lista de dias divergentes (inclusive movimentações lançadas com
+    data retroativa). Com `reconstruir=True`, regrava todos os fechamentos a
+    partir do livro-caixa.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT data_fechamento, total_entradas, total_saidas, saldo_final FROM fechamento_caixa ORDER BY data_fechamento")
+    gravados = {linha[0]: linha[1:] for linha in cursor.fetchall()}
+    if not gravados:
+        cursor.close()
+        return []
+
+    ultimo_dia = max(gravados)
+    esperados = _acumular(_totais_por_dia(cursor, ate=ultimo_dia + timedelta(days=1)), Decimal('0.00'))
+
+    divergencias = []
+    saldo_esperado = {}
+    for dia, entradas, saidas, saldo in esperados:
+        saldo_esperado[dia] = saldo
+        if gravados.get(dia) != (entradas, saidas, saldo):
+            divergencias.append({'dia': dia, 'gravado': gravados.get(dia), 'esperado': (entradas, saidas, saldo)})
+    # Fechamentos de dias que não têm mais nenhuma movimentação.
+    for dia in gravados.keys() - saldo_esperado.keys():
+        divergencias.append({'dia': dia, 'gravado': gravados[dia], 'esperado': None})
+
+    if reconstruir and divergencias:
+        cursor.execute("DELETE FROM fechamento_caixa")
+        cursor.executemany("""
+            INSERT INTO fechamento_caixa (data_fechamento, total_entradas, total_saidas, saldo_final)
+            VALUES (%s, %s, %s, %s)
+        """, esperados)
+        conn.commit()
+    cursor.close()
+    return sorted(divergencias, key=lambda d: d['dia'])
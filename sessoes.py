@@ -0,0 +1,188 @@
+# =====================================================================
+# SESSÕES NO SERVIDOR E CACHE DE AUTORIZAÇÃO
+# O cookie leva só um identificador aleatório; os dados da sessão ficam em um
+# armazém no servidor (em memória por padrão, trocável por um compartilhado
+# com a mesma interface `obter`/`salvar`/`remover`).
+#
+# A situação de cada usuário (conta ativa e tipo) fica em um cache em memória
+# por `cod_usuario`. As rotas protegidas consultam esse cache a cada
+# requisição, sem ida ao MySQL, e `invalidar_autorizacao` (chamada ao editar um
+# usuário) faz a mudança valer já na próxima requisição dele, em qualquer worker.
+#
+# Sessões sem usuário logado (só mensagens de `flash`, como a de login
+# recusado) ficam em um armazém à parte, com validade curta e número máximo
+# de sessões: um robô que tenta logins sem devolver o cookie cria uma sessão
+# por tentativa, e elas não podem crescer sem limite nem tirar do armazém as
+# sessões de quem está logado.
+# =====================================================================
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+from banco import conexao_avulsa
+from cache import CacheTTL, versao, nova_versao
+
+# Segundos que uma sessão fica guardada no servidor desde a última gravação.
+TTL_SESSAO = 12 * 3600
+
+# Sessões anônimas: validade e máximo guardado (acima dele saem as mais antigas).
+TTL_SESSAO_ANONIMA = 300
+MAX_SESSOES_ANONIMAS = 10_000
+
+# Máximo de sessões de usuários logados por processo.
+MAX_SESSOES = 100_000
+
+# Rede de segurança do cache de autorização: com vários processos, uma
+# alteração feita em outro worker vale aqui em no máximo este tempo.
+TTL_AUTORIZACAO = 60.0
+
+
+class ArmazemSessoesMemoria:
+    """
+    Sessões guardadas no próprio processo. Com vários workers ou servidores,
+    use um armazém compartilhado (ex.: Redis) com a mesma interface.
+    Acima de `max_sessoes`, a gravada há mais tempo é descartada (LRU).
+    """
+
+    def __init__(self, intervalo_limpeza=60.0, max_sessoes=MAX_SESSOES):
+        self._dados = OrderedDict()  # sid -> (expira_em, dados), da gravação mais antiga para a mais recente
+        self._lock = threading.Lock()
+        self.intervalo_limpeza = intervalo_limpeza
+        self.max_sessoes = max_sessoes
+        self._ultima_limpeza = time.monotonic()
+
+    def obter(self, sid):
+        item = self._dados.get(sid)
+        if item is None or item[0] < time.monotonic():
+            return None
+        return dict(item[1])
+
+    def salvar(self, sid, dados, ttl):
+        with self._lock:
+            self._dados[sid] = (time.monotonic() + ttl, dict(dados))
+            self._dados.move_to_end(sid)
+            while len(self._dados) > self.max_sessoes:
+                self._dados.popitem(last=False)
+            if time.monotonic() - self._ultima_limpeza >= self.intervalo_limpeza:
+                self._limpar()
+
+    def remover(self, sid):
+        with self._lock:
+            self._dados.pop(sid, None)
+
+    def _limpar(self):
+        """ Descarta as sessões expiradas. """
+        agora = time.monotonic()
+        for sid in [s for s, (expira_em, _) in self._dados.items() if expira_em < agora]:
+            del self._dados[sid]
+        self._ultima_limpeza = agora
+
+    def __len__(self):
+        return len(self._dados)
+
+
+class SessaoServidor(CallbackDict, SessionMixin):
+    def __init__(self, dados=None, sid=None):
+        def ao_alterar(sessao):
+            sessao.modified = True
+
+        super().__init__(dados, ao_alterar)
+        self.sid = sid
+        self.new = sid is None
+        self.modified = False
+        # Usuário dono da sessão quando ela foi aberta (para detectar login/logout).
+        self.usuario_inicial = self.get('usuario_id')
+
+
+class InterfaceSessaoServidor(SessionInterface):
+    """ Substitui a sessão em cookie assinado do Flask (`app.session_interface`). """
+
+    def __init__(self, armazem=None, ttl=TTL_SESSAO, armazem_anonimas=None, ttl_anonimas=TTL_SESSAO_ANONIMA):
+        self.armazem = armazem or ArmazemSessoesMemoria()
+        self.anonimas = armazem_anonimas or ArmazemSessoesMemoria(max_sessoes=MAX_SESSOES_ANONIMAS)
+        self.ttl = ttl
+        self.ttl_anonimas = ttl_anonimas
+
+    def _remover(self, sid):
+        self.armazem.remover(sid)
+        self.anonimas.remover(sid)
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            dados = self.armazem.obter(sid)
+            if dados is None:
+                dados = self.anonimas.obter(sid)
+            if dados is not None:
+                return SessaoServidor(dados, sid)
+        return SessaoServidor()
+
+    def save_session(self, app, session, response):
+        nome = self.get_cookie_name(app)
+        dominio = self.get_cookie_domain(app)
+        caminho = self.get_cookie_path(app)
+
+        if not session:
+            if session.sid is not None:
+                self._remover(session.sid)
+                response.delete_cookie(nome, domain=dominio, path=caminho)
+            return
+
+        # Novo identificador sempre que o usuário da sessão muda (login ou
+        # logout): um identificador conhecido antes do login não serve depois.
+        if session.sid is None or session.get('usuario_id') != session.usuario_inicial:
+            if session.sid is not None:
+                self._remover(session.sid)
+            session.sid = secrets.token_urlsafe(32)
+            session.modified = True
+
+        if not session.modified and not self.should_set_cookie(app, session):
+            return
+        if 'usuario_id' in session:
+            self.armazem.salvar(session.sid, session, self.ttl)
+        else:
+            self.anonimas.salvar(session.sid, session, self.ttl_anonimas)
+        response.set_cookie(
+            nome, session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=dominio, path=caminho,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+
+# --- Autorização ---
+# O contador de versão 'usuario' leva a invalidação a todos os workers; o TTL
+# continua como garantia caso o usuário seja alterado direto no banco.
+_autorizacoes = CacheTTL(ttl=TTL_AUTORIZACAO, versao=lambda cod_usuario: versao('usuario'))
+
+
+def _carregar_autorizacao(cod_usuario):
+    # Conexão nova: a da requisição pode ter um snapshot anterior à versão lida.
+    with conexao_avulsa() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT conta_ativa, tipo_usuario FROM usuario WHERE cod_usuario = %s", (cod_usuario,))
+        linha = cursor.fetchone()
+        cursor.close()
+    if linha is None:
+        return None
+    return bool(linha[0]), linha[1]
+
+
+def autorizacao_usuario(cod_usuario):
+    """ (conta_ativa, tipo_usuario) atuais do usuário, ou None se ele não existe mais. """
+    return _autorizacoes.obter(cod_usuario, lambda: _carregar_autorizacao(cod_usuario))
+
+
+def invalidar_autorizacao(cod_usuario=None):
+    """
+    Descarta a situação em cache de um usuário (ou de todos) neste processo e,
+    pelo contador de versão, em todos os outros workers.
+    """
+    _autorizacoes.invalidar(cod_usuario)
+    nova_versao('usuario')
@@ -0,0 +1,351 @@
+# =====================================================================
+# SINCRONIZAÇÃO DOS TERMINAIS OFFLINE (LADO DO SERVIDOR)
+# Os terminais de caixa mantêm uma réplica SQLite do catálogo e uma fila
+# local de vendas (terminal_pdv.py). Este módulo atende os dois lados da
+# sincronização:
+#   - `catalogo_desde`: produtos alterados e removidos desde o token, em
+#     páginas (paginação por chave sobre `atualizado_em`, em rodadas; ver
+#     abaixo);
+#   - `receber_lote`: grava um lote de vendas da fila em uma transação, com
+#     INSERTs de várias linhas, e é idempotente pelo UUID de cada venda.
+#
+# Conflitos de estoque: a venda offline já aconteceu (o produto saiu da
+# loja), então ela é sempre gravada. Se o estoque do servidor não cobria a
+# quantidade, ele fica negativo (aparece nos alertas de estoque) e as
+# unidades sem cobertura voltam na resposta e ficam em `venda_offline.conflitos`.
+# O preço é o que o terminal cobrou; quando difere do preço de venda do
+# cadastro, a diferença também fica registrada como conflito. Produtos
+# inexistentes e datas fora da janela offline rejeitam a venda.
+#
+# O operador de cada venda é o usuário logado no terminal; só um
+# administrador pode enviar vendas em nome de outro usuário.
+# =====================================================================
+import json
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+from mysql.connector import errors
+
+from catalogo import marca_segura
+from paginacao import PosicaoInvalida, codificar_posicao, decodificar_posicao
+from vendas import ER_LOCK_DEADLOCK, TENTATIVAS_DEADLOCK
+
+# Produtos por página do catálogo e vendas aceitas por lote.
+PAGINA_CATALOGO = 5_000
+MAX_LOTE = 500
+
+# Idade máxima de uma venda offline ao chegar, e quanto o relógio do
+# terminal pode estar adiantado em relação ao do servidor.
+JANELA_OFFLINE = timedelta(days=7)
+TOLERANCIA_RELOGIO = timedelta(minutes=5)
+
+_COLUNAS_CATALOGO = """cod_produto, codigo_barras, nome_produto, preco_venda, unidade_medida,
+                       ativo, quantidade, atualizado_em"""
+
+
+class LoteInvalido(ValueError):
+    """ Lote mal formado (erro do terminal, não da venda): nada é gravado. """
+
+
+# --- Catálogo ---
+# `atualizado_em` tem resolução de um segundo e é gravado no início da
+# transação, que pode confirmar bem depois: uma chave estrita sobre ele perde
+# alterações confirmadas atrasadas. Por isso o catálogo é lido em rodadas.
+# Cada rodada relê tudo com `atualizado_em` a partir da marca tomada no início
+# da rodada anterior (`catalogo.marca_segura`, antes da transação de escrita
+# aberta mais antiga). Dentro da rodada as páginas seguem por chave. O
+# terminal grava por código de produto, então reler um produto não tem efeito.
+# A última página da rodada traz também os produtos apagados desde a marca
+# (lápides de `produto_removido`).
+#
+# O token guarda "desde|marca da próxima rodada|atualizado_em da última
+# linha" e o cod_produto da última linha.
+def _instante(texto):
+    return datetime.fromisoformat(texto) if texto else None
+
+
+def _token(desde, proxima=None, ultimo=None, cod=0):
+    partes = (valor.isoformat(sep=' ') if valor else '' for valor in (desde, proxima, ultimo))
+    return codificar_posicao('|'.join(partes), cod)
+
+
+def _ler_token(token):
+    """ (desde, marca da próxima rodada, (atualizado_em, cod_produto) da última linha lida). """
+    posicao = decodificar_posicao(token)
+    if posicao is None:
+        return None, None, None
+    valor, cod = posicao
+    try:
+        partes = str(valor).split('|')
+        if len(partes) == 1:
+            # Token anterior às rodadas (só a última posição): nova rodada a partir dela.
+            return _instante(partes[0]), None, None
+        desde, proxima, ultimo = (_instante(parte) for parte in partes)
+    except ValueError:
+        raise PosicaoInvalida("Posição de sincronização inválida.") from None
+    return desde, proxima, (ultimo, cod) if ultimo else None
+
+
+def catalogo_desde(conn, token=None, limite=PAGINA_CATALOGO):
+    """
+    Produtos alterados desde o `token` (None = catálogo inteiro), em ordem de
+    (atualizado_em, cod_produto). Retorna (produtos, códigos removidos,
+    próximo token, completo); os removidos só vêm na última página da
+    rodada. O terminal guarda o token de cada página para continuar dela.
+    """
+    desde, proxima, posicao = _ler_token(token)
+    if proxima is None:
+        # Início de uma rodada: a marca da próxima é tomada antes da leitura,
+        # com um snapshot novo.
+        conn.commit()
+        proxima = marca_segura(conn)
+    condicoes, params = [], []
+    if desde is not None:
+        condicoes.append("atualizado_em >= %s")
+        params.append(desde)
+    if posicao:
+        condicoes.append("(atualizado_em > %s OR (atualizado_em = %s AND cod_produto > %s))")
+        params += [posicao[0], posicao[0], posicao[1]]
+    where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(f"""
+        SELECT {_COLUNAS_CATALOGO} FROM produto {where}
+        ORDER BY atualizado_em, cod_produto LIMIT %s
+    """, params + [limite + 1])
+    linhas = cursor.fetchall()
+    cursor.close()
+
+    completo = len(linhas) <= limite
+    linhas = linhas[:limite]
+    produtos = [{
+        'cod_produto': linha['cod_produto'],
+        'codigo_barras': linha['codigo_barras'],
+        'nome_produto': linha['nome_produto'],
+        'preco_venda': str(linha['preco_venda']),
+        'unidade_medida': linha['unidade_medida'],
+        'ativo': bool(linha['ativo']),
+        'quantidade': linha['quantidade'],
+    } for linha in linhas]
+    removidos = []
+    if completo:
+        if desde is not None:
+            cursor = conn.cursor()
+            cursor.execute("SELECT cod_produto FROM produto_removido WHERE removido_em >= %s", (desde,))
+            removidos = [cod for (cod,) in cursor.fetchall()]
+            cursor.close()
+        proximo = _token(proxima)
+    else:
+        ultima = linhas[-1]
+        proximo = _token(desde, proxima, ultima['atualizado_em'], ultima['cod_produto'])
+    return produtos, removidos, proximo, completo
+
+
+# --- Vendas ---
+def _validar_venda(venda, cod_usuario_sessao, admin=False):
+    """
+    Normaliza uma venda do lote: (id, cod_usuario, data, {cod_produto: [quantidade, preço]}).
+    O `cod_usuario` da venda só é aceito de um administrador; para os demais
+    vale o usuário da sessão.
+    """
+    try:
+        identificador = str(venda['id'])
+        data = datetime.fromisoformat(venda['data'])
+        if data.tzinfo is not None:
+            raise ValueError
+        cod_usuario = int(venda.get('cod_usuario') or cod_usuario_sessao) if admin else cod_usuario_sessao
+        itens = {}
+        for item in venda['itens']:
+            cod, qtd = int(item['cod_produto']), int(item['quantidade'])
+            preco = Decimal(str(item['preco_unitario']))
+            if qtd <= 0 or preco < 0:
+                raise ValueError
+            # Produtos repetidos no carrinho viram uma linha (o preço é o mesmo na venda).
+            itens.setdefault(cod, [0, preco])[0] += qtd
+    except (KeyError, TypeError, ValueError, InvalidOperation):
+        raise LoteInvalido(f"Venda mal formada no lote: {venda.get('id') if isinstance(venda, dict) else venda!r}.")
+    if not itens or not 0 < len(identificador) <= 36:
+        raise LoteInvalido(f"Venda sem itens ou com identificador inválido: {identificador!r}.")
+    return identificador, cod_usuario, data, dict(sorted(itens.items()))
+
+
+def _gravar_lote(conn, terminal, vendas):
+    cursor = conn.cursor()
+    agora = datetime.now()
+    ids = [v[0] for v in vendas]
+    marcadores = ", ".join(["%s"] * len(ids))
+
+    # Reserva os UUIDs: um reenvio simultâneo do mesmo lote espera aqui até
+    # este commit e depois encontra as vendas já gravadas.
+    cursor.executemany("""
+        INSERT IGNORE INTO venda_offline (id_offline, terminal, cod_usuario, data_venda) VALUES (%s, %s, %s, %s)
+    """, [(identificador, terminal, cod_usuario, data) for identificador, cod_usuario, data, _ in vendas])
+    cursor.execute(f"""
+        SELECT id_offline, status, cod_venda, motivo, conflitos FROM venda_offline
+        WHERE id_offline IN ({marcadores}) FOR UPDATE
+    """, ids)
+    anteriores = {linha[0]: linha[1:] for linha in cursor.fetchall() if linha[1] is not None}
+    resultados = {}
+    for identificador, (status, cod_venda, motivo, conflitos) in anteriores.items():
+        resultados[identificador] = {'id': identificador, 'status': 'duplicada', 'gravada_como': status,
+                                     'cod_venda': cod_venda, 'motivo': motivo,
+                                     'conflitos': json.loads(conflitos) if conflitos else {}}
+    novas = [v for v in vendas if v[0] not in anteriores]
+
+    registros = []
+    if novas:
+        # Trava os produtos de todo o lote de uma vez, em ordem de código.
+        codigos = sorted({cod for _, _, _, itens in novas for cod in itens})
+        cursor.execute(f"""
+            SELECT cod_produto, quantidade, preco_venda FROM produto
+            WHERE cod_produto IN ({", ".join(["%s"] * len(codigos))})
+            ORDER BY cod_produto FOR UPDATE
+        """, codigos)
+        estoque, precos = {}, {}
+        for cod, quantidade, preco_venda in cursor.fetchall():
+            estoque[cod], precos[cod] = quantidade, preco_venda
+        usuarios = sorted({cod_usuario for _, cod_usuario, _, _ in novas})
+        cursor.execute(f"SELECT cod_usuario FROM usuario WHERE cod_usuario IN ({', '.join(['%s'] * len(usuarios))})",
+                       usuarios)
+        usuarios = {linha[0] for linha in cursor.fetchall()}
+
+        itens_venda, movimentos, lancamentos, baixas = [], [], [], {}
+        # Em ordem cronológica: quem vendeu primeiro consome o estoque primeiro.
+        for identificador, cod_usuario, data, itens in sorted(novas, key=lambda v: v[2]):
+            ausentes = [cod for cod in itens if cod not in estoque]
+            if ausentes:
+                motivo = f"Produtos inexistentes: {ausentes}."
+            elif cod_usuario not in usuarios:
+                motivo = f"Usuário inexistente: {cod_usuario}."
+            elif data > agora + TOLERANCIA_RELOGIO:
+                motivo = f"Data da venda no futuro: {data:%d/%m/%Y %H:%M}."
+            elif data < agora - JANELA_OFFLINE:
+                motivo = f"Venda mais antiga que {JANELA_OFFLINE.days} dias: {data:%d/%m/%Y %H:%M}."
+            else:
+                motivo = None
+            if motivo:
+                registros.append((identificador, terminal, cod_usuario, data, 'rejeitada', None, motivo, None))
+                resultados[identificador] = {'id': identificador, 'status': 'rejeitada', 'motivo': motivo}
+                continue
+            total = sum((preco * qtd for qtd, preco in itens.values()), Decimal('0.00'))
+            cursor.execute("INSERT INTO venda (cod_usuario, data_venda, total) VALUES (%s, %s, %s)",
+                           (cod_usuario, data, total))
+            cod_venda = cursor.lastrowid
+            sem_estoque, divergentes = {}, {}
+            for cod, (qtd, preco) in itens.items():
+                coberto = max(0, min(qtd, estoque[cod]))
+                if coberto < qtd:
+                    sem_estoque[cod] = qtd - coberto
+                if preco != precos[cod]:
+                    divergentes[cod] = {'cobrado': str(preco), 'cadastro': str(precos[cod])}
+                estoque[cod] -= qtd
+                baixas[cod] = baixas.get(cod, 0) + qtd
+                itens_venda.append((cod_venda, cod, qtd, preco))
+                movimentos.append((cod, -qtd, cod_venda, cod_usuario, f"Venda offline ({terminal})"))
+            # O lançamento no caixa entra com a data da sincronização: dias já
+            # fechados não mudam, e o dinheiro aparece quando chega ao servidor.
+            lancamentos.append((total, f"Venda #{cod_venda} (offline, {terminal}, {data:%d/%m %H:%M})", cod_usuario))
+            conflitos = {chave: valor for chave, valor in (('estoque', sem_estoque), ('preco', divergentes)) if valor}
+            registros.append((identificador, terminal, cod_usuario, data, 'gravada', cod_venda, None,
+                              json.dumps(conflitos) if conflitos else None))
+            resultados[identificador] = {'id': identificador, 'status': 'gravada', 'cod_venda': cod_venda,
+                                         'total': str(total), 'conflitos': conflitos}
+
+        if itens_venda:
+            cursor.executemany("""
+                INSERT INTO item_venda (cod_venda, cod_produto, quantidade, preco_unitario) VALUES (%s, %s, %s, %s)
+            """, itens_venda)
+            casos = " ".join(["WHEN %s THEN %s"] * len(baixas))
+            cursor.execute(f"""
+                UPDATE produto SET quantidade = quantidade - CASE cod_produto {casos} END
+                WHERE cod_produto IN ({", ".join(["%s"] * len(baixas))})
+            """, [valor for par in baixas.items() for valor in par] + list(baixas))
+            cursor.executemany("""
+                INSERT INTO movimentacao_estoque (cod_produto, tipo, quantidade, cod_venda, cod_usuario, observacao)
+                VALUES (%s, 'venda', %s, %s, %s, %s)
+            """, movimentos)
+            cursor.executemany("""
+                INSERT INTO caixa (tipo, valor, descricao, cod_usuario) VALUES ('entrada', %s, %s, %s)
+            """, lancamentos)
+        # Um único INSERT de várias linhas atualiza as reservas feitas acima.
+        cursor.executemany("""
+            INSERT INTO venda_offline (id_offline, terminal, cod_usuario, data_venda, status, cod_venda, motivo, conflitos)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE status = VALUES(status), cod_venda = VALUES(cod_venda),
+                                    motivo = VALUES(motivo), conflitos = VALUES(conflitos)
+        """, registros)
+
+    conn.commit()
+    cursor.close()
+    return [resultados[identificador] for identificador in ids]
+
+
+def receber_lote(conn, terminal, cod_usuario, vendas, pendentes=0, pendente_desde=None, admin=False):
+    """
+    Grava as `vendas` enviadas pelo terminal por `cod_usuario` (o usuário da
+    sessão; `admin` se ele é administrador, ver `_validar_venda`) e atualiza
+    a situação do terminal com o que ele informou sobre a fila além deste
+    lote (`pendentes` e a data da mais antiga). Retorna os
+    resultados por venda ('gravada', 'duplicada' ou 'rejeitada'), na ordem
+    recebida, e a vazão do lote.
+    """
+    terminal = str(terminal or '').strip()[:50]
+    if not terminal:
+        raise LoteInvalido("Informe o identificador do terminal.")
+    if not isinstance(vendas, list) or len(vendas) > MAX_LOTE:
+        raise LoteInvalido(f"'vendas' deve ser uma lista com até {MAX_LOTE} vendas.")
+    normalizadas = [_validar_venda(venda, cod_usuario, admin) for venda in vendas]
+    if len({v[0] for v in normalizadas}) != len(normalizadas):
+        raise LoteInvalido("Há vendas repetidas no lote.")
+
+    inicio = time.perf_counter()
+    resultados = []
+    if normalizadas:
+        for tentativa in range(1, TENTATIVAS_DEADLOCK + 1):
+            try:
+                resultados = _gravar_lote(conn, terminal, normalizadas)
+                break
+            except errors.DatabaseError as err:
+                conn.rollback()
+                if err.errno != ER_LOCK_DEADLOCK or tentativa == TENTATIVAS_DEADLOCK:
+                    raise
+    segundos = time.perf_counter() - inicio
+    gravadas = sum(1 for r in resultados if r['status'] == 'gravada')
+    vazao = round(len(normalizadas) / segundos, 1) if normalizadas and segundos else None
+
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO terminal_pdv (terminal, cod_usuario, ultima_sincronizacao, vendas_recebidas, pendentes,
+                                  pendente_desde, vendas_por_segundo)
+        VALUES (%s, %s, NOW(), %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE cod_usuario = VALUES(cod_usuario), ultima_sincronizacao = NOW(),
+            vendas_recebidas = vendas_recebidas + VALUES(vendas_recebidas), pendentes = VALUES(pendentes),
+            pendente_desde = VALUES(pendente_desde),
+            vendas_por_segundo = COALESCE(VALUES(vendas_por_segundo), vendas_por_segundo)
+    """, (terminal, cod_usuario, gravadas, max(0, int(pendentes or 0)), pendente_desde, vazao))
+    conn.commit()
+    cursor.close()
+    return {
+        'resultados': resultados,
+        'gravadas': gravadas,
+        'duplicadas': sum(1 for r in resultados if r['status'] == 'duplicada'),
+        'rejeitadas': sum(1 for r in resultados if r['status'] == 'rejeitada'),
+        'segundos': round(segundos, 3),
+        'vendas_por_segundo': vazao,
+    }
+
+
+def situacao_terminais(conn):
+    """ Fila e vazão informadas por cada terminal, dos mais atrasados para os mais em dia. """
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("""
+        SELECT terminal, cod_usuario, ultima_sincronizacao, vendas_recebidas, pendentes,
+               pendente_desde, vendas_por_segundo
+        FROM terminal_pdv ORDER BY pendentes DESC, ultima_sincronizacao
+    """)
+    linhas = cursor.fetchall()
+    cursor.close()
+    for linha in linhas:
+        if linha['vendas_por_segundo'] is not None:
+            linha['vendas_por_segundo'] = float(linha['vendas_por_segundo'])
+    return linhas
@@ -50,6 +50,11 @@ CREATE TABLE produto (
     cod_categoria INT NOT NULL,           -- Categoria do produto
     cod_pvp INT NOT NULL,                 -- Relacionamento com PVP
     data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,  -- Última alteração (atualização incremental do catálogo do PDV)
+    estoque_minimo INT NOT NULL DEFAULT 0,  -- Ponto de reposição
+    folga_estoque INT AS (quantidade - estoque_minimo) STORED,  -- <= 0: abaixo do mínimo
+    INDEX idx_produto_atualizado (atualizado_em),
+    INDEX idx_produto_folga (folga_estoque),  -- Alertas de estoque baixo sem varrer a tabela
     FOREIGN KEY (cod_categoria) REFERENCES categoria_produto(cod_categoria),  -- Relacionamento com a categoria
     FOREIGN KEY (cod_pvp) REFERENCES pvp(cod_pvp)  -- Relacionamento com o PVP
 );
@@ -77,18 +82,10 @@ CREATE TABLE item_venda (
     FOREIGN KEY (cod_produto) REFERENCES produto(cod_produto)
 );
 
--- Trigger para reduzir o estoque após a venda
-DELIMITER $$
-CREATE TRIGGER after_venda_insert
-AFTER INSERT ON item_venda
-FOR EACH ROW
-BEGIN
-    UPDATE produto 
-    SET quantidade = quantidade - NEW.quantidade
-    WHERE cod_produto = NEW.cod_produto;
-END;
-$$
-DELIMITER ;
+-- A baixa de estoque da venda é feita pelo checkout (vendas.py) com um único
+-- UPDATE para todos os itens, na mesma transação da venda. O antigo trigger
+-- after_venda_insert (um UPDATE por item) foi removido para não baixar em dobro.
+DROP TRIGGER IF EXISTS after_venda_insert;
 
 -- 7. Tabela de Caixa (Movimentações de entrada e saída de dinheiro)
 CREATE TABLE caixa (
@@ -104,9 +101,11 @@ CREATE TABLE caixa (
 
 
 CREATE TABLE `unidade_medida` (
-  `cod_unidade` int(11) NOT NULL,
+  `cod_unidade` int(11) NOT NULL AUTO_INCREMENT,
   `nome_unidade` varchar(50) NOT NULL,
-  `sigla_unidade` varchar(10) NOT NULL
+  `sigla_unidade` varchar(10) NOT NULL,
+  PRIMARY KEY (`cod_unidade`),
+  KEY `idx_unidade_nome` (`nome_unidade`)
 ) ENGINE=InnoDB DEFAULT CHARSET=latin1 COLLATE=latin1_swedish_ci;
 
 --
@@ -196,4 +195,206 @@ INSERT INTO categoria_produto (nome_categoria, pvp_categoria, descricao_categori
 INSERT INTO categoria_produto (nome_categoria, pvp_categoria, descricao_categoria) VALUES ('Perfumaria', 17, 'Perfumes, desodorantes, maquiagens, cosméticos.');
 INSERT INTO categoria_produto (nome_categoria, pvp_categoria, descricao_categoria) VALUES ('Infantil', 18, 'Fraldas, papinhas, produtos para bebês e crianças.');
 INSERT INTO categoria_produto (nome_categoria, pvp_categoria, descricao_categoria) VALUES ('Mercearia', 19, 'Óleos, temperos, molhos, farinhas especiais.');
-INSERT INTO categoria_produto (nome_categoria, pvp_categoria, descricao_categoria) VALUES ('Importados', 20, 'Produtos estrangeiros, gourmet ou diferenciados.');
\ No newline at end of file
+INSERT INTO categoria_produto (nome_categoria, pvp_categoria, descricao_categoria) VALUES ('Importados', 20, 'Produtos estrangeiros, gourmet ou diferenciados.');
+
+-- =====================================================================
+-- RESUMO DO SISTEMA (CONTADORES DO DASHBOARD)
+-- Totais mantidos pelos triggers abaixo a cada INSERT/DELETE, para que o
+-- dashboard leia uma única linha por indicador em vez de fazer COUNT(*)/SUM()
+-- sobre as tabelas inteiras.
+-- =====================================================================
+CREATE TABLE resumo_sistema (
+    chave VARCHAR(50) PRIMARY KEY,
+    valor DECIMAL(14,2) NOT NULL DEFAULT 0
+);
+
+-- Inicializa os contadores a partir dos dados já existentes.
+INSERT INTO resumo_sistema (chave, valor) SELECT 'total_produtos', COUNT(*) FROM produto;
+INSERT INTO resumo_sistema (chave, valor) SELECT 'total_categorias', COUNT(*) FROM categoria_produto;
+INSERT INTO resumo_sistema (chave, valor) SELECT 'total_vendas', COUNT(*) FROM venda;
+INSERT INTO resumo_sistema (chave, valor)
+    SELECT 'saldo_caixa', COALESCE(SUM(CASE WHEN tipo = 'entrada' THEN valor ELSE -valor END), 0) FROM caixa;
+
+DELIMITER $$
+CREATE TRIGGER resumo_produto_insert AFTER INSERT ON produto
+FOR EACH ROW
+BEGIN
+    UPDATE resumo_sistema SET valor = valor + 1 WHERE chave = 'total_produtos';
+END;
+$$
+CREATE TRIGGER resumo_produto_delete AFTER DELETE ON produto
+FOR EACH ROW
+BEGIN
+    UPDATE resumo_sistema SET valor = valor - 1 WHERE chave = 'total_produtos';
+END;
+$$
+CREATE TRIGGER resumo_categoria_insert AFTER INSERT ON categoria_produto
+FOR EACH ROW
+BEGIN
+    UPDATE resumo_sistema SET valor = valor + 1 WHERE chave = 'total_categorias';
+END;
+$$
+CREATE TRIGGER resumo_categoria_delete AFTER DELETE ON categoria_produto
+FOR EACH ROW
+BEGIN
+    UPDATE resumo_sistema SET valor = valor - 1 WHERE chave = 'total_categorias';
+END;
+$$
+CREATE TRIGGER resumo_venda_insert AFTER INSERT ON venda
+FOR EACH ROW
+BEGIN
+    UPDATE resumo_sistema SET valor = valor + 1 WHERE chave = 'total_vendas';
+END;
+$$
+CREATE TRIGGER resumo_venda_delete AFTER DELETE ON venda
+FOR EACH ROW
+BEGIN
+    UPDATE resumo_sistema SET valor = valor - 1 WHERE chave = 'total_vendas';
+END;
+$$
+CREATE TRIGGER resumo_caixa_insert AFTER INSERT ON caixa
+FOR EACH ROW
+BEGIN
+    UPDATE resumo_sistema
+    SET valor = valor + IF(NEW.tipo = 'entrada', NEW.valor, -NEW.valor)
+    WHERE chave = 'saldo_caixa';
+END;
+$$
+CREATE TRIGGER resumo_caixa_update AFTER UPDATE ON caixa
+FOR EACH ROW
+BEGIN
+    UPDATE resumo_sistema
+    SET valor = valor - IF(OLD.tipo = 'entrada', OLD.valor, -OLD.valor)
+                      + IF(NEW.tipo = 'entrada', NEW.valor, -NEW.valor)
+    WHERE chave = 'saldo_caixa';
+END;
+$$
+CREATE TRIGGER resumo_caixa_delete AFTER DELETE ON caixa
+FOR EACH ROW
+BEGIN
+    UPDATE resumo_sistema
+    SET valor = valor - IF(OLD.tipo = 'entrada', OLD.valor, -OLD.valor)
+    WHERE chave = 'saldo_caixa';
+END;
+$$
+DELIMITER ;
+
+-- Índice para "últimas vendas" (ORDER BY data_venda DESC LIMIT N) no dashboard.
+CREATE INDEX idx_venda_data ON venda (data_venda);
+
+
+-- =====================================================================
+-- FECHAMENTO DE CAIXA (SALDO MATERIALIZADO POR DIA)
+-- Cada linha guarda os totais de um dia e o saldo acumulado ao final dele.
+-- O saldo em qualquer instante é o saldo do último fechamento anterior mais
+-- as movimentações posteriores a ele, então nunca é preciso somar o livro-caixa
+-- inteiro.
+-- =====================================================================
+CREATE TABLE fechamento_caixa (
+    data_fechamento DATE PRIMARY KEY,
+    total_entradas DECIMAL(14,2) NOT NULL DEFAULT 0,
+    total_saidas DECIMAL(14,2) NOT NULL DEFAULT 0,
+    saldo_final DECIMAL(14,2) NOT NULL,  -- Saldo acumulado ao fim do dia
+    criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Permite somar só as movimentações de um intervalo (delta após o fechamento).
+CREATE INDEX idx_caixa_data ON caixa (data_movimentacao);
+
+
+-- =====================================================================
+-- ÍNDICES DAS LISTAGENS DO ADMIN (PAGINAÇÃO POR CHAVE)
+-- Cada listagem ordena por nome e pagina por (nome, código). No InnoDB todo
+-- índice secundário já carrega a chave primária, então (nome) equivale a
+-- (nome, código). Os índices compostos atendem os filtros mais usados sem
+-- precisar ordenar o resultado.
+-- =====================================================================
+CREATE INDEX idx_usuario_nome ON usuario (nome_usuario);
+CREATE INDEX idx_usuario_ativa_nome ON usuario (conta_ativa, nome_usuario);
+CREATE INDEX idx_usuario_tipo_nome ON usuario (tipo_usuario, nome_usuario);
+CREATE INDEX idx_pvp_nome ON pvp (nome_pvp);
+CREATE INDEX idx_pvp_tipo_ativo_nome ON pvp (tipo_pvp, ativo, nome_pvp);
+CREATE INDEX idx_categoria_nome ON categoria_produto (nome_categoria);
+
+
+-- =====================================================================
+-- RELATÓRIOS: TABELAS DE AGREGAÇÃO (ROLLUPS)
+-- Totais pré-agregados das vendas, atualizados de forma incremental a partir
+-- da última venda processada (relatorios.py). Os relatórios leem só estas
+-- tabelas, nunca o histórico bruto de venda/item_venda.
+-- =====================================================================
+CREATE TABLE rollup_controle (
+    nome VARCHAR(50) PRIMARY KEY,
+    ultimo_cod BIGINT NOT NULL DEFAULT 0,   -- Último cod_venda já agregado
+    atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+INSERT INTO rollup_controle (nome, ultimo_cod) VALUES ('vendas', 0);
+
+-- Por hora e operador de caixa.
+CREATE TABLE rollup_venda_hora (
+    hora DATETIME NOT NULL,
+    cod_usuario INT NOT NULL,
+    vendas INT NOT NULL DEFAULT 0,
+    receita DECIMAL(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (hora, cod_usuario),
+    INDEX idx_rollup_hora_usuario (cod_usuario, hora)
+);
+
+-- Por dia e produto (quantidade, receita e custo para a margem).
+CREATE TABLE rollup_produto_dia (
+    dia DATE NOT NULL,
+    cod_produto INT NOT NULL,
+    cod_categoria INT NOT NULL,
+    quantidade INT NOT NULL DEFAULT 0,
+    receita DECIMAL(14,2) NOT NULL DEFAULT 0,
+    custo DECIMAL(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (dia, cod_produto),
+    INDEX idx_rollup_produto (cod_produto, dia)
+);
+
+-- Por dia e categoria.
+CREATE TABLE rollup_categoria_dia (
+    dia DATE NOT NULL,
+    cod_categoria INT NOT NULL,
+    quantidade INT NOT NULL DEFAULT 0,
+    receita DECIMAL(14,2) NOT NULL DEFAULT 0,
+    custo DECIMAL(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (dia, cod_categoria)
+);
+
+
+-- =====================================================================
+-- ESTOQUE: HISTÓRICO DE MOVIMENTAÇÕES E GIRO
+-- Toda alteração de `produto.quantidade` gera uma linha aqui (somente
+-- inserções). `produto_giro` guarda a média de vendas por dia e quantos dias
+-- o estoque atual dura, recalculados periodicamente em lote (estoque.py).
+-- =====================================================================
+CREATE TABLE movimentacao_estoque (
+    cod_movimentacao BIGINT AUTO_INCREMENT PRIMARY KEY,
+    cod_produto INT NOT NULL,
+    tipo ENUM('venda', 'reposicao', 'ajuste') NOT NULL,
+    quantidade INT NOT NULL,                 -- Variação do estoque (negativa nas saídas)
+    cod_venda INT DEFAULT NULL,              -- Preenchido nas movimentações de venda
+    cod_usuario INT DEFAULT NULL,
+    observacao VARCHAR(255) DEFAULT NULL,
+    data_movimentacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_mov_produto_data (cod_produto, data_movimentacao),
+    FOREIGN KEY (cod_produto) REFERENCES produto(cod_produto)
+);
+
+CREATE TABLE produto_giro (
+    cod_produto INT PRIMARY KEY,
+    media_diaria DECIMAL(12,3) NOT NULL DEFAULT 0,  -- Unidades vendidas por dia (janela recente)
+    dias_restantes DECIMAL(12,1) DEFAULT NULL,      -- NULL quando não há vendas na janela
+    calculado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX idx_giro_dias (dias_restantes),
+    FOREIGN KEY (cod_produto) REFERENCES produto(cod_produto)
+);
+
+
+-- =====================================================================
+-- A PARTIR DAQUI: MIGRAÇÕES VERSIONADAS
+-- Este arquivo é o esquema base. As alterações seguintes ficam em
+-- sql/migracoes/ e são aplicadas, em ordem, com `flask migrar`
+-- (`flask migrar --status` mostra o que falta).
+-- =====================================================================
@@ -0,0 +1,22 @@
+-- =====================================================================
+-- 0001: ÍNDICES DAS TABELAS TRANSACIONAIS
+-- Filtros por operador e período e somas do caixa por tipo resolvidos só
+-- pelos índices, sem ler as linhas da tabela.
+-- =====================================================================
+
+-- Vendas de um operador em um período (relatórios, exportação por usuário).
+CREATE INDEX idx_venda_usuario_data ON venda (cod_usuario, data_venda);
+
+-- Totais do caixa por tipo (recalcular_resumo) lidos inteiramente do índice.
+CREATE INDEX idx_caixa_tipo_valor ON caixa (tipo, valor);
+
+-- Movimentações de um operador em um período.
+CREATE INDEX idx_caixa_usuario_data ON caixa (cod_usuario, data_movimentacao);
+
+-- Saldo e fechamentos por intervalo de datas: o índice já traz tipo e valor.
+-- Substitui o idx_caixa_data (mesma coluna inicial).
+CREATE INDEX idx_caixa_data_tipo_valor ON caixa (data_movimentacao, tipo, valor);
+DROP INDEX idx_caixa_data ON caixa;
+
+-- Itens vendidos de um produto (histórico e conferência do giro).
+CREATE INDEX idx_item_produto_venda ON item_venda (cod_produto, cod_venda);
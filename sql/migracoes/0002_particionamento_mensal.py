@@ -0,0 +1,40 @@
+"""
+0002: PARTICIONAMENTO MENSAL DE `venda` E `caixa`
+
+O MySQL exige que a coluna de particionamento faça parte da chave primária e
+não aceita chaves estrangeiras em tabelas particionadas (nem apontando para
+elas). Por isso:
+- a chave primária passa a ser (código, data);
+- as chaves estrangeiras que envolvem `venda` e `caixa` são removidas (a
+  integridade é garantida pelo checkout em vendas.py, numa única transação);
+- as partições vão do mês da movimentação mais antiga até alguns meses à
+  frente, mais a `pmax` (mantidas depois por `flask manter-particoes`).
+"""
+from datetime import date
+
+from arquivamento import TABELAS_PARTICIONADAS, MESES_A_FRENTE, clausula_particoes, somar_meses, primeiro_dia
+
+
+def aplicar(conn):
+    cursor = conn.cursor()
+    for tabela, (coluna, chave) in TABELAS_PARTICIONADAS.items():
+        cursor.execute("""
+            SELECT table_name, constraint_name FROM information_schema.referential_constraints
+            WHERE constraint_schema = DATABASE() AND (table_name = %s OR referenced_table_name = %s)
+        """, (tabela, tabela))
+        for dona, restricao in cursor.fetchall():
+            cursor.execute(f"ALTER TABLE `{dona}` DROP FOREIGN KEY `{restricao}`")
+
+        cursor.execute(f"SELECT MIN({coluna}) FROM {tabela}")
+        mais_antiga = cursor.fetchone()[0]
+        primeiro_mes = primeiro_dia(mais_antiga or date.today())
+        ultimo_mes = somar_meses(primeiro_dia(date.today()), MESES_A_FRENTE)
+
+        cursor.execute(f"""
+            ALTER TABLE {tabela}
+                MODIFY {coluna} TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                DROP PRIMARY KEY,
+                ADD PRIMARY KEY ({chave}, {coluna})
+        """)
+        cursor.execute(f"ALTER TABLE {tabela} {clausula_particoes(coluna, primeiro_mes, ultimo_mes)}")
+    cursor.close()
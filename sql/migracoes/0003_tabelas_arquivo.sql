@@ -0,0 +1,35 @@
+-- =====================================================================
+-- 0003: TABELAS FRIAS DO ARQUIVAMENTO
+-- Recebem os meses fechados retirados de venda, item_venda e caixa
+-- (`flask arquivar`). Mesmas colunas das tabelas quentes, sem partições e
+-- com compressão: são lidas raramente (relatórios antigos, auditoria).
+-- =====================================================================
+CREATE TABLE IF NOT EXISTS venda_arquivo (
+    cod_venda INT NOT NULL PRIMARY KEY,
+    cod_usuario INT NOT NULL,
+    data_venda TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    total DECIMAL(10,2) NOT NULL,
+    INDEX idx_venda_arquivo_data (data_venda),
+    INDEX idx_venda_arquivo_usuario_data (cod_usuario, data_venda)
+) ROW_FORMAT=COMPRESSED;
+
+CREATE TABLE IF NOT EXISTS item_venda_arquivo (
+    cod_item INT NOT NULL PRIMARY KEY,
+    cod_venda INT NOT NULL,
+    cod_produto INT NOT NULL,
+    quantidade INT NOT NULL,
+    preco_unitario DECIMAL(10,2) NOT NULL,
+    INDEX idx_item_arquivo_venda (cod_venda),
+    INDEX idx_item_arquivo_produto (cod_produto, cod_venda)
+) ROW_FORMAT=COMPRESSED;
+
+CREATE TABLE IF NOT EXISTS caixa_arquivo (
+    cod_caixa INT NOT NULL PRIMARY KEY,
+    tipo ENUM('entrada', 'saida') NOT NULL,
+    valor DECIMAL(10,2) NOT NULL,
+    descricao TEXT,
+    data_movimentacao TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    cod_usuario INT NOT NULL,
+    INDEX idx_caixa_arquivo_data (data_movimentacao, tipo, valor),
+    INDEX idx_caixa_arquivo_usuario_data (cod_usuario, data_movimentacao)
+) ROW_FORMAT=COMPRESSED;
@@ -0,0 +1,31 @@
+-- =====================================================================
+-- 0004: FILA DE TAREFAS EM SEGUNDO PLANO
+-- Operações administrativas pesadas (reprecificação, importação,
+-- exportação, reconstrução dos relatórios) viram uma linha aqui e são
+-- executadas pelas threads de `tarefas.py` dentro dos próprios workers da
+-- aplicação. A rota só registra a tarefa e responde na hora; a página
+-- acompanha `status`/`progresso` por polling.
+-- =====================================================================
+CREATE TABLE IF NOT EXISTS tarefa (
+    cod_tarefa BIGINT AUTO_INCREMENT PRIMARY KEY,
+    tipo VARCHAR(50) NOT NULL,
+    parametros TEXT NOT NULL,                 -- JSON
+    status ENUM('pendente', 'executando', 'concluida', 'falhou') NOT NULL DEFAULT 'pendente',
+    progresso DECIMAL(5,2) NOT NULL DEFAULT 0,
+    mensagem VARCHAR(255),
+    resultado MEDIUMTEXT,                     -- JSON
+    erro TEXT,
+    tentativas INT NOT NULL DEFAULT 0,
+    max_tentativas INT NOT NULL DEFAULT 3,
+    executar_apos TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    cod_usuario INT,
+    trabalhador VARCHAR(100),
+    heartbeat TIMESTAMP NULL,
+    criada_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    iniciada_em TIMESTAMP NULL,
+    concluida_em TIMESTAMP NULL,
+    -- Busca da próxima tarefa: só pendentes cujo horário já chegou.
+    INDEX idx_tarefa_fila (status, executar_apos),
+    -- Tarefas recentes de um usuário (lista no painel).
+    INDEX idx_tarefa_usuario (cod_usuario, cod_tarefa)
+);
@@ -0,0 +1,34 @@
+-- =====================================================================
+-- 0005: VENDAS DOS TERMINAIS EM MODO OFFLINE
+-- Um terminal sem acesso ao servidor continua vendendo com a réplica local
+-- do catálogo (terminal_pdv.py) e envia depois as vendas em lotes
+-- (POST /sistema/pdv/vendas/lote).
+--
+-- `venda_offline` guarda o identificador gerado pelo terminal para cada
+-- venda: reenviar um lote (resposta perdida, timeout) não grava nada duas
+-- vezes. Fica fora de `venda` porque uma chave única em tabela particionada
+-- precisaria incluir a data.
+-- =====================================================================
+CREATE TABLE IF NOT EXISTS venda_offline (
+    id_offline CHAR(36) PRIMARY KEY,          -- UUID gerado no terminal
+    terminal VARCHAR(50) NOT NULL,
+    cod_usuario INT NOT NULL,
+    data_venda DATETIME NOT NULL,             -- Momento da venda no terminal
+    status ENUM('gravada', 'rejeitada') NULL, -- NULL só durante o processamento do lote
+    cod_venda INT NULL,
+    motivo VARCHAR(255) NULL,                 -- Motivo da rejeição
+    conflitos TEXT NULL,                      -- JSON {cod_produto: unidades vendidas além do estoque}
+    recebida_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_venda_offline_terminal (terminal, recebida_em)
+);
+
+-- Situação de cada terminal, informada a cada sincronização.
+CREATE TABLE IF NOT EXISTS terminal_pdv (
+    terminal VARCHAR(50) PRIMARY KEY,
+    cod_usuario INT NULL,                     -- Último usuário que sincronizou
+    ultima_sincronizacao TIMESTAMP NULL,
+    vendas_recebidas BIGINT NOT NULL DEFAULT 0,
+    pendentes INT NOT NULL DEFAULT 0,         -- Vendas ainda na fila do terminal
+    pendente_desde DATETIME NULL,             -- Venda mais antiga da fila
+    vendas_por_segundo DECIMAL(10,1) NULL     -- Vazão do último lote
+);
@@ -0,0 +1,96 @@
+-- =====================================================================
+-- 0006: CONTADORES DO DASHBOARD EM FATIAS
+-- Com uma única linha por contador, toda venda atualizava `total_vendas` e
+-- `saldo_caixa` e segurava o lock delas até o commit: os checkouts (e os
+-- lotes dos terminais offline) da loja inteira ficavam em fila nessas duas
+-- linhas. Agora cada contador tem até 16 linhas (`fatia`) e o valor é a
+-- soma delas. A fatia é escolhida pela conexão (CONNECTION_ID() % 16): uma
+-- transação sempre usa a mesma fatia de cada contador, então duas
+-- transações nunca se travam em ordens diferentes (sem deadlock), e
+-- conexões diferentes quase sempre caem em fatias diferentes.
+-- =====================================================================
+ALTER TABLE resumo_sistema
+    ADD COLUMN fatia TINYINT UNSIGNED NOT NULL DEFAULT 0 AFTER chave,
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (chave, fatia);
+
+DROP TRIGGER IF EXISTS resumo_produto_insert;
+DROP TRIGGER IF EXISTS resumo_produto_delete;
+DROP TRIGGER IF EXISTS resumo_categoria_insert;
+DROP TRIGGER IF EXISTS resumo_categoria_delete;
+DROP TRIGGER IF EXISTS resumo_venda_insert;
+DROP TRIGGER IF EXISTS resumo_venda_delete;
+DROP TRIGGER IF EXISTS resumo_caixa_insert;
+DROP TRIGGER IF EXISTS resumo_caixa_update;
+DROP TRIGGER IF EXISTS resumo_caixa_delete;
+
+-- INSERT ... ON DUPLICATE KEY UPDATE cria a fatia no primeiro uso.
+DELIMITER $$
+CREATE TRIGGER resumo_produto_insert AFTER INSERT ON produto
+FOR EACH ROW
+BEGIN
+    INSERT INTO resumo_sistema (chave, fatia, valor) VALUES ('total_produtos', CONNECTION_ID() % 16, 1)
+    ON DUPLICATE KEY UPDATE valor = valor + 1;
+END;
+$$
+CREATE TRIGGER resumo_produto_delete AFTER DELETE ON produto
+FOR EACH ROW
+BEGIN
+    INSERT INTO resumo_sistema (chave, fatia, valor) VALUES ('total_produtos', CONNECTION_ID() % 16, -1)
+    ON DUPLICATE KEY UPDATE valor = valor - 1;
+END;
+$$
+CREATE TRIGGER resumo_categoria_insert AFTER INSERT ON categoria_produto
+FOR EACH ROW
+BEGIN
+    INSERT INTO resumo_sistema (chave, fatia, valor) VALUES ('total_categorias', CONNECTION_ID() % 16, 1)
+    ON DUPLICATE KEY UPDATE valor = valor + 1;
+END;
+$$
+CREATE TRIGGER resumo_categoria_delete AFTER DELETE ON categoria_produto
+FOR EACH ROW
+BEGIN
+    INSERT INTO resumo_sistema (chave, fatia, valor) VALUES ('total_categorias', CONNECTION_ID() % 16, -1)
+    ON DUPLICATE KEY UPDATE valor = valor - 1;
+END;
+$$
+CREATE TRIGGER resumo_venda_insert AFTER INSERT ON venda
+FOR EACH ROW
+BEGIN
+    INSERT INTO resumo_sistema (chave, fatia, valor) VALUES ('total_vendas', CONNECTION_ID() % 16, 1)
+    ON DUPLICATE KEY UPDATE valor = valor + 1;
+END;
+$$
+CREATE TRIGGER resumo_venda_delete AFTER DELETE ON venda
+FOR EACH ROW
+BEGIN
+    INSERT INTO resumo_sistema (chave, fatia, valor) VALUES ('total_vendas', CONNECTION_ID() % 16, -1)
+    ON DUPLICATE KEY UPDATE valor = valor - 1;
+END;
+$$
+CREATE TRIGGER resumo_caixa_insert AFTER INSERT ON caixa
+FOR EACH ROW
+BEGIN
+    INSERT INTO resumo_sistema (chave, fatia, valor)
+    VALUES ('saldo_caixa', CONNECTION_ID() % 16, IF(NEW.tipo = 'entrada', NEW.valor, -NEW.valor))
+    ON DUPLICATE KEY UPDATE valor = valor + VALUES(valor);
+END;
+$$
+CREATE TRIGGER resumo_caixa_update AFTER UPDATE ON caixa
+FOR EACH ROW
+BEGIN
+    INSERT INTO resumo_sistema (chave, fatia, valor)
+    VALUES ('saldo_caixa', CONNECTION_ID() % 16,
+            IF(NEW.tipo = 'entrada', NEW.valor, -NEW.valor) - IF(OLD.tipo = 'entrada', OLD.valor, -OLD.valor))
+    ON DUPLICATE KEY UPDATE valor = valor + VALUES(valor);
+END;
+$$
+CREATE TRIGGER resumo_caixa_delete AFTER DELETE ON caixa
+FOR EACH ROW
+BEGIN
+    INSERT INTO resumo_sistema (chave, fatia, valor)
+    VALUES ('saldo_caixa', CONNECTION_ID() % 16, -IF(OLD.tipo = 'entrada', OLD.valor, -OLD.valor))
+    ON DUPLICATE KEY UPDATE valor = valor + VALUES(valor);
+END;
+$$
+DELIMITER ;
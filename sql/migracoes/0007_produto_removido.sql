@@ -0,0 +1,24 @@
+-- =====================================================================
+-- 0007: LÁPIDES DE PRODUTOS APAGADOS
+-- As leituras incrementais do catálogo (índice do PDV em catalogo.py e
+-- réplica dos terminais em sincronizacao.py) só enxergam as linhas que
+-- existem em `produto`. Cada produto apagado deixa aqui o código e o
+-- momento da exclusão, para que essas cópias também o retirem.
+-- =====================================================================
+CREATE TABLE IF NOT EXISTS produto_removido (
+    cod_produto INT PRIMARY KEY,
+    removido_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX idx_produto_removido_em (removido_em)
+);
+
+DROP TRIGGER IF EXISTS produto_lapide_delete;
+
+DELIMITER $$
+CREATE TRIGGER produto_lapide_delete AFTER DELETE ON produto
+FOR EACH ROW
+BEGIN
+    INSERT INTO produto_removido (cod_produto) VALUES (OLD.cod_produto)
+    ON DUPLICATE KEY UPDATE removido_em = CURRENT_TIMESTAMP;
+END;
+$$
+DELIMITER ;
@@ -0,0 +1,30 @@
+-- =====================================================================
+-- 0008: FILA DE VENDAS A AGREGAR NOS RELATÓRIOS
+-- Os rollups avançavam por uma marca de cod_venda (`rollup_controle`), só
+-- sobre vendas com mais de 60 segundos. Uma venda com cod_venda maior e data
+-- antiga (vendas offline) ou uma transação mais lenta que isso movia a marca
+-- por cima de vendas ainda não confirmadas, que nunca eram agregadas.
+--
+-- Agora cada venda entra em `rollup_pendente` por trigger, na mesma transação
+-- em que é gravada, e relatorios.py consome a fila. `rollup_controle` deixa
+-- de ser usada.
+-- =====================================================================
+CREATE TABLE IF NOT EXISTS rollup_pendente (
+    cod_venda INT PRIMARY KEY
+);
+
+DROP TRIGGER IF EXISTS rollup_venda_insert;
+
+DELIMITER $$
+CREATE TRIGGER rollup_venda_insert AFTER INSERT ON venda
+FOR EACH ROW
+BEGIN
+    INSERT INTO rollup_pendente (cod_venda) VALUES (NEW.cod_venda);
+END;
+$$
+DELIMITER ;
+
+-- Vendas posteriores à última marca que ainda não foram agregadas.
+INSERT IGNORE INTO rollup_pendente (cod_venda)
+SELECT cod_venda FROM venda
+WHERE cod_venda > (SELECT ultimo_cod FROM rollup_controle WHERE nome = 'vendas');
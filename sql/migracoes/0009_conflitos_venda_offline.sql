@@ -0,0 +1,17 @@
+-- =====================================================================
+-- 0009: CONFLITOS DE PREÇO NAS VENDAS OFFLINE
+-- `venda_offline.conflitos` guardava só {cod_produto: unidades vendidas além
+-- do estoque}. Agora a venda offline também registra os itens cobrados por
+-- um preço diferente do preço de venda do cadastro, e o JSON passa a
+-- separar os dois tipos:
+--   {"estoque": {cod_produto: unidades},
+--    "preco": {cod_produto: {"cobrado": "3.50", "cadastro": "3.99"}}}
+-- Os registros antigos são convertidos para o formato novo.
+-- =====================================================================
+ALTER TABLE venda_offline
+    MODIFY conflitos TEXT NULL COMMENT 'JSON {"estoque": {cod_produto: unidades}, "preco": {cod_produto: {"cobrado", "cadastro"}}}';
+
+UPDATE venda_offline
+SET conflitos = JSON_OBJECT('estoque', CAST(conflitos AS JSON))
+WHERE conflitos IS NOT NULL AND JSON_EXTRACT(conflitos, '$.estoque') IS NULL
+  AND JSON_EXTRACT(conflitos, '$.preco') IS NULL;
@@ -0,0 +1,9 @@
+-- =====================================================================
+-- 0010: BUSCA DE USUÁRIOS PELO BANCO
+-- A listagem de usuários filtra pelo índice em memória (busca.py). Quando
+-- a busca nele é cortada (consulta larga demais), o filtro vai para este
+-- índice FULLTEXT, com cada palavra da consulta como prefixo
+-- (`+palavra*` em BOOLEAN MODE), sem varrer a tabela.
+-- =====================================================================
+ALTER TABLE usuario
+    ADD FULLTEXT INDEX ft_usuario_busca (nome_usuario, username_usuario, email_usuario);
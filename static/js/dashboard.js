@@ -5,44 +5,40 @@
 
   // Graphs
   const ctx = document.getElementById('myChart')
-  new Chart(ctx, {
-    type: 'line',
-    data: {
-      labels: [
-        'Sunday',
-        'Monday',
-        'Tuesday',
-        'Wednesday',
-        'Thursday',
-        'Friday',
-        'Saturday'
-      ],
-      datasets: [{
-        data: [
-          15339,
-          21345,
-          18483,
-          24003,
-          23489,
-          24092,
-          12034
-        ],
-        lineTension: 0,
-        backgroundColor: 'transparent',
-        borderColor: '#007bff',
-        borderWidth: 4,
-        pointBackgroundColor: '#007bff'
-      }]
-    },
-    options: {
-      plugins: {
-        legend: {
-          display: false
+  if (!ctx) {
+    return
+  }
+
+  // Série diária vinda dos rollups de vendas (/sistema/admin/relatorios/dia).
+  fetch(ctx.dataset.url, { credentials: 'same-origin' })
+    .then(resposta => resposta.json())
+    .then(serie => {
+      new Chart(ctx, {
+        type: 'line',
+        data: {
+          labels: serie.map(ponto => {
+            const [ano, mes, dia] = ponto.dia.split('-')
+            return `${dia}/${mes}`
+          }),
+          datasets: [{
+            data: serie.map(ponto => Number(ponto.receita)),
+            lineTension: 0,
+            backgroundColor: 'transparent',
+            borderColor: '#007bff',
+            borderWidth: 4,
+            pointBackgroundColor: '#007bff'
+          }]
         },
-        tooltip: {
-          boxPadding: 3
+        options: {
+          plugins: {
+            legend: {
+              display: false
+            },
+            tooltip: {
+              boxPadding: 3
+            }
+          }
         }
-      }
-    }
-  })
+      })
+    })
 })()
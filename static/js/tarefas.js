@@ -0,0 +1,32 @@
+(() => {
+  'use strict'
+
+  // Acompanha uma tarefa em segundo plano (/sistema/admin/tarefas/<cod>) e
+  // recarrega a página quando ela termina, para exibir o resultado.
+  const caixa = document.getElementById('tarefa')
+  if (!caixa) {
+    return
+  }
+  const barra = document.getElementById('tarefa-barra')
+  const mensagem = document.getElementById('tarefa-mensagem')
+
+  const consultar = () => {
+    fetch(caixa.dataset.url, { credentials: 'same-origin' })
+      .then(resposta => resposta.json())
+      .then(tarefa => {
+        if (tarefa.status === 'concluida' || tarefa.status === 'falhou') {
+          window.location.reload()
+          return
+        }
+        barra.style.width = `${tarefa.progresso}%`
+        if (tarefa.mensagem) {
+          mensagem.textContent = tarefa.mensagem
+        } else if (tarefa.status === 'pendente' && tarefa.tentativas > 0) {
+          mensagem.textContent = `Nova tentativa agendada (${tarefa.erro})`
+        }
+        setTimeout(consultar, 2000)
+      })
+      .catch(() => setTimeout(consultar, 5000))
+  }
+  setTimeout(consultar, 1000)
+})()
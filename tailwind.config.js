@@ -0,0 +1,10 @@
+// Build do CSS do painel (flask construir-estaticos): o Tailwind procura as
+// classes usadas nos templates e scripts e gera só o CSS delas, em vez do
+// compilador JIT que a CDN executava no navegador a cada página.
+module.exports = {
+  content: ['./templates/**/*.html', './static/js/**/*.js'],
+  theme: {
+    extend: {},
+  },
+  plugins: [],
+};
@@ -0,0 +1,383 @@
+# =====================================================================
+# TAREFAS EM SEGUNDO PLANO
+# Operações administrativas demoradas (reprecificar o catálogo, importar ou
+# exportar milhares de linhas, reconstruir relatórios) não rodam mais dentro
+# da requisição: a rota grava uma linha na tabela `tarefa` e responde na hora
+# com o número da tarefa, que a página acompanha por polling.
+#
+# Cada processo da aplicação mantém algumas threads que buscam tarefas
+# pendentes na própria tabela (sem broker externo). A tarefa é reservada com
+# um UPDATE condicional (`WHERE status = 'pendente'`): com vários workers,
+# só um deles consegue marcá-la como 'executando'. Uma falha volta a tarefa
+# para a fila com espera exponencial até `max_tentativas`; tarefas de um
+# processo que morreu no meio (sem heartbeat) também voltam para a fila.
+#
+# As funções de tarefa são registradas com o decorador `@tarefa('tipo')` e
+# recebem (conn, parametros, progresso); o retorno (serializável em JSON) é
+# gravado como resultado. Elas devem poder ser executadas de novo sem efeito
+# duplicado, já que uma tentativa interrompida é repetida do início.
+# =====================================================================
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from decimal import Decimal
+
+log = logging.getLogger(__name__)
+
+# Segundos entre consultas à fila quando não há nada para executar
+# (`enfileirar` acorda as threads do próprio processo na hora).
+INTERVALO_FILA = 2.0
+
+# Espera antes de uma nova tentativa: ESPERA_BASE * 2^(tentativa - 1)
+# segundos, limitada a ESPERA_MAXIMA, com variação de ±20%.
+ESPERA_BASE = 30
+ESPERA_MAXIMA = 1800
+
+# Heartbeat das tarefas em execução. Sem heartbeat há mais de
+# TAREFA_ABANDONADA segundos, a tarefa é considerada abandonada.
+INTERVALO_HEARTBEAT = 15
+TAREFA_ABANDONADA = 120
+
+# O progresso é gravado no máximo uma vez por INTERVALO_PROGRESSO segundos.
+INTERVALO_PROGRESSO = 1.0
+
+# Tarefas terminadas ficam no histórico por DIAS_HISTORICO dias; ao sair
+# dele, os arquivos da tarefa (o CSV enviado, o arquivo exportado) são apagados junto.
+DIAS_HISTORICO = 30
+
+_TIPOS = {}
+
+# Acorda as threads do processo quando uma tarefa é enfileirada nele.
+_acordar = threading.Event()
+
+
+class FalhaDefinitiva(Exception):
+    """ Erro que não se resolve tentando de novo (arquivo inválido, registro inexistente...). """
+
+
+def tarefa(tipo):
+    """ Decorador que registra `funcao(conn, parametros, progresso)` como executora do `tipo`. """
+    def registrar(funcao):
+        _TIPOS[tipo] = funcao
+        return funcao
+    return registrar
+
+
+def enfileirar(conn, tipo, parametros=None, cod_usuario=None, max_tentativas=3, unica=False):
+    """
+    Registra uma tarefa e retorna o seu código. Com `unica=True`, se já houver
+    uma tarefa pendente do mesmo tipo e com os mesmos parâmetros, ela é
+    reaproveitada (ex.: editar o mesmo PVP duas vezes seguidas reprecifica uma vez só).
+    """
+    if tipo not in _TIPOS:
+        raise ValueError(f"Tipo de tarefa desconhecido: {tipo}.")
+    texto = json.dumps(parametros or {}, sort_keys=True, default=str)
+    cursor = conn.cursor()
+    if unica:
+        cursor.execute("""
+            SELECT cod_tarefa FROM tarefa
+            WHERE status = 'pendente' AND tipo = %s AND parametros = %s
+            LIMIT 1
+        """, (tipo, texto))
+        linha = cursor.fetchone()
+        if linha is not None:
+            cursor.close()
+            return linha[0]
+    cursor.execute("""
+        INSERT INTO tarefa (tipo, parametros, cod_usuario, max_tentativas) VALUES (%s, %s, %s, %s)
+    """, (tipo, texto, cod_usuario, max_tentativas))
+    cod = cursor.lastrowid
+    conn.commit()
+    cursor.close()
+    _acordar.set()
+    return cod
+
+
+def _como_dict(linha):
+    for campo in ('parametros', 'resultado'):
+        if linha.get(campo) is not None:
+            linha[campo] = json.loads(linha[campo])
+    if isinstance(linha.get('progresso'), Decimal):
+        linha['progresso'] = float(linha['progresso'])
+    return linha
+
+
+_COLUNAS = """cod_tarefa, tipo, parametros, status, progresso, mensagem, resultado, erro, tentativas,
+              max_tentativas, executar_apos, cod_usuario, criada_em, iniciada_em, concluida_em"""
+
+
+def obter_tarefa(conn, cod):
+    """ A tarefa como dicionário (parâmetros e resultado já decodificados), ou None. """
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(f"SELECT {_COLUNAS} FROM tarefa WHERE cod_tarefa = %s", (cod,))
+    linha = cursor.fetchone()
+    cursor.close()
+    return _como_dict(linha) if linha else None
+
+
+def listar_tarefas(conn, limite=50):
+    """ Tarefas mais recentes, sem o resultado (que pode ser grande). """
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(f"""
+        SELECT {_COLUNAS.replace('resultado, ', '')} FROM tarefa
+        ORDER BY cod_tarefa DESC LIMIT %s
+    """, (limite,))
+    linhas = [_como_dict(linha) for linha in cursor.fetchall()]
+    cursor.close()
+    return linhas
+
+
+class Progresso:
+    """
+    Passado às funções de tarefa: `progresso(fracao, mensagem=None)`, com
+    `fracao` entre 0 e 1. Grava em uma conexão separada (a da tarefa pode
+    estar no meio de uma transação) e no máximo uma vez por intervalo.
+    """
+
+    def __init__(self, executor, cod):
+        self.executor = executor
+        self.cod = cod
+        self._ultimo = 0.0
+
+    def __call__(self, fracao, mensagem=None):
+        agora = time.monotonic()
+        if agora - self._ultimo < INTERVALO_PROGRESSO and fracao < 1:
+            return
+        self._ultimo = agora
+        percentual = round(max(0.0, min(fracao, 1.0)) * 100, 2)
+        try:
+            self.executor._gravar("""
+                UPDATE tarefa SET progresso = %s, mensagem = %s, heartbeat = NOW()
+                WHERE cod_tarefa = %s AND status = 'executando'
+            """, (percentual, mensagem[:255] if mensagem else None, self.cod))
+        except Exception:
+            # Progresso é informativo: uma falha aqui não interrompe a tarefa.
+            log.warning("Não foi possível gravar o progresso da tarefa %s.", self.cod, exc_info=True)
+
+
+class Executor:
+    """
+    Threads que executam as tarefas da fila. `obter_conexao`/`devolver_conexao`
+    vêm do pool da aplicação; cada tarefa usa uma conexão durante toda a execução.
+    """
+
+    def __init__(self, obter_conexao, devolver_conexao, trabalhadores=2, intervalo=INTERVALO_FILA):
+        self.obter_conexao = obter_conexao
+        self.devolver_conexao = devolver_conexao
+        self.trabalhadores = trabalhadores
+        self.intervalo = intervalo
+        self._em_execucao = set()
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._ultima_limpeza = 0.0
+
+    @property
+    def nome(self):
+        # Calculado na hora: o processo pode ter sido criado por fork depois do import.
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def iniciar(self):
+        for numero in range(1, self.trabalhadores + 1):
+            threading.Thread(target=self._trabalhar, name=f'tarefas-{numero}', daemon=True).start()
+        threading.Thread(target=self._manter, name='tarefas-heartbeat', daemon=True).start()
+
+    def parar(self):
+        self._parar.set()
+        _acordar.set()
+
+    def aguardar(self):
+        """ Bloqueia até `parar()` (usado pelo comando que roda só o executor). """
+        self._parar.wait()
+
+    # --- Execução ---
+    def _trabalhar(self):
+        while not self._parar.is_set():
+            try:
+                executou = self.executar_proxima()
+            except Exception:
+                log.exception("Falha ao buscar tarefas na fila.")
+                executou = False
+            if not executou:
+                _acordar.wait(self.intervalo)
+                _acordar.clear()
+
+    def _reservar(self, cursor, conn):
+        """ Marca a próxima tarefa pendente como 'executando' por este processo; retorna seu código ou None. """
+        cursor.execute("""
+            SELECT cod_tarefa FROM tarefa
+            WHERE status = 'pendente' AND executar_apos <= NOW()
+            ORDER BY executar_apos, cod_tarefa
+            LIMIT 5
+        """)
+        candidatas = [cod for (cod,) in cursor.fetchall()]
+        # Encerra o snapshot de leitura: a próxima consulta à fila enxerga tarefas novas.
+        conn.commit()
+        for cod in candidatas:
+            cursor.execute("""
+                UPDATE tarefa
+                SET status = 'executando', tentativas = tentativas + 1, trabalhador = %s,
+                    heartbeat = NOW(), iniciada_em = NOW(), progresso = 0, mensagem = NULL
+                WHERE cod_tarefa = %s AND status = 'pendente'
+            """, (self.nome, cod))
+            reservou = cursor.rowcount == 1
+            conn.commit()
+            if reservou:
+                return cod
+        return None
+
+    def executar_proxima(self):
+        """ Executa uma tarefa da fila, se houver. Retorna True se executou alguma. """
+        conn = self.obter_conexao()
+        descartar = False
+        try:
+            cursor = conn.cursor()
+            cod = self._reservar(cursor, conn)
+            if cod is None:
+                cursor.close()
+                return False
+            cursor.execute("SELECT tipo, parametros, tentativas, max_tentativas FROM tarefa WHERE cod_tarefa = %s",
+                           (cod,))
+            tipo, parametros, tentativas, max_tentativas = cursor.fetchone()
+            conn.commit()
+            cursor.close()
+            descartar = not self._executar(conn, cod, tipo, json.loads(parametros), tentativas, max_tentativas)
+            return True
+        finally:
+            self.devolver_conexao(conn, descartar=descartar)
+
+    def _executar(self, conn, cod, tipo, parametros, tentativas, max_tentativas):
+        """ Roda a função da tarefa e registra o desfecho. Retorna False se a conexão deve ser descartada. """
+        with self._lock:
+            self._em_execucao.add(cod)
+        inicio = time.perf_counter()
+        try:
+            funcao = _TIPOS.get(tipo)
+            if funcao is None:
+                raise FalhaDefinitiva(f"Tipo de tarefa desconhecido: {tipo}.")
+            resultado = funcao(conn, parametros, Progresso(self, cod))
+        except Exception as err:
+            definitiva = isinstance(err, FalhaDefinitiva) or tentativas >= max_tentativas
+            log.log(logging.ERROR if definitiva else logging.WARNING,
+                    "Tarefa %s (%s) falhou na tentativa %s/%s.", cod, tipo, tentativas, max_tentativas,
+                    exc_info=True)
+            self._registrar_falha(cod, err, definitiva, tentativas)
+            return False
+        else:
+            self._gravar("""
+                UPDATE tarefa
+                SET status = 'concluida', progresso = 100, resultado = %s, erro = NULL,
+                    concluida_em = NOW(), heartbeat = NULL
+                WHERE cod_tarefa = %s
+            """, (json.dumps(resultado, default=str), cod))
+            log.info("Tarefa %s (%s) concluída em %.2fs.", cod, tipo, time.perf_counter() - inicio)
+            return True
+        finally:
+            with self._lock:
+                self._em_execucao.discard(cod)
+
+    def _registrar_falha(self, cod, err, definitiva, tentativas):
+        mensagem = f"{type(err).__name__}: {err}"
+        if definitiva:
+            self._gravar("""
+                UPDATE tarefa SET status = 'falhou', erro = %s, concluida_em = NOW(), heartbeat = NULL
+                WHERE cod_tarefa = %s
+            """, (mensagem, cod))
+            return
+        espera = min(ESPERA_BASE * 2 ** (tentativas - 1), ESPERA_MAXIMA) * random.uniform(0.8, 1.2)
+        self._gravar("""
+            UPDATE tarefa
+            SET status = 'pendente', erro = %s, trabalhador = NULL, heartbeat = NULL,
+                executar_apos = NOW() + INTERVAL %s SECOND
+            WHERE cod_tarefa = %s
+        """, (mensagem, int(espera), cod))
+
+    def _gravar(self, sql, params):
+        """ Executa um UPDATE de controle em uma conexão própria do pool. """
+        conn = self.obter_conexao()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            conn.commit()
+            cursor.close()
+        finally:
+            self.devolver_conexao(conn)
+
+    # --- Manutenção ---
+    def _manter(self):
+        """ Heartbeat das tarefas deste processo, recuperação das abandonadas e limpeza do histórico. """
+        while not self._parar.wait(INTERVALO_HEARTBEAT):
+            try:
+                with self._lock:
+                    codigos = list(self._em_execucao)
+                if codigos:
+                    marcadores = ", ".join(["%s"] * len(codigos))
+                    self._gravar(f"UPDATE tarefa SET heartbeat = NOW() WHERE cod_tarefa IN ({marcadores})", codigos)
+                recuperar_abandonadas(self.obter_conexao, self.devolver_conexao)
+                if time.monotonic() - self._ultima_limpeza > 3600:
+                    self._ultima_limpeza = time.monotonic()
+                    self._limpar_historico()
+            except Exception:
+                log.exception("Falha na manutenção da fila de tarefas.")
+
+    def _limpar_historico(self, limite=1000):
+        """ Remove as tarefas terminadas há mais de DIAS_HISTORICO dias e os arquivos delas. """
+        conn = self.obter_conexao()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT cod_tarefa, parametros, resultado FROM tarefa
+                WHERE status IN ('concluida', 'falhou') AND concluida_em < NOW() - INTERVAL %s DAY
+                ORDER BY cod_tarefa LIMIT %s
+            """, (DIAS_HISTORICO, limite))
+            linhas = cursor.fetchall()
+            if not linhas:
+                cursor.close()
+                return 0
+            codigos = [cod for cod, _, _ in linhas]
+            marcadores = ", ".join(["%s"] * len(codigos))
+            cursor.execute(f"DELETE FROM tarefa WHERE cod_tarefa IN ({marcadores})", codigos)
+            conn.commit()
+            cursor.close()
+        finally:
+            self.devolver_conexao(conn)
+        # Só depois do commit: um arquivo nunca some enquanto a tarefa ainda o lista.
+        for _, parametros, resultado in linhas:
+            for texto in (parametros, resultado):
+                arquivo = json.loads(texto).get('arquivo') if texto else None
+                if isinstance(arquivo, str):
+                    try:
+                        os.remove(arquivo)
+                    except FileNotFoundError:
+                        pass
+                    except OSError:
+                        log.warning("Não foi possível apagar %s.", arquivo, exc_info=True)
+        return len(codigos)
+
+
+def recuperar_abandonadas(obter_conexao, devolver_conexao, limite=TAREFA_ABANDONADA):
+    """
+    Devolve à fila as tarefas 'executando' sem heartbeat há mais de `limite`
+    segundos (o processo que as executava morreu ou foi reiniciado); as que já
+    esgotaram as tentativas são marcadas como falhas. Retorna quantas mudaram.
+    """
+    conn = obter_conexao()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE tarefa
+            SET status = IF(tentativas >= max_tentativas, 'falhou', 'pendente'),
+                concluida_em = IF(tentativas >= max_tentativas, NOW(), NULL),
+                erro = 'Execução interrompida: o processo que a executava parou de responder.',
+                trabalhador = NULL, heartbeat = NULL, executar_apos = NOW()
+            WHERE status = 'executando' AND heartbeat < NOW() - INTERVAL %s SECOND
+        """, (limite,))
+        afetadas = cursor.rowcount
+        conn.commit()
+        cursor.close()
+        return afetadas
+    finally:
+        devolver_conexao(conn)
@@ -0,0 +1,462 @@
+# =====================================================================
+# TERMINAL DE CAIXA COM MODO OFFLINE
+# Roda no próprio terminal. Mantém uma réplica SQLite do catálogo (código
+# de barras, nome, preço de venda e estoque) e uma fila local de vendas, de
+# modo que o caixa continua vendendo quando o servidor ou a rede param.
+#
+# - `ReplicaLocal`: leitura de produtos e registro de vendas só no SQLite.
+#   A fila é durável (WAL com synchronous=FULL): uma venda confirmada ao
+#   operador sobrevive a queda de energia.
+# - `Sincronizador`: quando o servidor responde, baixa as alterações do
+#   catálogo (GET /sistema/pdv/catalogo) e envia a fila em lotes
+#   (POST /sistema/pdv/vendas/lote). Cada venda leva um UUID gerado aqui,
+#   então reenviar um lote cuja resposta se perdeu não duplica nada.
+#
+# Uso (o loop sincroniza enquanto houver conexão e espera quando não há):
+#   CAIXA_PDV_SENHA=... python terminal_pdv.py --servidor http://servidor:5000 \
+#       --usuario operador1 --terminal caixa-01 sincronizar
+#   python terminal_pdv.py --terminal caixa-01 situacao
+# =====================================================================
+import argparse
+import http.cookiejar
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from vendas import VendaInvalida, EstoqueInsuficiente, agrupar_itens
+
+log = logging.getLogger(__name__)
+
+# Vendas enviadas por requisição (o servidor aceita até sincronizacao.MAX_LOTE).
+TAMANHO_LOTE = 200
+
+# Espera entre sincronizações com o servidor respondendo, e o teto da espera
+# (crescente) enquanto ele não responde.
+INTERVALO_SINCRONIZACAO = 10.0
+ESPERA_MAXIMA = 300.0
+
+# Segundos de espera por uma resposta do servidor.
+TIMEOUT = 15.0
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS produto (
+    cod_produto INTEGER PRIMARY KEY,
+    codigo_barras TEXT NOT NULL,
+    nome_produto TEXT NOT NULL,
+    preco_centavos INTEGER NOT NULL,
+    unidade_medida TEXT NOT NULL,
+    ativo INTEGER NOT NULL,
+    quantidade INTEGER NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_produto_barras ON produto (codigo_barras);
+CREATE TABLE IF NOT EXISTS fila_venda (
+    id TEXT PRIMARY KEY,                  -- UUID (idempotência no servidor)
+    criada_em TEXT NOT NULL,
+    cod_usuario INTEGER,
+    venda TEXT NOT NULL,                  -- JSON no formato do lote
+    status TEXT NOT NULL DEFAULT 'pendente',  -- pendente | rejeitada
+    tentativas INTEGER NOT NULL DEFAULT 0,
+    motivo TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_fila_status ON fila_venda (status, criada_em);
+CREATE TABLE IF NOT EXISTS controle (
+    chave TEXT PRIMARY KEY,
+    valor TEXT
+);
+"""
+
+
+def _reais(centavos):
+    return Decimal(centavos).scaleb(-2)
+
+
+class ServidorIndisponivel(Exception):
+    """ Sem resposta do servidor (rede, timeout ou erro 5xx): tentar de novo depois. """
+
+
+def _mensagem_erro(err):
+    """ Mensagem de erro de uma resposta HTTP da API ({"erro": ...}), ou o código. """
+    try:
+        return str(json.loads(err.read())['erro'])[:255]
+    except (ValueError, KeyError, TypeError, OSError):
+        return f"HTTP {err.code}"
+
+
+class ReplicaLocal:
+    """ Catálogo e fila de vendas do terminal em um arquivo SQLite. """
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._conn = sqlite3.connect(caminho, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.executescript(_ESQUEMA)
+        # Uma conexão para o terminal inteiro; o lock serializa venda e sincronização.
+        self._lock = threading.Lock()
+
+    # --- Controle ---
+    def obter_controle(self, chave, padrao=None):
+        linha = self._conn.execute("SELECT valor FROM controle WHERE chave = ?", (chave,)).fetchone()
+        return linha[0] if linha else padrao
+
+    def definir_controle(self, chave, valor):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO controle (chave, valor) VALUES (?, ?)", (chave, valor))
+
+    # --- Catálogo ---
+    def atualizar_produtos(self, produtos):
+        """ Grava uma página do catálogo vinda do servidor (inserção ou atualização). """
+        linhas = [(p['cod_produto'], p['codigo_barras'], p['nome_produto'],
+                   int(Decimal(p['preco_venda']) * 100), p['unidade_medida'], int(p['ativo']), p['quantidade'])
+                  for p in produtos]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                # Um código de barras pode ter passado para outro produto.
+                self._conn.executemany("DELETE FROM produto WHERE codigo_barras = ? AND cod_produto <> ?",
+                                       [(linha[1], linha[0]) for linha in linhas])
+                self._conn.executemany("""
+                    INSERT OR REPLACE INTO produto
+                        (cod_produto, codigo_barras, nome_produto, preco_centavos, unidade_medida, ativo, quantidade)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, linhas)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(linhas)
+
+    def remover_produtos(self, codigos):
+        """ Retira da réplica os produtos apagados no servidor. """
+        with self._lock:
+            self._conn.executemany("DELETE FROM produto WHERE cod_produto = ?", [(cod,) for cod in codigos])
+        return len(codigos)
+
+    def _produto(self, linha):
+        if linha is None:
+            return None
+        produto = dict(linha)
+        produto['preco_venda'] = str(_reais(produto.pop('preco_centavos')))
+        produto['ativo'] = bool(produto['ativo'])
+        return produto
+
+    def por_codigo_barras(self, codigo_barras):
+        return self._produto(self._conn.execute(
+            "SELECT * FROM produto WHERE codigo_barras = ?", (codigo_barras,)).fetchone())
+
+    def por_cod_produto(self, cod):
+        return self._produto(self._conn.execute("SELECT * FROM produto WHERE cod_produto = ?", (cod,)).fetchone())
+
+    # --- Vendas ---
+    def registrar_venda(self, cod_usuario, itens, bloquear_sem_estoque=False):
+        """
+        Registra uma venda na fila local, com os preços da réplica, e dá baixa
+        no estoque local. Mesmo formato de itens do checkout online. Retorna
+        {'id', 'total', 'itens'}. Com `bloquear_sem_estoque=True`, recusa a
+        venda quando a réplica não tem estoque (como o checkout online).
+        """
+        carrinho = agrupar_itens(itens)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                marcadores = ", ".join("?" * len(carrinho))
+                produtos = {linha['cod_produto']: linha for linha in self._conn.execute(
+                    f"SELECT cod_produto, preco_centavos, quantidade, ativo FROM produto "
+                    f"WHERE cod_produto IN ({marcadores})", list(carrinho))}
+                ausentes = [cod for cod in carrinho if cod not in produtos or not produtos[cod]['ativo']]
+                if ausentes:
+                    raise VendaInvalida(f"Produtos inexistentes ou inativos: {ausentes}.")
+                faltas = {cod: produtos[cod]['quantidade'] for cod, qtd in carrinho.items()
+                          if produtos[cod]['quantidade'] < qtd}
+                if faltas and bloquear_sem_estoque:
+                    raise EstoqueInsuficiente(faltas)
+
+                total = sum(produtos[cod]['preco_centavos'] * qtd for cod, qtd in carrinho.items())
+                agora = datetime.now().replace(microsecond=0)
+                venda = {
+                    'id': str(uuid.uuid4()),
+                    'data': agora.isoformat(),
+                    'cod_usuario': cod_usuario,
+                    'itens': [{'cod_produto': cod, 'quantidade': qtd,
+                               'preco_unitario': str(_reais(produtos[cod]['preco_centavos']))}
+                              for cod, qtd in carrinho.items()],
+                }
+                self._conn.execute("INSERT INTO fila_venda (id, criada_em, cod_usuario, venda) VALUES (?, ?, ?, ?)",
+                                   (venda['id'], venda['data'], cod_usuario, json.dumps(venda)))
+                self._conn.executemany("UPDATE produto SET quantidade = quantidade - ? WHERE cod_produto = ?",
+                                       [(qtd, cod) for cod, qtd in carrinho.items()])
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return {'id': venda['id'], 'total': str(_reais(total)), 'itens': len(carrinho)}
+
+    def pendentes(self, limite=TAMANHO_LOTE):
+        """ As vendas mais antigas da fila, no formato do lote. """
+        return [json.loads(linha[0]) for linha in self._conn.execute(
+            "SELECT venda FROM fila_venda WHERE status = 'pendente' ORDER BY criada_em, rowid LIMIT ?", (limite,))]
+
+    def depois_de(self, n):
+        """ Quantas vendas pendentes sobram além das `n` mais antigas, e a data da primeira delas. """
+        pendentes = self._conn.execute("SELECT COUNT(*) FROM fila_venda WHERE status = 'pendente'").fetchone()[0]
+        if pendentes <= n:
+            return 0, None
+        primeira = self._conn.execute(
+            "SELECT criada_em FROM fila_venda WHERE status = 'pendente' ORDER BY criada_em, rowid LIMIT 1 OFFSET ?",
+            (n,)).fetchone()
+        return pendentes - n, primeira[0]
+
+    def concluir(self, resultados):
+        """ Aplica as respostas do servidor: gravadas saem da fila, rejeitadas ficam separadas para conferência. """
+        removidas, rejeitadas = [], []
+        for resultado in resultados:
+            status = resultado.get('gravada_como', resultado['status'])
+            if status == 'gravada':
+                removidas.append((resultado['id'],))
+            elif status == 'rejeitada':
+                rejeitadas.append((resultado.get('motivo'), resultado['id']))
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("DELETE FROM fila_venda WHERE id = ?", removidas)
+            self._conn.executemany("UPDATE fila_venda SET status = 'rejeitada', motivo = ? WHERE id = ?", rejeitadas)
+            self._conn.execute("COMMIT")
+        return len(removidas), len(rejeitadas)
+
+    def contar_tentativa(self, ids):
+        with self._lock:
+            self._conn.executemany("UPDATE fila_venda SET tentativas = tentativas + 1 WHERE id = ?",
+                                   [(i,) for i in ids])
+
+    def fila(self):
+        """ (pendentes, data da mais antiga pendente, rejeitadas). """
+        pendentes, mais_antiga = self._conn.execute(
+            "SELECT COUNT(*), MIN(criada_em) FROM fila_venda WHERE status = 'pendente'").fetchone()
+        rejeitadas = self._conn.execute("SELECT COUNT(*) FROM fila_venda WHERE status = 'rejeitada'").fetchone()[0]
+        return pendentes, mais_antiga, rejeitadas
+
+
+class ClienteServidor:
+    """ Cliente HTTP mínimo (biblioteca padrão) da API do servidor, com a sessão em cookie. """
+
+    def __init__(self, url_base, usuario, senha, timeout=TIMEOUT):
+        self.url_base = url_base.rstrip('/')
+        self.usuario = usuario
+        self.senha = senha
+        self.timeout = timeout
+        self._abridor = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        self._logado = False
+
+    def _abrir(self, requisicao):
+        try:
+            return self._abridor.open(requisicao, timeout=self.timeout)
+        except urllib.error.HTTPError as err:
+            if err.code >= 500 or err.code == 429:
+                raise ServidorIndisponivel(f"HTTP {err.code}") from err
+            raise
+        except (urllib.error.URLError, OSError) as err:
+            raise ServidorIndisponivel(str(err)) from err
+
+    def entrar(self):
+        dados = urllib.parse.urlencode({'username': self.usuario, 'senha': self.senha}).encode()
+        self._abrir(urllib.request.Request(f"{self.url_base}/login", data=dados)).read()
+        # O redirecionamento do formulário não diz se o login valeu (um operador
+        # também volta para /login, já logado): confirma com uma rota da API
+        # que exige login, que responde 401 sem sessão.
+        confirmacao = urllib.request.Request(f"{self.url_base}/sistema/pdv/catalogo?limite=1",
+                                             headers={'Accept': 'application/json'})
+        try:
+            self._abrir(confirmacao).read()
+        except urllib.error.HTTPError as err:
+            if err.code == 401:
+                raise PermissionError("Usuário ou senha do terminal recusados pelo servidor.") from err
+            raise
+        self._logado = True
+
+    def json(self, metodo, caminho, corpo=None):
+        if not self._logado:
+            self.entrar()
+        dados = json.dumps(corpo).encode() if corpo is not None else None
+        requisicao = urllib.request.Request(f"{self.url_base}{caminho}", data=dados, method=metodo,
+                                            headers={'Content-Type': 'application/json',
+                                                     'Accept': 'application/json'})
+        try:
+            resposta = self._abrir(requisicao)
+        except urllib.error.HTTPError as err:
+            if err.code == 401:
+                # Sessão expirada ou recusada pela API: entra de novo na próxima chamada.
+                self._logado = False
+                raise ServidorIndisponivel("Sessão expirada.") from err
+            raise
+        if resposta.geturl().rstrip('/').endswith('/login'):
+            # Sessão expirada: entra de novo na próxima chamada.
+            self._logado = False
+            raise ServidorIndisponivel("Sessão expirada.")
+        return json.loads(resposta.read())
+
+
+class Sincronizador:
+    """ Mantém a réplica e a fila do terminal em dia com o servidor. """
+
+    def __init__(self, replica, cliente, terminal, tamanho_lote=TAMANHO_LOTE):
+        self.replica = replica
+        self.cliente = cliente
+        self.terminal = terminal
+        self.tamanho_lote = tamanho_lote
+        self.online = None
+        self.ultima_sincronizacao = None
+        self.vendas_por_segundo = None  # Média móvel da vazão de envio.
+
+    def sincronizar_catalogo(self):
+        """
+        Baixa as páginas do catálogo alteradas desde a última sincronização e
+        retira os produtos apagados no servidor. Retorna os produtos gravados ou removidos.
+        """
+        total = 0
+        token = self.replica.obter_controle('catalogo_token')
+        while True:
+            caminho = '/sistema/pdv/catalogo' + (f"?desde={urllib.parse.quote(token)}" if token else '')
+            pagina = self.cliente.json('GET', caminho)
+            total += self.replica.atualizar_produtos(pagina['produtos'])
+            total += self.replica.remover_produtos(pagina.get('removidos', []))
+            token = pagina['proximo'] or token
+            if token:
+                self.replica.definir_controle('catalogo_token', token)
+            if pagina['completo']:
+                return total
+
+    def enviar_fila(self):
+        """ Envia a fila em lotes até esvaziá-la. Retorna (gravadas, rejeitadas). """
+        gravadas = rejeitadas = 0
+        while True:
+            lote = self.replica.pendentes(self.tamanho_lote)
+            if not lote:
+                return gravadas, rejeitadas
+            restantes, restante_desde = self.replica.depois_de(len(lote))
+            inicio = time.perf_counter()
+            try:
+                resposta = self.cliente.json('POST', '/sistema/pdv/vendas/lote', {
+                    'terminal': self.terminal,
+                    'vendas': lote,
+                    'pendentes': restantes,
+                    'pendente_desde': restante_desde,
+                })
+            except ServidorIndisponivel:
+                self.replica.contar_tentativa([venda['id'] for venda in lote])
+                raise
+            except urllib.error.HTTPError as err:
+                if err.code != 400:
+                    raise
+                # Lote recusado inteiro (mal formado): separa as vendas para
+                # conferência, senão ele bloquearia a fila para sempre.
+                motivo = _mensagem_erro(err)
+                _, recusadas = self.replica.concluir(
+                    [{'id': venda['id'], 'status': 'rejeitada', 'motivo': motivo} for venda in lote])
+                rejeitadas += recusadas
+                log.error("Lote de %s venda(s) recusado pelo servidor (%s); vendas separadas como rejeitadas.",
+                          len(lote), motivo)
+                continue
+            segundos = time.perf_counter() - inicio
+            feitas, recusadas = self.replica.concluir(resposta['resultados'])
+            gravadas += feitas
+            rejeitadas += recusadas
+            vazao = len(lote) / segundos if segundos else 0.0
+            self.vendas_por_segundo = vazao if self.vendas_por_segundo is None \
+                else 0.7 * self.vendas_por_segundo + 0.3 * vazao
+            if recusadas:
+                log.warning("%s venda(s) rejeitada(s) pelo servidor; veja `situacao`.", recusadas)
+
+    def sincronizar(self):
+        """ Uma rodada completa: primeiro as vendas (o dinheiro), depois o catálogo. """
+        gravadas, rejeitadas = self.enviar_fila()
+        produtos = self.sincronizar_catalogo()
+        self.online = True
+        self.ultima_sincronizacao = datetime.now()
+        return {'gravadas': gravadas, 'rejeitadas': rejeitadas, 'produtos': produtos}
+
+    def executar(self, parar=None, intervalo=INTERVALO_SINCRONIZACAO):
+        """
+        Sincroniza periodicamente até `parar` (threading.Event); espera mais
+        enquanto o servidor não responde ou recusa as chamadas. Nenhum erro
+        interrompe o loop: as vendas continuam na fila local.
+        """
+        parar = parar or threading.Event()
+        espera = intervalo
+        while not parar.is_set():
+            try:
+                resultado = self.sincronizar()
+                espera = intervalo
+                if resultado['gravadas'] or resultado['produtos']:
+                    log.info("Sincronizado: %(gravadas)s venda(s) enviada(s), %(produtos)s produto(s) atualizado(s).",
+                             resultado)
+            except ServidorIndisponivel as err:
+                self.online = False
+                espera = min(espera * 2, ESPERA_MAXIMA)
+                pendentes, _, _ = self.replica.fila()
+                log.warning("Servidor indisponível (%s); %s venda(s) na fila. Nova tentativa em %.0fs.",
+                            err, pendentes, espera)
+            except (urllib.error.HTTPError, PermissionError) as err:
+                # Login recusado ou requisição recusada (4xx): não resolve sozinho, mas
+                # a configuração pode ser corrigida com o terminal no ar.
+                espera = min(espera * 2, ESPERA_MAXIMA)
+                detalhe = _mensagem_erro(err) if isinstance(err, urllib.error.HTTPError) else err
+                log.error("Sincronização recusada pelo servidor (%s). Nova tentativa em %.0fs.", detalhe, espera)
+            except Exception:
+                espera = min(espera * 2, ESPERA_MAXIMA)
+                log.exception("Falha na sincronização. Nova tentativa em %.0fs.", espera)
+            parar.wait(espera)
+
+    def situacao(self):
+        """ Tamanho da fila, idade da venda mais antiga e vazão de envio. """
+        pendentes, mais_antiga, rejeitadas = self.replica.fila()
+        atraso = None
+        if mais_antiga:
+            atraso = (datetime.now() - datetime.fromisoformat(mais_antiga)) // timedelta(seconds=1)
+        return {
+            'terminal': self.terminal,
+            'online': self.online,
+            'pendentes': pendentes,
+            'pendente_desde': mais_antiga,
+            'atraso_segundos': atraso,
+            'rejeitadas': rejeitadas,
+            'vendas_por_segundo': round(self.vendas_por_segundo, 1) if self.vendas_por_segundo else None,
+            'ultima_sincronizacao': self.ultima_sincronizacao.isoformat() if self.ultima_sincronizacao else None,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Terminal de caixa com modo offline.')
+    parser.add_argument('--servidor', default=os.environ.get('CAIXA_PDV_SERVIDOR', 'http://localhost:5000'))
+    parser.add_argument('--usuario', default=os.environ.get('CAIXA_PDV_USUARIO'))
+    parser.add_argument('--terminal', required=True, help='identificador deste terminal (ex.: caixa-01)')
+    parser.add_argument('--banco', help='arquivo SQLite local (padrão: terminal_<terminal>.db)')
+    parser.add_argument('comando', choices=['sincronizar', 'situacao'])
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    replica = ReplicaLocal(args.banco or f"terminal_{args.terminal}.db")
+    cliente = ClienteServidor(args.servidor, args.usuario, os.environ.get('CAIXA_PDV_SENHA', ''))
+    sincronizador = Sincronizador(replica, cliente, args.terminal)
+    if args.comando == 'situacao':
+        print(json.dumps(sincronizador.situacao(), indent=2, ensure_ascii=False))
+        return
+    if not args.usuario:
+        parser.error("Informe --usuario (ou CAIXA_PDV_USUARIO) para sincronizar.")
+    try:
+        sincronizador.executar()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+# =====================================================================
+# REGISTRO DE VENDAS (CHECKOUT)
+# Grava uma venda completa em uma única transação: cabeçalho em `venda`,
+# todos os itens em `item_venda` com um único INSERT de várias linhas, a baixa
+# de estoque com um único UPDATE (e seu histórico em `movimentacao_estoque`)
+# e a entrada correspondente em `caixa`.
+# =====================================================================
+from decimal import Decimal
+
+from mysql.connector import errors
+
+# Código de erro do MySQL para deadlock; a transação inteira pode ser repetida.
+ER_LOCK_DEADLOCK = 1213
+TENTATIVAS_DEADLOCK = 3
+
+
+class VendaInvalida(ValueError):
+    """ Carrinho vazio, mal formado ou com produtos inexistentes/inativos. """
+
+
+class EstoqueInsuficiente(VendaInvalida):
+    """ Algum produto do carrinho não tem quantidade suficiente em estoque. """
+
+    def __init__(self, faltas):
+        self.faltas = faltas  # {cod_produto: quantidade disponível}
+        super().__init__(f"Estoque insuficiente para os produtos {sorted(faltas)}.")
+
+
+def agrupar_itens(itens):
+    """
+    Valida os itens do carrinho e soma as quantidades de produtos repetidos.
+    Retorna {cod_produto: quantidade} ordenado por código (ordem fixa de
+    bloqueio, o que evita deadlocks entre caixas vendendo os mesmos produtos).
+    """
+    if not isinstance(itens, list):
+        raise VendaInvalida("'itens' deve ser uma lista de itens." if itens else "O carrinho está vazio.")
+    if not itens:
+        raise VendaInvalida("O carrinho está vazio.")
+    carrinho = {}
+    for item in itens:
+        try:
+            cod = int(item['cod_produto'])
+            qtd = int(item['quantidade'])
+        except (KeyError, TypeError, ValueError):
+            raise VendaInvalida("Cada item precisa de 'cod_produto' e 'quantidade' inteiros.")
+        if qtd <= 0:
+            raise VendaInvalida("A quantidade de cada item deve ser positiva.")
+        carrinho[cod] = carrinho.get(cod, 0) + qtd
+    return dict(sorted(carrinho.items()))
+
+
+def _gravar_venda(conn, cod_usuario, carrinho):
+    cursor = conn.cursor()
+    codigos = list(carrinho)
+    marcadores = ", ".join(["%s"] * len(codigos))
+
+    # Bloqueia as linhas dos produtos (na ordem do índice) até o commit: dois
+    # caixas vendendo o mesmo produto são serializados, sem perder atualizações.
+    cursor.execute(f"""
+        SELECT cod_produto, preco_venda, quantidade, ativo
+        FROM produto WHERE cod_produto IN ({marcadores})
+        ORDER BY cod_produto
+        FOR UPDATE
+    """, codigos)
+    produtos = {cod: (preco, estoque, ativo) for cod, preco, estoque, ativo in cursor.fetchall()}
+
+    ausentes = [cod for cod in codigos if cod not in produtos or not produtos[cod][2]]
+    if ausentes:
+        raise VendaInvalida(f"Produtos inexistentes ou inativos: {ausentes}.")
+    faltas = {cod: produtos[cod][1] for cod, qtd in carrinho.items() if produtos[cod][1] < qtd}
+    if faltas:
+        raise EstoqueInsuficiente(faltas)
+
+    # O preço vem sempre do banco, nunca do cliente.
+    itens = [(cod, qtd, produtos[cod][0]) for cod, qtd in carrinho.items()]
+    total = sum((preco * qtd for _, qtd, preco in itens), Decimal('0.00'))
+
+    cursor.execute("INSERT INTO venda (cod_usuario, total) VALUES (%s, %s)", (cod_usuario, total))
+    cod_venda = cursor.lastrowid
+
+    # O conector reescreve o executemany de um INSERT em um único INSERT com várias linhas.
+    cursor.executemany("""
+        INSERT INTO item_venda (cod_venda, cod_produto, quantidade, preco_unitario)
+        VALUES (%s, %s, %s, %s)
+    """, [(cod_venda, cod, qtd, preco) for cod, qtd, preco in itens])
+
+    # Baixa de estoque de todos os itens em um único UPDATE.
+    casos = " ".join(["WHEN %s THEN %s"] * len(carrinho))
+    params = [valor for par in carrinho.items() for valor in par] + codigos
+    cursor.execute(f"""
+        UPDATE produto
+        SET quantidade = quantidade - CASE cod_produto {casos} END
+        WHERE cod_produto IN ({marcadores})
+    """, params)
+
+    # Histórico de estoque (movimentacao_estoque), também em um único INSERT.
+    cursor.executemany("""
+        INSERT INTO movimentacao_estoque (cod_produto, tipo, quantidade, cod_venda, cod_usuario)
+        VALUES (%s, 'venda', %s, %s, %s)
+    """, [(cod, -qtd, cod_venda, cod_usuario) for cod, qtd in carrinho.items()])
+
+    cursor.execute("""
+        INSERT INTO caixa (tipo, valor, descricao, cod_usuario)
+        VALUES ('entrada', %s, %s, %s)
+    """, (total, f"Venda #{cod_venda}", cod_usuario))
+
+    conn.commit()
+    cursor.close()
+    return {'cod_venda': cod_venda, 'total': total, 'itens': len(itens)}
+
+
+def registrar_venda(conn, cod_usuario, itens):
+    """
+    Registra a venda dos `itens` ([{'cod_produto', 'quantidade'}, ...]) feita
+    por `cod_usuario`. Retorna {'cod_venda', 'total', 'itens'}.
+
+    Lança `VendaInvalida`/`EstoqueInsuficiente` sem gravar nada. Em caso de
+    deadlock a transação é desfeita e repetida algumas vezes.
+    """
+    carrinho = agrupar_itens(itens)
+    for tentativa in range(1, TENTATIVAS_DEADLOCK + 1):
+        try:
+            return _gravar_venda(conn, cod_usuario, carrinho)
+        except errors.DatabaseError as err:
+            conn.rollback()
+            if err.errno != ER_LOCK_DEADLOCK or tentativa == TENTATIVAS_DEADLOCK:
+                raise
+        except VendaInvalida:
+            conn.rollback()
+            raise
@@ -0,0 +1,83 @@
+# =====================================================================
+# PONTO DE ENTRADA DE PRODUÇÃO (WSGI)
+# `python app.py` continua sendo o servidor de desenvolvimento (debug e
+# recarga automática). Em produção a aplicação vem de `criar_app`, que
+# aplica o perfil abaixo e serve os estáticos gerados por
+# `flask construir-estaticos`:
+#
+#   python wsgi.py                                   (waitress, se instalado)
+#   waitress-serve --threads=8 wsgi:application
+#   gunicorn --workers=1 --threads=8 wsgi:application
+#
+# Use UM processo com várias threads: as sessões (sessoes.py) ficam na
+# memória do processo, e com vários workers o login feito em um deles não
+# valeria nos outros. Para vários processos, troque antes o armazém de
+# sessões por um compartilhado. As threads usam o pool de conexões
+# (DB_POOL_TAMANHO + DB_POOL_OVERFLOW), então não passe desse total.
+# =====================================================================
+import logging
+import os
+
+log = logging.getLogger(__name__)
+
+PERFIL_PRODUCAO = {
+    'DEBUG': False,
+    'TEMPLATES_AUTO_RELOAD': False,
+    'SEND_FILE_MAX_AGE_DEFAULT': 3600,    # Estáticos fora do manifesto (sem hash no nome).
+    'SESSION_COOKIE_HTTPONLY': True,
+    'SESSION_COOKIE_SAMESITE': 'Lax',
+    'SESSION_COOKIE_SECURE': os.environ.get('CAIXA_HTTPS') == '1',
+    'SERVIDOR_HOST': os.environ.get('CAIXA_HOST', '0.0.0.0'),
+    'SERVIDOR_PORTA': int(os.environ.get('CAIXA_PORTA', 8000)),
+    'SERVIDOR_THREADS': int(os.environ.get('CAIXA_THREADS', 8)),
+    'SERVIDOR_ATRAS_DE_PROXY': os.environ.get('CAIXA_PROXY') == '1',  # nginx/IIS na frente.
+}
+
+
+def criar_app(config=None):
+    """ Aplicação configurada para produção, com as tarefas em segundo plano; `config` sobrepõe o perfil padrão. """
+    from app import app, iniciar_servicos
+    from estaticos import servir_compilados
+
+    if 'wsgi' in app.extensions:
+        return app
+    app.config.update(PERFIL_PRODUCAO)
+    app.config.update(config or {})
+    app.jinja_env.auto_reload = app.config['TEMPLATES_AUTO_RELOAD']
+
+    segredo = os.environ.get('CAIXA_SECRET_KEY')
+    if segredo:
+        app.secret_key = segredo
+    else:
+        log.warning("CAIXA_SECRET_KEY não definida: usando a chave fixa do app.py.")
+
+    servir_compilados(app)
+    if app.config['SERVIDOR_ATRAS_DE_PROXY']:
+        # IP real do cliente (limites de login por IP) e esquema https vindos do proxy.
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1)
+    app.extensions['wsgi'] = True
+    iniciar_servicos()
+    return app
+
+
+application = criar_app()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    host = application.config['SERVIDOR_HOST']
+    porta = application.config['SERVIDOR_PORTA']
+    threads = application.config['SERVIDOR_THREADS']
+    try:
+        from waitress import serve
+    except ImportError:
+        log.warning("waitress não instalado (pip install waitress): usando o servidor do Werkzeug com threads.")
+        from werkzeug.serving import run_simple
+        run_simple(host, porta, application, threaded=True)
+    else:
+        serve(application, host=host, port=porta, threads=threads)
+
+
+if __name__ == '__main__':
+    main()